@@ -0,0 +1,111 @@
+-- ==================================================================
+-- 7. PROCEDIMIENTOS DEL AGENTE SAES (agenteSAES_phi)
+-- ==================================================================
+-- ARCHIVO GENERADO: no editar a mano. Las consultas viven en
+-- agenteSAES_phi/consultas_sql.py; para regenerarlo:
+--   python generar_procedimientos.py
+-- Descripción: Carga del perfil académico de un alumno en un solo
+-- viaje a la BD. Devuelve seis result sets, en el mismo orden que
+-- las consultas de db_utils.obtener_datos_usuario:
+--   1. Datos personales y académicos
+--   2. Resumen de kardex
+--   3. UA aprobadas
+--   4. UA reprobadas
+--   5. Materias inscritas con horario detallado
+--   6. Ventana de reinscripción
+-- Las fechas relevantes no se incluyen: el agente las mantiene en caché.
+-- Orden de ejecución: 7
+-- ==================================================================
+USE SAES;
+
+DROP PROCEDURE IF EXISTS sp_datos_alumno;
+
+DELIMITER $$
+
+CREATE PROCEDURE sp_datos_alumno(IN p_boleta VARCHAR(15))
+BEGIN
+    -- 1. Datos Personales y Académicos de Estudiante
+    SELECT 
+        dp.id AS boleta,
+        dp.nombre,
+        dp.ape_paterno,
+        dp.ape_materno,
+        dp.email,
+        dp.carrera,
+        dp.telefono,
+        CONCAT_WS(', ', dp.calle, CONCAT('Núm. ', dp.num_exterior), 
+                  dp.colonia, dp.delegacion, dp.ciudad, CONCAT('CP ', dp.codigo_postal)) AS direccion_completa,
+        e.promedio,
+        e.creditos_disponibles,
+        e.estado_academico
+    FROM datos_personales AS dp
+    JOIN estudiante AS e ON dp.id = e.id_usuario
+    WHERE dp.id = p_boleta;
+
+    -- 2. Resumen Kardex
+    SELECT promedio, situacion_academica, semestres_restantes
+    FROM kardex
+    WHERE id_alumno = p_boleta
+    ORDER BY id DESC
+    LIMIT 1;
+
+    -- 3. UA Aprobadas
+    SELECT 
+        ua.unidad_aprendizaje AS materia,
+        ua.calificacion_final AS calificacion,
+        ua.semestre,
+        ua.metodo_aprobado,
+        ua.periodo,
+        ua.fecha
+    FROM kardex AS k
+    JOIN ua_aprobada AS ua ON k.id = ua.id_kardex
+    WHERE k.id_alumno = p_boleta
+    ORDER BY ua.fecha DESC;
+
+    -- 4. UA Reprobadas
+    SELECT 
+        mr.id AS id_reprobada, 
+        ua.nombre AS materia,
+        mr.periodos_restantes,
+        mr.recurse,
+        mr.estado_actual
+    FROM materia_reprobada AS mr
+    JOIN unidad_de_aprendizaje AS ua ON mr.id_ua = ua.id
+    WHERE mr.id_estudiante = p_boleta;
+
+    -- 5. Materias Inscritas con Profesores y Horarios Detallados
+    SELECT DISTINCT
+        u.nombre AS materia,
+        g.nombre AS grupo,
+        g.turno,
+        u.credito AS credito,
+        CONCAT_WS(' ', dp2.nombre, dp2.ape_paterno, dp2.ape_materno) AS profesor_nombre,
+        u.semestre,
+        GROUP_CONCAT(
+            CONCAT(d.dia, ' ', d.hora_ini, '-', d.hora_fin) 
+            ORDER BY FIELD(d.dia, 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'), d.hora_ini
+            SEPARATOR ', '
+        ) AS horario_detallado
+    FROM horario AS h
+    JOIN mat_inscritos AS mi ON h.id = mi.id_horario
+    JOIN grupo AS g ON mi.id_grupo = g.id
+    JOIN unidad_de_aprendizaje AS u ON g.id_ua = u.id
+    JOIN datos_personales AS dp2 ON g.id_prof = dp2.id
+    LEFT JOIN distribucion AS d ON g.id = d.id_grupo
+    WHERE h.id_alumno = p_boleta
+    GROUP BY u.nombre, g.nombre, g.turno, u.credito, profesor_nombre, u.semestre;
+
+    -- 6. Reinscripción (Ventana activa)
+    SELECT 
+        EXISTS(
+            SELECT 1 
+            FROM inscripcion 
+            WHERE id_alumno = p_boleta 
+              AND NOW() BETWEEN fecha_hora_in AND fecha_hora_cad
+        ) AS reinscripcion_activa,
+        MAX(fecha_hora_cad) AS inscripcion_caduca
+    FROM inscripcion
+    WHERE id_alumno = p_boleta;
+END$$
+
+DELIMITER ;
@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from "react"
 import { useLocation, useParams, useNavigate } from "react-router-dom"
 import "./Chat.css"
 import { SidebarAlumno } from "../alumno/SideBarAlumno.jsx";
+import { generarRespuestaStream } from "../shared/llmStream";
 
 const AnimatedThinkingDots = () => {
   return (
@@ -26,6 +27,7 @@ export function ChatbotAsistente() {
   const [isLoading, setIsLoading] = useState(false)
   const [lastMessageId, setLastMessageId] = useState(null)
   const [razonamientoMode, setRazonamientoMode] = useState(0) // NUEVO: Estado para modo razonamiento
+  const [streamingText, setStreamingText] = useState("")
   const messagesEndRef = useRef(null)
   const messagesContainerRef = useRef(null)
   const [allMessages, setAllMessages] = useState([])
@@ -176,29 +178,24 @@ export function ChatbotAsistente() {
           const timeoutId = setTimeout(() => controller.abort(), 150000)
 
           const startTime = performance.now()
-          const response = await fetch(`/llm/generate/`, {
-            method: "POST",
-            headers: {
-              "Content-Type": "application/json",
-            },
-            body: JSON.stringify({
+          setStreamingText("")
+          const data = await generarRespuestaStream(
+            {
               query: combinedText,
               id_usuario: alumnoId,
               tipo_usuario: "alumno",
               razonamiento: razonamientoMode, // NUEVO: Enviar modo razonamiento
               history: null,
-            }),
-            signal: controller.signal,
-          })
+            },
+            {
+              signal: controller.signal,
+              onToken: (token) => setStreamingText((prev) => prev + token),
+            },
+          )
 
           clearTimeout(timeoutId)
           generationTime = performance.now() - startTime
 
-          if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`)
-          }
-
-          const data = await response.json()
           botResponseText = data.response || "No pude procesar tu solicitud."
           fromCache = data.from_cache || false
 
@@ -254,6 +251,7 @@ export function ChatbotAsistente() {
       setAllMessages((prev) => [...prev, errorMessage])
     } finally {
       setIsLoading(false)
+      setStreamingText("")
       debounceTimerRef.current = null
     }
   }
@@ -336,10 +334,14 @@ export function ChatbotAsistente() {
           ))}
           {isLoading && (
             <div className="message message-bot">
-              <div className="message-content">
-                <p>
-                  Pensando<AnimatedThinkingDots />
-                </p>
+              <div className="message-content" style={{ whiteSpace: 'pre-wrap' }}>
+                {streamingText ? (
+                  streamingText
+                ) : (
+                  <p>
+                    Pensando<AnimatedThinkingDots />
+                  </p>
+                )}
               </div>
             </div>
           )}
@@ -4,6 +4,7 @@ import { useState, useEffect, useRef } from "react"
 import { useLocation, useParams, useNavigate, Link } from "react-router-dom"
 import "./Chat.css"
 import { ProfeSideBar } from "./ProfeSidebar"
+import { generarRespuestaStream } from "../shared/llmStream"
 
 const AnimatedThinkingDots = () => {
   return (
@@ -29,6 +30,7 @@ export function ChatbotProfesor() {
   const [inputMessage, setInputMessage] = useState("")
   const [isLoading, setIsLoading] = useState(false)
   const [razonamientoMode, setRazonamientoMode] = useState(0) // NUEVO: Estado para modo razonamiento
+  const [streamingText, setStreamingText] = useState("")
   const [lastMessageId, setLastMessageId] = useState(null)
   const messagesEndRef = useRef(null)
   const messagesContainerRef = useRef(null)
@@ -133,11 +135,6 @@ export function ChatbotProfesor() {
     setIsLoading(true)
 
     try {
-      console.log("=== DEBUG: Iniciando guardado de mensaje ===");
-      console.log("Profesor ID:", profesorId);
-      console.log("Tipo Usuario:", tipoUsuario);
-      console.log("Modo Razonamiento:", razonamientoMode); // NUEVO: Log del modo
-
       // 1. Guardar la pregunta en BD
       const saveResponse = await fetch(`${API}/GuardarMensajeChat`, {
         method: "POST",
@@ -152,15 +149,7 @@ export function ChatbotProfesor() {
         }),
       })
 
-      console.log("=== DEBUG: Respuesta del servidor ===");
-      console.log("Status:", saveResponse.status);
-      console.log("Status Text:", saveResponse.statusText);
-
       if (!saveResponse.ok) {
-        const errorText = await saveResponse.text();
-        console.error("=== DEBUG: Error del servidor ===");
-        console.error("Error text:", errorText);
-        
         if (saveResponse.status === 401) {
           throw new Error("Tu sesión ha expirado. Por favor, recarga la página e intenta de nuevo.");
         }
@@ -172,14 +161,10 @@ export function ChatbotProfesor() {
 
       const contentType = saveResponse.headers.get("content-type");
       if (!contentType || !contentType.includes("application/json")) {
-        console.error("=== DEBUG: Respuesta no es JSON ===");
-        console.error("Content-Type:", contentType);
         throw new Error("Response is not JSON - ruta no encontrada (404)");
       }
 
       const savedData = await saveResponse.json()
-      console.log("=== DEBUG: Datos guardados ===");
-      console.log("Saved data:", savedData);
 
       if (!savedData.success) {
         throw new Error(savedData.error || "Error al guardar la pregunta")
@@ -199,61 +184,40 @@ export function ChatbotProfesor() {
           const controller = new AbortController()
           const timeoutId = setTimeout(() => controller.abort(), 150000)
 
-          console.log("=== DEBUG: Llamando a FastAPI ===");
-          console.log("URL: /llm/generate/");
-          console.log("Body:", {
-            query: combinedText.substring(0, 50) + "...",
-            id_usuario: profesorId,
-            tipo_usuario: tipoUsuario,
-            razonamiento: razonamientoMode // NUEVO: Log del modo
-          });
-
           const startTime = performance.now()
-          const response = await fetch(`/llm/generate/`, {
-            method: "POST",
-            headers: {
-              "Content-Type": "application/json",
-              "Accept": "application/json",
-            },
-            mode: "cors",
-            body: JSON.stringify({
-              query: combinedText,
-              id_usuario: profesorId,
-              tipo_usuario: tipoUsuario,
-              razonamiento: razonamientoMode, // NUEVO: Enviar modo razonamiento
-              history: null,
-            }),
-            signal: controller.signal,
-          })
-
-          clearTimeout(timeoutId)
-          generationTime = performance.now() - startTime
-
-          console.log("=== DEBUG: Respuesta de FastAPI ===");
-          console.log("Status:", response.status);
-          console.log("Status Text:", response.statusText);
-
-          if (!response.ok) {
-            if (response.status === 403) {
+          setStreamingText("")
+          let data
+          try {
+            data = await generarRespuestaStream(
+              {
+                query: combinedText,
+                id_usuario: profesorId,
+                tipo_usuario: tipoUsuario,
+                razonamiento: razonamientoMode, // NUEVO: Enviar modo razonamiento
+                history: null,
+              },
+              {
+                signal: controller.signal,
+                onToken: (token) => setStreamingText((prev) => prev + token),
+              },
+            )
+          } catch (streamError) {
+            if (streamError.status === 403) {
               throw new Error("El servidor de IA rechazó la petición. Verifica la configuración de CORS.");
             }
-            throw new Error(`HTTP error! status: ${response.status}`)
+            throw streamError
           }
 
-          const data = await response.json()
-          console.log("=== DEBUG: Datos de FastAPI ===");
-          console.log("Response:", data);
-          
+          clearTimeout(timeoutId)
+          generationTime = performance.now() - startTime
+
           botResponseText = data.response || "No pude procesar tu solicitud."
           fromCache = data.from_cache || false
 
         } catch (error) {
-          console.error("=== DEBUG: Error en FastAPI ===");
-          console.error("Error:", error);
           lastError = error
           retries--
           if (retries > 0) {
-            console.log(`Reintentando... (${retries} intentos restantes)`);
             await new Promise(resolve => setTimeout(resolve, 1500))
           }
         }
@@ -265,9 +229,6 @@ export function ChatbotProfesor() {
 
       // 3. Actualizar el mensaje con la respuesta en BD
       if (savedData.mensaje && savedData.mensaje.id) {
-        console.log("=== DEBUG: Actualizando mensaje en BD ===");
-        console.log("Mensaje ID:", savedData.mensaje.id);
-        
         await fetch(`${API}/ActualizarMensajeChat/${savedData.mensaje.id}`, {
           method: "PUT",
           headers: {
@@ -289,9 +250,6 @@ export function ChatbotProfesor() {
 
       setAllMessages((prev) => [...prev, botResponse])
     } catch (error) {
-      console.error("=== DEBUG: Error final ===");
-      console.error("Error completo:", error);
-      
       const errorMessage = {
         id: `error-${Date.now()}`,
         text: `Error: ${error.message}. ${
@@ -307,6 +265,7 @@ export function ChatbotProfesor() {
       setAllMessages((prev) => [...prev, errorMessage])
     } finally {
       setIsLoading(false)
+      setStreamingText("")
       debounceTimerRef.current = null
     }
   }
@@ -386,10 +345,14 @@ export function ChatbotProfesor() {
           ))}
           {isLoading && (
             <div className="message message-bot">
-              <div className="message-content">
-                <p>
-                  Pensando<AnimatedThinkingDots />
-                </p>
+              <div className="message-content" style={{ whiteSpace: 'pre-wrap' }}>
+                {streamingText ? (
+                  streamingText
+                ) : (
+                  <p>
+                    Pensando<AnimatedThinkingDots />
+                  </p>
+                )}
               </div>
             </div>
           )}
@@ -0,0 +1,72 @@
+/**
+ * Cliente del endpoint de streaming del asistente (/llm/generate/stream).
+ *
+ * El servidor envía eventos SSE:
+ *  - token: fragmento de texto conforme llega del modelo
+ *  - done:  respuesta final ya post-procesada ({ response, tiempo_ms, from_cache, ... })
+ *  - error: fallo durante la generación
+ *
+ * Uso:
+ * const data = await generarRespuestaStream(body, {
+ *   signal: controller.signal,
+ *   onToken: (token) => setStreamingText((prev) => prev + token),
+ * });
+ */
+export async function generarRespuestaStream(body, { signal, onToken } = {}) {
+  const response = await fetch(`/llm/generate/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "Accept": "text/event-stream",
+    },
+    body: JSON.stringify(body),
+    signal,
+  });
+
+  if (!response.ok) {
+    const error = new Error(`HTTP error! status: ${response.status}`);
+    error.status = response.status;
+    throw error;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder("utf-8");
+  let buffer = "";
+  let resultado = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Cada evento SSE termina con una línea en blanco
+    let separador = buffer.indexOf("\n\n");
+    while (separador !== -1) {
+      const bloque = buffer.slice(0, separador);
+      buffer = buffer.slice(separador + 2);
+      separador = buffer.indexOf("\n\n");
+
+      let evento = "message";
+      let datos = "";
+      bloque.split("\n").forEach((linea) => {
+        if (linea.startsWith("event:")) evento = linea.slice(6).trim();
+        else if (linea.startsWith("data:")) datos += linea.slice(5).trim();
+      });
+      if (!datos) continue;
+
+      const payload = JSON.parse(datos);
+      if (evento === "token") {
+        if (onToken) onToken(payload.token);
+      } else if (evento === "done") {
+        resultado = payload;
+      } else if (evento === "error") {
+        throw new Error(payload.error || "Error en la generación");
+      }
+    }
+  }
+
+  if (!resultado) {
+    throw new Error("La conexión terminó antes de recibir la respuesta completa");
+  }
+  return resultado;
+}
@@ -0,0 +1,226 @@
+"""
+Benchmark y prueba de regresión de QuestionClassifier sobre un corpus etiquetado.
+
+El corpus (corpus_clasificador.jsonl) tiene una pregunta por línea con el
+tipo de usuario y la ruta esperada: el subtipo directo o "complex". Se reporta:
+- exactitud y tasa de llamadas al LLM (preguntas clasificadas como complex),
+- errores que cuestan una llamada a Grok (directa enviada al LLM) y los que
+  dan una respuesta equivocada (compleja respondida como directa o con otro subtipo),
+- matriz de confusión por subtipo,
+- clasificaciones por segundo y latencia p50/p99 por llamada.
+
+Con --base se evalúa también el clasificador de otra revisión de git, para
+ver cuántas llamadas al LLM agregaría o quitaría un cambio de patrones.
+Con --motor ml se mide el motor de n-gramas (con respaldo regex) y su
+rendimiento en lote.
+
+Uso (desde agenteSAES_phi/):
+    python -m benchmarks.bench_clasificador
+    python -m benchmarks.bench_clasificador --base HEAD~1 --errores
+    python -m benchmarks.bench_clasificador --min-exactitud 0.9 --max-tasa-llm 0.3
+    python -m benchmarks.bench_clasificador --csv confusion.csv
+    python -m benchmarks.bench_clasificador --motor ml --umbral 0.5 --base HEAD
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import question_classifier
+
+RUTA_CORPUS = os.path.join(os.path.dirname(__file__), "corpus_clasificador.jsonl")
+COMPLEX = "complex"
+
+
+def cargar_corpus(ruta: str) -> list:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def cargar_clasificador_de_revision(ref: str):
+    """Importa question_classifier.py tal como está en la revisión `ref` de git."""
+    codigo = subprocess.run(
+        ["git", "show", f"{ref}:./question_classifier.py"],
+        check=True, capture_output=True, text=True, encoding="utf-8",
+    ).stdout
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False, encoding="utf-8") as f:
+        f.write(codigo)
+    spec = importlib.util.spec_from_file_location(f"question_classifier_{ref}", f.name)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    os.unlink(f.name)
+    return modulo.QuestionClassifier
+
+
+def _etiqueta(resultado: tuple) -> str:
+    tipo, subtipo = resultado
+    return subtipo if tipo == "direct" and subtipo else COMPLEX
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def evaluar(clasificador, corpus: list) -> dict:
+    confusion = Counter()
+    errores = []
+    for ejemplo in corpus:
+        predicho = _etiqueta(clasificador.classify(ejemplo["pregunta"]))
+        esperado = ejemplo["esperado"]
+        confusion[(esperado, predicho)] += 1
+        if predicho != esperado:
+            errores.append((ejemplo["pregunta"], esperado, predicho))
+
+    n = len(corpus)
+    aciertos = sum(c for (e, p), c in confusion.items() if e == p)
+    directas_al_llm = sum(c for (e, p), c in confusion.items() if e != COMPLEX and p == COMPLEX)
+    complejas_directas = sum(c for (e, p), c in confusion.items() if e == COMPLEX and p != COMPLEX)
+    subtipo_equivocado = sum(c for (e, p), c in confusion.items() if COMPLEX not in (e, p) and e != p)
+    return {
+        "n": n,
+        "exactitud": aciertos / n,
+        "tasa_llm": sum(c for (_, p), c in confusion.items() if p == COMPLEX) / n,
+        "tasa_llm_esperada": sum(c for (e, _), c in confusion.items() if e == COMPLEX) / n,
+        "directas_al_llm": directas_al_llm,
+        "complejas_directas": complejas_directas,
+        "subtipo_equivocado": subtipo_equivocado,
+        "confusion": confusion,
+        "errores": errores,
+    }
+
+
+def medir_rendimiento(clasificador, preguntas: list, repeticiones: int) -> tuple:
+    """Devuelve (clasificaciones/s, latencias por llamada en µs)."""
+    for pregunta in preguntas:  # calentamiento
+        clasificador.classify(pregunta)
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for pregunta in preguntas:
+            clasificador.classify(pregunta)
+    por_segundo = repeticiones * len(preguntas) / (time.perf_counter() - inicio)
+
+    latencias = []
+    for pregunta in preguntas:
+        for _ in range(max(1, repeticiones // 10)):
+            t = time.perf_counter_ns()
+            clasificador.classify(pregunta)
+            latencias.append((time.perf_counter_ns() - t) / 1000)
+    return por_segundo, latencias
+
+
+def medir_lote(clasificador, preguntas: list, repeticiones: int) -> float:
+    """Clasificaciones/s usando classify_batch sobre todo el corpus."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        clasificador.classify_batch(preguntas)
+    return repeticiones * len(preguntas) / (time.perf_counter() - inicio)
+
+
+def _imprimir_resultado(nombre: str, r: dict, por_segundo: float, latencias: list):
+    print(f"\n=== {nombre} ===")
+    print(
+        f"Exactitud: {r['exactitud']:.1%}  Tasa LLM: {r['tasa_llm']:.1%} "
+        f"(esperada {r['tasa_llm_esperada']:.1%})"
+    )
+    print(
+        f"Directas enviadas al LLM: {r['directas_al_llm']}  Complejas respondidas como directas: "
+        f"{r['complejas_directas']}  Subtipo equivocado: {r['subtipo_equivocado']}"
+    )
+    print(
+        f"Rendimiento: {por_segundo:,.0f} clasificaciones/s  p50={_percentil(latencias, 50):.1f} µs  "
+        f"p99={_percentil(latencias, 99):.1f} µs"
+    )
+
+
+def _imprimir_confusion(confusion: Counter):
+    """Matriz de confusión por filas: esperado -> conteo de cada predicción."""
+    filas = defaultdict(Counter)
+    for (esperado, predicho), conteo in confusion.items():
+        filas[esperado][predicho] += conteo
+    print("\nMatriz de confusión (esperado -> predicho):")
+    for esperado in sorted(filas, key=lambda e: (e == COMPLEX, e)):
+        total = sum(filas[esperado].values())
+        aciertos = filas[esperado][esperado]
+        desvios = ", ".join(
+            f"{predicho}={c}" for predicho, c in filas[esperado].most_common() if predicho != esperado
+        )
+        print(f"  {esperado:<42} {aciertos:>3}/{total:<3} {desvios}")
+
+
+def _guardar_csv(ruta: str, confusion: Counter):
+    etiquetas = sorted({e for e, _ in confusion} | {p for _, p in confusion}, key=lambda e: (e == COMPLEX, e))
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["esperado \\ predicho"] + etiquetas)
+        for esperado in etiquetas:
+            escritor.writerow([esperado] + [confusion[(esperado, p)] for p in etiquetas])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de QuestionClassifier")
+    parser.add_argument("--corpus", default=RUTA_CORPUS, help="Corpus etiquetado (JSONL)")
+    parser.add_argument("--repeticiones", type=int, default=200, help="Pasadas sobre el corpus para medir rendimiento")
+    parser.add_argument("--motor", choices=["regex", "ml"], help="Motor a medir (por defecto, CLASSIFIER_ENGINE)")
+    parser.add_argument("--modelo", help="Artefacto del motor ml (por defecto, CLASSIFIER_MODEL_PATH)")
+    parser.add_argument("--umbral", type=float, help="Confianza mínima del motor ml antes de usar los patrones")
+    parser.add_argument("--base", help="Revisión de git a comparar (p. ej. HEAD~1 o main)")
+    parser.add_argument("--errores", action="store_true", help="Lista las preguntas mal clasificadas")
+    parser.add_argument("--csv", help="Guarda la matriz de confusión completa en este CSV")
+    parser.add_argument("--min-exactitud", type=float, help="Falla (código 1) si la exactitud queda por debajo")
+    parser.add_argument("--max-tasa-llm", type=float, help="Falla (código 1) si la tasa de llamadas al LLM la supera")
+    args = parser.parse_args()
+
+    corpus = cargar_corpus(args.corpus)
+    preguntas = [e["pregunta"] for e in corpus]
+    print(f"Corpus: {len(corpus)} preguntas ({Counter(e['usuario'] for e in corpus)})")
+
+    clasificador = question_classifier.QuestionClassifier
+    if args.motor or args.modelo or args.umbral is not None:
+        clasificador.configurar_motor(args.motor or clasificador.motor, args.modelo, args.umbral)
+    if clasificador.motor == "ml" and clasificador._modelo_ml() is None:
+        print("Error: no se pudo cargar el modelo; ejecuta entrenar_clasificador.py.")
+        sys.exit(1)
+    resultado = evaluar(clasificador, corpus)
+    _imprimir_resultado(f"actual ({clasificador.motor})", resultado,
+                        *medir_rendimiento(clasificador, preguntas, args.repeticiones))
+    if clasificador.motor == "ml":
+        print(f"En lote (classify_batch): {medir_lote(clasificador, preguntas, args.repeticiones):,.0f} clasificaciones/s")
+    _imprimir_confusion(resultado["confusion"])
+    if args.errores:
+        print("\nMal clasificadas:")
+        for pregunta, esperado, predicho in resultado["errores"]:
+            print(f"  {pregunta!r}: esperado={esperado} predicho={predicho}")
+    if args.csv:
+        _guardar_csv(args.csv, resultado["confusion"])
+
+    if args.base:
+        base = cargar_clasificador_de_revision(args.base)
+        resultado_base = evaluar(base, corpus)
+        _imprimir_resultado(f"base ({args.base})", resultado_base, *medir_rendimiento(base, preguntas, args.repeticiones))
+        cambio_llm = (resultado["tasa_llm"] - resultado_base["tasa_llm"]) * len(corpus)
+        print(
+            f"\nCambio respecto a {args.base}: exactitud {resultado['exactitud'] - resultado_base['exactitud']:+.1%}, "
+            f"llamadas al LLM {cambio_llm:+.0f} de {len(corpus)} preguntas"
+        )
+
+    fallas = []
+    if args.min_exactitud is not None and resultado["exactitud"] < args.min_exactitud:
+        fallas.append(f"exactitud {resultado['exactitud']:.1%} < {args.min_exactitud:.1%}")
+    if args.max_tasa_llm is not None and resultado["tasa_llm"] > args.max_tasa_llm:
+        fallas.append(f"tasa LLM {resultado['tasa_llm']:.1%} > {args.max_tasa_llm:.1%}")
+    if fallas:
+        print(f"\nREGRESIÓN: {'; '.join(fallas)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark de la carga del perfil de alumno contra MySQL.
+
+Compara las consultas secuenciales con sp_datos_alumno (un solo viaje)
+y verifica que ambos caminos devuelvan el mismo diccionario.
+
+Uso (desde agenteSAES_phi/):
+    python -m benchmarks.bench_datos_usuario                      # 20 boletas, 30 repeticiones
+    python -m benchmarks.bench_datos_usuario --boletas 2020630001 2020630002
+    python -m benchmarks.bench_datos_usuario --repeticiones 100
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+import db_utils
+
+
+def _boletas_de_muestra(n: int) -> list:
+    """Toma las primeras n boletas de la tabla estudiante."""
+    conn = db_utils._get_db_connection()
+    if not conn:
+        return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id_usuario FROM estudiante ORDER BY id_usuario LIMIT %s;", (n,))
+        return [str(fila[0]) for fila in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def _medir(boletas: list, repeticiones: int, usar_procedimiento: bool) -> list:
+    """Devuelve las latencias (ms) de cada carga."""
+    tiempos = []
+    for _ in range(repeticiones):
+        for boleta in boletas:
+            inicio = time.perf_counter()
+            db_utils.obtener_datos_usuario(boleta, usar_procedimiento=usar_procedimiento)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _resumen(nombre: str, tiempos: list):
+    print(
+        f"{nombre:<14} n={len(tiempos):<6} media={statistics.mean(tiempos):8.2f} ms  "
+        f"p50={_percentil(tiempos, 50):8.2f} ms  p95={_percentil(tiempos, 95):8.2f} ms  "
+        f"p99={_percentil(tiempos, 99):8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de obtener_datos_usuario")
+    parser.add_argument("--boletas", nargs="*", help="Boletas a cargar (por defecto se toman de la BD)")
+    parser.add_argument("--muestra", type=int, default=20, help="Número de boletas a tomar de la BD")
+    parser.add_argument("--repeticiones", type=int, default=30, help="Repeticiones por boleta")
+    args = parser.parse_args()
+
+    boletas = args.boletas or _boletas_de_muestra(args.muestra)
+    if not boletas:
+        print("No hay boletas para medir. Verifica la conexión a la BD.")
+        return
+
+    # Verificar que ambos caminos producen el mismo perfil; si no, medir no tiene sentido
+    diferentes = {}
+    for b in boletas:
+        secuencial = db_utils.obtener_datos_usuario(b, usar_procedimiento=False) or {}
+        procedimiento = db_utils.obtener_datos_usuario(b, usar_procedimiento=True) or {}
+        campos = sorted(k for k in secuencial.keys() | procedimiento.keys()
+                        if secuencial.get(k) != procedimiento.get(k))
+        if campos or not secuencial:
+            diferentes[b] = campos or ["perfil vacío"]
+    if diferentes:
+        for b, campos in diferentes.items():
+            print(f"ERROR: {b}: campos distintos entre secuencial y procedimiento: {campos}")
+        sys.exit(1)
+
+    # Calentar el pool de conexiones
+    _medir(boletas[:1], 3, False)
+    _medir(boletas[:1], 3, True)
+
+    print(f"\nBoletas: {len(boletas)}  Repeticiones: {args.repeticiones}\n")
+    secuencial = _medir(boletas, args.repeticiones, usar_procedimiento=False)
+    procedimiento = _medir(boletas, args.repeticiones, usar_procedimiento=True)
+    _resumen("secuencial", secuencial)
+    _resumen("procedimiento", procedimiento)
+    print(f"\nMejora en la mediana: {_percentil(secuencial, 50) / _percentil(procedimiento, 50):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
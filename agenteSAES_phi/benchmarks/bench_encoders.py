@@ -0,0 +1,83 @@
+"""
+Micro-benchmark de los backends del codificador de consultas (encoders.py).
+
+Cada backend se mide en un proceso nuevo, para que la memoria reportada
+(RSS máximo) sea solo la suya: tiempo de carga, latencia de encode de una
+consulta y RSS.
+
+Uso (desde agenteSAES_phi/):
+    python -m benchmarks.bench_encoders                       # todos los backends
+    python -m benchmarks.bench_encoders --backends torch onnx-int8
+    python -m benchmarks.bench_encoders --repeticiones 200
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import statistics
+import time
+
+from encoders import BACKENDS, crear_encoder
+
+# No se importan de bench_rag: cargaría spaCy y alteraría la memoria medida
+CONSULTAS_MUESTRA = [
+    "¿Cuáles son los requisitos para la reinscripción?",
+    "¿Cuántas veces puedo presentar un ETS?",
+    "¿Cómo solicito una baja temporal?",
+    "¿Qué opciones de titulación existen?",
+]
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _medir_backend(backend: str, repeticiones: int, salida):
+    try:
+        inicio = time.perf_counter()
+        encoder = crear_encoder(backend)
+        carga_s = time.perf_counter() - inicio
+
+        encoder.encode(CONSULTAS_MUESTRA[:1], convert_to_numpy=True)  # calentamiento
+        tiempos = []
+        for i in range(repeticiones):
+            consulta = CONSULTAS_MUESTRA[i % len(CONSULTAS_MUESTRA)]
+            inicio = time.perf_counter()
+            encoder.encode([consulta], convert_to_numpy=True)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+
+        # En Linux ru_maxrss está en KB
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        salida.put({"backend": backend, "carga_s": carga_s, "tiempos": tiempos, "rss_mb": rss_mb})
+    except Exception as e:
+        salida.put({"backend": backend, "error": str(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los backends de embeddings")
+    parser.add_argument("--backends", nargs="*", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--repeticiones", type=int, default=100, help="Consultas a codificar por backend")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"\nRepeticiones: {args.repeticiones}\n")
+    for backend in args.backends:
+        salida = ctx.Queue()
+        proceso = ctx.Process(target=_medir_backend, args=(backend, args.repeticiones, salida))
+        proceso.start()
+        r = salida.get()
+        proceso.join()
+
+        if "error" in r:
+            print(f"{backend:<10} no disponible: {r['error']}")
+            continue
+        t = r["tiempos"]
+        print(
+            f"{backend:<10} carga={r['carga_s']:6.2f} s  media={statistics.mean(t):7.2f} ms  "
+            f"p50={_percentil(t, 50):7.2f} ms  p95={_percentil(t, 95):7.2f} ms  RSS máx={r['rss_mb']:7.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Micro-benchmark de ReglamentoRAG.buscar_contexto.
+
+Mide la latencia por consulta y compara el filtrado de candidatos anterior
+(_is_noise + normalización por fragmento en cada consulta) con las búsquedas
+en los arreglos precalculados al cargar el índice. También compara el
+rendimiento de los embeddings de consultas concurrentes con y sin el
+agrupador (EmbeddingBatcher), y el ranking híbrido con BM25 normalizado por
+consulta frente al BM25 crudo con el peso que tenía el conteo de coincidencias.
+
+Uso (desde agenteSAES_phi/):
+    python -m benchmarks.bench_rag                     # consultas de muestra, 50 repeticiones
+    python -m benchmarks.bench_rag --repeticiones 200
+    python -m benchmarks.bench_rag --consultas "requisitos de baja temporal"
+    python -m benchmarks.bench_rag --hilos 16 --lote 32 --ventana-ms 2
+"""
+
+import argparse
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from embedding_batcher import EmbeddingBatcher
+from utils_rag import (
+    PESO_FAISS,
+    PESO_LEXICO,
+    PESO_LEXICO_SIN_NORMALIZAR,
+    ReglamentoRAG,
+    _is_noise,
+    _lexical_tokens,
+    _normalize_text,
+)
+
+CONSULTAS_MUESTRA = [
+    "¿Cuáles son los requisitos para la reinscripción?",
+    "¿Cuántas veces puedo presentar un ETS?",
+    "¿Qué pasa si repruebo una materia dos veces?",
+    "¿Cómo solicito una baja temporal?",
+    "¿Qué opciones de titulación existen?",
+    "¿Qué es un dictamen de la comisión de situación escolar?",
+    "¿Cuál es el promedio mínimo para ser alumno regular?",
+    "¿Cómo funciona la movilidad académica?",
+]
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _resumen(nombre: str, tiempos: list):
+    print(
+        f"{nombre:<22} n={len(tiempos):<6} media={statistics.mean(tiempos):8.3f} ms  "
+        f"p50={_percentil(tiempos, 50):8.3f} ms  p95={_percentil(tiempos, 95):8.3f} ms  "
+        f"p99={_percentil(tiempos, 99):8.3f} ms"
+    )
+
+
+def _candidatos(rag: ReglamentoRAG, consulta: str, k_faiss: int = 30) -> list:
+    """Ids de los fragmentos que la consulta tiene que filtrar (FAISS + léxico)."""
+    q_emb = rag.embedder.encode([consulta.lower()], convert_to_numpy=True,
+                                normalize_embeddings=rag.normalizar_consulta)
+    _, indices = rag.index.search(q_emb, k_faiss, params=rag._parametros_faiss(k_faiss))
+    ids = {int(i) for i in indices[0] if 0 <= i < len(rag.textos)}
+    ids.update(int(i) for i in np.flatnonzero(rag.puntajes_lexicos(_lexical_tokens(consulta))))
+    return sorted(ids)
+
+
+def _filtro_anterior(rag: ReglamentoRAG, ids: list) -> int:
+    vigentes = 0
+    for idx in ids:
+        if _is_noise(rag.textos[idx]):
+            continue
+        _ = "articulo" in rag.textos[idx][:100].lower()
+        _ = _normalize_text(re.sub(r"\s+", " ", rag.textos[idx].strip()))
+        vigentes += 1
+    return vigentes
+
+
+def _filtro_precalculado(rag: ReglamentoRAG, ids: list) -> int:
+    vigentes = 0
+    for idx in ids:
+        if rag.es_ruido[idx]:
+            continue
+        _ = rag.bonus_articulo[idx]
+        _ = rag.textos_norm[idx]
+        vigentes += 1
+    return vigentes
+
+
+def _comparar_rankings(rag: ReglamentoRAG, consultas: list, top: int = 5):
+    """Candidatos del ranking híbrido con BM25 crudo (antes) y normalizado (después)."""
+    print(f"\nRanking híbrido (top {top}): BM25 crudo x{PESO_LEXICO_SIN_NORMALIZAR} -> "
+          f"BM25 normalizado x{PESO_LEXICO}, FAISS x{PESO_FAISS}\n")
+    coincidencias, mismo_orden = [], 0
+    for consulta in consultas:
+        antes = rag.buscar_contexto(consulta, top_merge=top, normalizar_lexico=False, solo_ids=True)
+        despues = rag.buscar_contexto(consulta, top_merge=top, solo_ids=True)
+        comunes = len(set(antes) & set(despues))
+        coincidencias.append(comunes / max(1, len(antes)))
+        mismo_orden += antes == despues
+        print(f"  {consulta[:60]:<60} comunes={comunes}/{len(antes)}  antes={antes}  después={despues}")
+    print(f"\nCoincidencia media del top {top}: {statistics.mean(coincidencias):.0%}; "
+          f"mismo orden en {mismo_orden}/{len(consultas)} consultas")
+
+
+def _medir(funcion, repeticiones: int) -> list:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def _embeddings_concurrentes(encoder, consultas: list, hilos: int, rondas: int) -> tuple:
+    """Codifica las consultas desde varios hilos. Devuelve (consultas/s, latencias en ms)."""
+    def _una(consulta):
+        inicio = time.perf_counter()
+        encoder.encode([consulta], convert_to_numpy=True)
+        return (time.perf_counter() - inicio) * 1000
+
+    trabajo = consultas * rondas
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        latencias = list(pool.map(_una, trabajo))
+    return len(trabajo) / (time.perf_counter() - inicio), latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ReglamentoRAG.buscar_contexto")
+    parser.add_argument("--consultas", nargs="*", help="Consultas a medir (por defecto, de muestra)")
+    parser.add_argument("--repeticiones", type=int, default=50, help="Repeticiones por consulta")
+    parser.add_argument("--hilos", type=int, default=16, help="Hilos concurrentes para la prueba de embeddings")
+    parser.add_argument("--lote", type=int, default=32, help="Tamaño máximo de lote del agrupador")
+    parser.add_argument("--ventana-ms", type=float, default=2.0, help="Ventana de espera del agrupador")
+    args = parser.parse_args()
+    consultas = args.consultas or CONSULTAS_MUESTRA
+
+    inicio = time.perf_counter()
+    rag = ReglamentoRAG()
+    print(f"Carga del RAG: {time.perf_counter() - inicio:.2f} s {rag.tiempos_carga}")
+
+    # Calentar el modelo y spaCy
+    rag.buscar_contexto(consultas[0])
+
+    print(f"\nConsultas: {len(consultas)}  Repeticiones: {args.repeticiones}\n")
+    busqueda, anterior, precalculado = [], [], []
+    for consulta in consultas:
+        busqueda += _medir(lambda: rag.buscar_contexto(consulta), args.repeticiones)
+        ids = _candidatos(rag, consulta)
+        if _filtro_anterior(rag, ids) != _filtro_precalculado(rag, ids):
+            print(f"ADVERTENCIA: la máscara de ruido no coincide con _is_noise para '{consulta}'")
+        anterior += _medir(lambda: _filtro_anterior(rag, ids), args.repeticiones)
+        precalculado += _medir(lambda: _filtro_precalculado(rag, ids), args.repeticiones)
+
+    _resumen("buscar_contexto", busqueda)
+    _resumen("filtro anterior", anterior)
+    _resumen("filtro precalculado", precalculado)
+    print(f"\nMejora del filtrado en la mediana: {_percentil(anterior, 50) / _percentil(precalculado, 50):.1f}x")
+
+    _comparar_rankings(rag, consultas)
+
+    print(f"\nEmbeddings concurrentes: {args.hilos} hilos\n")
+    rondas = max(1, args.repeticiones // 5)
+    directo_qps, directo = _embeddings_concurrentes(rag.modelo_embeddings, consultas, args.hilos, rondas)
+    batcher = EmbeddingBatcher(rag.modelo_embeddings, args.lote, args.ventana_ms)
+    agrupado_qps, agrupado = _embeddings_concurrentes(batcher, consultas, args.hilos, rondas)
+    batcher.cerrar()
+    _resumen("encode directo", directo)
+    _resumen("encode agrupado", agrupado)
+    print(f"Rendimiento: directo {directo_qps:.1f} consultas/s, agrupado {agrupado_qps:.1f} consultas/s")
+    print(f"Agrupador: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
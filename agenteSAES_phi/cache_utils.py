@@ -0,0 +1,176 @@
+import asyncio
+import sys
+from threading import RLock
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from cachetools import TTLCache
+
+
+def tamano_aproximado(obj: Any) -> int:
+    """Estimación en bytes de un perfil (dicts, listas y cadenas anidadas)."""
+    tamano = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        tamano += sum(tamano_aproximado(k) + tamano_aproximado(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        tamano += sum(tamano_aproximado(v) for v in obj)
+    return tamano
+
+
+class _TTLCacheContado(TTLCache):
+    """TTLCache que cuenta los desalojos por tamaño y las expiraciones por TTL."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        # cachetools llama a popitem() solo cuando necesita espacio
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expirados = super().expire(time)
+        self.expirations += len(expirados or ())
+        return expirados
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+    Los demás llamadores esperan el resultado del primero.
+    """
+
+    def __init__(self):
+        self._en_vuelo: Dict[Hashable, asyncio.Task] = {}
+        self.compartidas = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        tarea = self._en_vuelo.get(key)
+        if tarea is None:
+            tarea = asyncio.ensure_future(fn())
+            self._en_vuelo[key] = tarea
+            tarea.add_done_callback(lambda t, k=key: self._liberar(k, t))
+        else:
+            self.compartidas += 1
+        # shield: si un llamador se cancela, la carga sigue para los demás
+        return await asyncio.shield(tarea)
+
+    def _liberar(self, key: Hashable, tarea: asyncio.Task):
+        if self._en_vuelo.get(key) is tarea:
+            del self._en_vuelo[key]
+
+    def olvidar(self, key: Hashable):
+        """La siguiente llamada con esta clave inicia una carga nueva."""
+        self._en_vuelo.pop(key, None)
+
+    def olvidar_prefijo(self, prefijo: str):
+        """Como olvidar(), para todas las claves de texto que empiezan con el prefijo."""
+        for key in [k for k in self._en_vuelo if isinstance(k, str) and k.startswith(prefijo)]:
+            del self._en_vuelo[key]
+
+    def en_vuelo(self) -> int:
+        return len(self._en_vuelo)
+
+
+class ProfileCache:
+    """
+    Caché única de perfiles de usuario: acotada por memoria, con TTL,
+    invalidación por usuario y carga single-flight ante fallos concurrentes.
+    Cada sección del perfil (identidad, kardex, inscritas...) es una entrada
+    propia, así una respuesta directa solo carga y guarda lo que usa.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self._cache = _TTLCacheContado(maxsize=max_bytes, ttl=ttl, getsizeof=tamano_aproximado)
+        self._lock = RLock()
+        self._vuelos = SingleFlight()
+        # Se incrementa en cada invalidación para descartar cargas que empezaron antes
+        self._generacion = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def clave(tipo_usuario: str, id_usuario: str) -> str:
+        return f"{tipo_usuario.lower()}:{id_usuario}"
+
+    async def get_or_load(self, tipo_usuario: str, id_usuario: str, secciones: Iterable[str],
+                          cargador: Callable[[List[str]], Awaitable[Optional[Dict[str, Dict]]]]) -> Optional[Dict]:
+        """
+        Devuelve los campos de las secciones pedidas en un solo diccionario.
+        `cargador` recibe las secciones que faltan y devuelve {sección: campos},
+        o None si el usuario no existe.
+        """
+        usuario = self.clave(tipo_usuario, id_usuario)
+        secciones = list(secciones)
+        encontradas: Dict[str, Dict] = {}
+        faltantes: List[str] = []
+        with self._lock:
+            for seccion in secciones:
+                campos = self._cache.get(f"{usuario}/{seccion}")
+                if campos is None:
+                    faltantes.append(seccion)
+                else:
+                    encontradas[seccion] = campos
+            self.hits += len(encontradas)
+            self.misses += len(faltantes)
+            generacion = self._generacion
+
+        if faltantes:
+            async def _cargar():
+                cargadas = await cargador(faltantes)
+                if cargadas:
+                    with self._lock:
+                        if self._generacion == generacion:
+                            for seccion, campos in cargadas.items():
+                                try:
+                                    self._cache[f"{usuario}/{seccion}"] = campos
+                                except ValueError:
+                                    # Sección más grande que toda la caché: se sirve sin guardar
+                                    pass
+                return cargadas
+
+            cargadas = await self._vuelos.run(f"{usuario}/{'+'.join(sorted(faltantes))}", _cargar)
+            if not cargadas:
+                return None
+            encontradas.update(cargadas)
+
+        datos: Dict[str, Any] = {}
+        for seccion in secciones:
+            datos.update(encontradas.get(seccion, {}))
+        return datos
+
+    def invalidate(self, tipo_usuario: str, id_usuario: str) -> bool:
+        """Descarta todas las secciones de un usuario. Devuelve True si alguna estaba en caché."""
+        prefijo = f"{self.clave(tipo_usuario, id_usuario)}/"
+        with self._lock:
+            self._generacion += 1
+            self._vuelos.olvidar_prefijo(prefijo)
+            claves = [k for k in list(self._cache.keys()) if k.startswith(prefijo)]
+            for k in claves:
+                self._cache.pop(k, None)
+            return bool(claves)
+
+    def clear(self):
+        with self._lock:
+            self._generacion += 1
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._cache.expire()
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._cache),
+                "usuarios": len({k.split("/", 1)[0] for k in list(self._cache.keys())}),
+                "bytes": self._cache.currsize,
+                "max_bytes": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self._cache.evictions,
+                "expirations": self._cache.expirations,
+                "cargas_compartidas": self._vuelos.compartidas,
+                "cargas_en_vuelo": self._vuelos.en_vuelo(),
+            }
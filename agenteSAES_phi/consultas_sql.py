@@ -0,0 +1,200 @@
+"""
+Consultas SQL del agente, en un solo lugar.
+
+Las consultas del perfil de alumno son también el cuerpo del procedimiento
+sp_datos_alumno: ISSI/BD/07_procedimientos_agente.sql se genera con
+generar_procedimientos.py a partir de este módulo, así que no hay que
+mantener el SQL en dos sitios. Este módulo no importa el driver de MySQL.
+"""
+
+PROCEDIMIENTO_DATOS_ALUMNO = "sp_datos_alumno"
+
+# Consultas del perfil de alumno. sp_datos_alumno ejecuta estas mismas
+# consultas en el mismo orden en un solo viaje a la BD; su CREATE PROCEDURE
+# se genera desde aquí (ver sql_procedimiento_datos_alumno). Las fechas del
+# semestre no forman parte del perfil: se leen de cache_fechas.
+SQL_ALUMNO_INFO = """
+    SELECT 
+        dp.id AS boleta,
+        dp.nombre,
+        dp.ape_paterno,
+        dp.ape_materno,
+        dp.email,
+        dp.carrera,
+        dp.telefono,
+        CONCAT_WS(', ', dp.calle, CONCAT('Núm. ', dp.num_exterior), 
+                  dp.colonia, dp.delegacion, dp.ciudad, CONCAT('CP ', dp.codigo_postal)) AS direccion_completa,
+        e.promedio,
+        e.creditos_disponibles,
+        e.estado_academico
+    FROM datos_personales AS dp
+    JOIN estudiante AS e ON dp.id = e.id_usuario
+    WHERE dp.id = %s;
+"""
+
+SQL_KARDEX_RESUMEN = """
+    SELECT promedio, situacion_academica, semestres_restantes
+    FROM kardex
+    WHERE id_alumno = %s
+    ORDER BY id DESC
+    LIMIT 1;
+"""
+
+SQL_UA_APROBADAS = """
+    SELECT 
+        ua.unidad_aprendizaje AS materia,
+        ua.calificacion_final AS calificacion,
+        ua.semestre,
+        ua.metodo_aprobado,
+        ua.periodo,
+        ua.fecha
+    FROM kardex AS k
+    JOIN ua_aprobada AS ua ON k.id = ua.id_kardex
+    WHERE k.id_alumno = %s
+    ORDER BY ua.fecha DESC;
+"""
+
+SQL_UA_REPROBADAS = """
+    SELECT 
+        mr.id AS id_reprobada, 
+        ua.nombre AS materia,
+        mr.periodos_restantes,
+        mr.recurse,
+        mr.estado_actual
+    FROM materia_reprobada AS mr
+    JOIN unidad_de_aprendizaje AS ua ON mr.id_ua = ua.id
+    WHERE mr.id_estudiante = %s;
+"""
+
+SQL_MATERIAS_INSCRITAS = """
+    SELECT DISTINCT
+        u.nombre AS materia,
+        g.nombre AS grupo,
+        g.turno,
+        u.credito AS credito,
+        CONCAT_WS(' ', dp2.nombre, dp2.ape_paterno, dp2.ape_materno) AS profesor_nombre,
+        u.semestre,
+        GROUP_CONCAT(
+            CONCAT(d.dia, ' ', d.hora_ini, '-', d.hora_fin) 
+            ORDER BY FIELD(d.dia, 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'), d.hora_ini
+            SEPARATOR ', '
+        ) AS horario_detallado
+    FROM horario AS h
+    JOIN mat_inscritos AS mi ON h.id = mi.id_horario
+    JOIN grupo AS g ON mi.id_grupo = g.id
+    JOIN unidad_de_aprendizaje AS u ON g.id_ua = u.id
+    JOIN datos_personales AS dp2 ON g.id_prof = dp2.id
+    LEFT JOIN distribucion AS d ON g.id = d.id_grupo
+    WHERE h.id_alumno = %s
+    GROUP BY u.nombre, g.nombre, g.turno, u.credito, profesor_nombre, u.semestre;
+"""
+
+SQL_REINSCRIPCION = """
+    SELECT 
+        EXISTS(
+            SELECT 1 
+            FROM inscripcion 
+            WHERE id_alumno = %s 
+              AND NOW() BETWEEN fecha_hora_in AND fecha_hora_cad
+        ) AS reinscripcion_activa,
+        MAX(fecha_hora_cad) AS inscripcion_caduca
+    FROM inscripcion
+    WHERE id_alumno = %s;
+"""
+
+SQL_FECHAS_RELEVANTES = """
+    SELECT * FROM fechas_relevantes ORDER BY inicio_semestre DESC LIMIT 1;
+"""
+
+
+# Consultas del perfil de profesor
+SQL_PROFESOR_INFO = """
+    SELECT 
+        dp.id AS id_profesor,
+        dp.nombre,
+        dp.ape_paterno,
+        dp.ape_materno,
+        dp.email,
+        dp.telefono,
+        dp.grado,
+        dp.calificacion
+    FROM datos_personales AS dp
+    WHERE dp.id = %s AND dp.tipo_usuario = 'profesor';
+"""
+
+SQL_PROFESOR_GRUPOS = """
+    SELECT 
+        ua.nombre AS materia, 
+        g.nombre AS grupo, 
+        g.turno,
+        g.cupo
+    FROM grupo AS g
+    JOIN unidad_de_aprendizaje AS ua ON g.id_ua = ua.id
+    WHERE g.id_prof = %s;
+"""
+
+SQL_PROFESOR_CONTADOR = """
+    SELECT 
+        registrados AS total_resenas,
+        suma / registrados AS promedio_calculado
+    FROM contador
+    WHERE id_profesor = %s;
+"""
+
+SQL_PROFESOR_COMENTARIOS = """
+    SELECT comentarios, calificacion, fecha
+    FROM resena
+    WHERE id_profesor = %s
+    ORDER BY fecha DESC
+    LIMIT 5;
+"""
+
+
+# Result sets de sp_datos_alumno, en el orden que espera db_utils._cargar_alumno_procedimiento
+CONSULTAS_PROCEDIMIENTO_ALUMNO = [
+    ("1. Datos Personales y Académicos de Estudiante", SQL_ALUMNO_INFO),
+    ("2. Resumen Kardex", SQL_KARDEX_RESUMEN),
+    ("3. UA Aprobadas", SQL_UA_APROBADAS),
+    ("4. UA Reprobadas", SQL_UA_REPROBADAS),
+    ("5. Materias Inscritas con Profesores y Horarios Detallados", SQL_MATERIAS_INSCRITAS),
+    ("6. Reinscripción (Ventana activa)", SQL_REINSCRIPCION),
+]
+
+ENCABEZADO_PROCEDIMIENTOS = """\
+-- ==================================================================
+-- 7. PROCEDIMIENTOS DEL AGENTE SAES (agenteSAES_phi)
+-- ==================================================================
+-- ARCHIVO GENERADO: no editar a mano. Las consultas viven en
+-- agenteSAES_phi/consultas_sql.py; para regenerarlo:
+--   python generar_procedimientos.py
+-- Descripción: Carga del perfil académico de un alumno en un solo
+-- viaje a la BD. Devuelve seis result sets, en el mismo orden que
+-- las consultas de db_utils.obtener_datos_usuario:
+--   1. Datos personales y académicos
+--   2. Resumen de kardex
+--   3. UA aprobadas
+--   4. UA reprobadas
+--   5. Materias inscritas con horario detallado
+--   6. Ventana de reinscripción
+-- Las fechas relevantes no se incluyen: el agente las mantiene en caché.
+-- Orden de ejecución: 7
+-- ==================================================================
+USE SAES;
+"""
+
+
+def sql_procedimiento_datos_alumno() -> str:
+    """Script SQL completo que (re)crea sp_datos_alumno a partir de las consultas de arriba."""
+    cuerpo = []
+    for titulo, consulta in CONSULTAS_PROCEDIMIENTO_ALUMNO:
+        cuerpo.append(f"    -- {titulo}")
+        cuerpo.append(consulta.strip("\n").replace("%s", "p_boleta"))
+        cuerpo.append("")
+    return (
+        ENCABEZADO_PROCEDIMIENTOS
+        + f"\nDROP PROCEDURE IF EXISTS {PROCEDIMIENTO_DATOS_ALUMNO};\n\n"
+        + "DELIMITER $$\n\n"
+        + f"CREATE PROCEDURE {PROCEDIMIENTO_DATOS_ALUMNO}(IN p_boleta VARCHAR(15))\nBEGIN\n"
+        + "\n".join(cuerpo).rstrip("\n")
+        + "\nEND$$\n\nDELIMITER ;\n"
+    )
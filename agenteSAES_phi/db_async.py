@@ -0,0 +1,264 @@
+import aiomysql
+import copy
+from typing import Optional, Dict, Any, Iterable, List
+import logging
+import os
+from dotenv import load_dotenv
+
+from consultas_sql import (
+    PROCEDIMIENTO_DATOS_ALUMNO,
+    SQL_ALUMNO_INFO,
+    SQL_KARDEX_RESUMEN,
+    SQL_UA_APROBADAS,
+    SQL_UA_REPROBADAS,
+    SQL_MATERIAS_INSCRITAS,
+    SQL_REINSCRIPCION,
+    SQL_FECHAS_RELEVANTES,
+)
+from perfil_usuario import (
+    ER_SP_DOES_NOT_EXIST,
+    SECCIONES_ALUMNO,
+    SECCIONES_PROFESOR,
+    CONSULTAS_ALUMNO,
+    CONSULTAS_PROFESOR,
+    FORMATEADORES_ALUMNO,
+    FORMATEADORES_PROFESOR,
+    _formatear_datos_usuario,
+    _secciones_alumno,
+    secciones_a_cargar,
+    unir_secciones,
+    _guardar_fechas_en_cache,
+    fechas_en_cache,
+)
+
+load_dotenv()
+
+# Pool asíncrono (aiomysql). Se crea en el arranque de la app con init_pool()
+# cuando DB_BACKEND=async, para que las cargas de perfil no bloqueen el event loop.
+db_pool_async: Optional[aiomysql.Pool] = None
+_usar_procedimientos = os.getenv("DB_USAR_PROCEDIMIENTOS", "1") == "1"
+
+
+async def init_pool():
+    """Crea el pool de conexiones asíncrono."""
+    global db_pool_async
+    if db_pool_async is not None:
+        return
+    db_pool_async = await aiomysql.create_pool(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", 3306)),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", "root"),
+        db=os.getenv("DB_NAME", "SAES"),
+        minsize=int(os.getenv("DB_ASYNC_POOL_MIN", 4)),
+        maxsize=int(os.getenv("DB_ASYNC_POOL_MAX", 32)),
+        # Sin autocommit, una conexión reutilizada leería un snapshot viejo
+        autocommit=True,
+        charset="utf8mb4",
+    )
+    logging.info("Pool MySQL asíncrono creado.")
+
+
+async def close_pool():
+    """Cierra el pool de conexiones asíncrono."""
+    global db_pool_async
+    if db_pool_async is None:
+        return
+    db_pool_async.close()
+    await db_pool_async.wait_closed()
+    db_pool_async = None
+
+
+def estado_pool() -> Optional[tuple]:
+    """(tamaño, conexiones prestadas) del pool asíncrono, o None si no existe."""
+    if db_pool_async is None:
+        return None
+    return db_pool_async.size, db_pool_async.size - db_pool_async.freesize
+
+
+async def _cargar_alumno_secuencial(cursor, boleta: str) -> Optional[tuple]:
+    """Carga los result sets del alumno con una consulta por sección."""
+    await cursor.execute(SQL_ALUMNO_INFO, (boleta,))
+    info = await cursor.fetchone()
+    if not info:
+        return None
+
+    await cursor.execute(SQL_KARDEX_RESUMEN, (boleta,))
+    kardex_resumen = await cursor.fetchone() or {}
+
+    await cursor.execute(SQL_UA_APROBADAS, (boleta,))
+    materias_aprobadas_raw = await cursor.fetchall() or []
+
+    await cursor.execute(SQL_UA_REPROBADAS, (boleta,))
+    materias_reprobadas_raw = await cursor.fetchall() or []
+
+    await cursor.execute(SQL_MATERIAS_INSCRITAS, (boleta,))
+    materias_inscritas_raw = await cursor.fetchall() or []
+
+    await cursor.execute(SQL_REINSCRIPCION, (boleta, boleta))
+    reinsc = await cursor.fetchone() or {"reinscripcion_activa": 0, "inscripcion_caduca": None}
+
+    return (info, kardex_resumen, materias_aprobadas_raw, materias_reprobadas_raw,
+            materias_inscritas_raw, reinsc)
+
+
+async def _cargar_alumno_procedimiento(cursor, boleta: str) -> Optional[tuple]:
+    """Carga los result sets del alumno en un solo viaje con sp_datos_alumno."""
+    await cursor.callproc(PROCEDIMIENTO_DATOS_ALUMNO, (boleta,))
+    resultados = []
+    while True:
+        resultados.append(list(await cursor.fetchall() or []))
+        if not await cursor.nextset():
+            break
+    # El CALL agrega un result set vacío de estado al final
+    if len(resultados) < 6 or not resultados[0]:
+        return None
+
+    info, kardex, aprobadas, reprobadas, inscritas, reinsc = resultados[:6]
+    return (info[0], kardex[0] if kardex else {}, aprobadas, reprobadas, inscritas,
+            reinsc[0] if reinsc else {"reinscripcion_activa": 0, "inscripcion_caduca": None})
+
+
+async def _cargar_alumno_completo(cursor, boleta: str) -> Optional[tuple]:
+    """Los seis result sets del alumno: sp_datos_alumno o, si no existe, consultas secuenciales."""
+    global _usar_procedimientos
+    if _usar_procedimientos:
+        try:
+            return await _cargar_alumno_procedimiento(cursor, boleta)
+        except aiomysql.OperationalError as err:
+            if err.args[0] != ER_SP_DOES_NOT_EXIST:
+                raise
+            logging.warning(
+                f"No existe {PROCEDIMIENTO_DATOS_ALUMNO} en la BD; se usarán consultas secuenciales."
+            )
+            _usar_procedimientos = False
+    return await _cargar_alumno_secuencial(cursor, boleta)
+
+
+async def _leer_seccion(cursor, consultas: list, id_usuario: str) -> list:
+    filas = []
+    for sql, repeticiones, varias, por_defecto in consultas:
+        await cursor.execute(sql, (id_usuario,) * repeticiones)
+        fila = await cursor.fetchall() if varias else await cursor.fetchone()
+        filas.append(fila or copy.copy(por_defecto))
+    return filas
+
+
+async def _cargar_secciones(cursor, consultas: Dict[str, list], formateadores: Dict[str, Any],
+                            id_usuario: str, secciones: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Versión asíncrona de db_utils._cargar_secciones."""
+    resultado = {}
+    for seccion in secciones:
+        filas = await _leer_seccion(cursor, consultas[seccion], id_usuario)
+        if seccion == "identidad" and not filas[0]:
+            return None
+        resultado[seccion] = formateadores[seccion](*filas)
+    return resultado
+
+
+async def _fechas_relevantes(cursor) -> Dict[str, str]:
+    """Calendario del semestre desde la caché compartida (perfil_usuario.cache_fechas)."""
+    fechas = fechas_en_cache()
+    if fechas is not None:
+        return fechas
+    await cursor.execute(SQL_FECHAS_RELEVANTES)
+    return _guardar_fechas_en_cache(await cursor.fetchone())
+
+
+async def obtener_fechas_relevantes_async() -> Dict[str, str]:
+    """Versión asíncrona de db_utils.obtener_fechas_relevantes."""
+    fechas = fechas_en_cache()
+    if fechas is not None:
+        return fechas
+    if db_pool_async is None:
+        logging.error("El pool MySQL asíncrono no está inicializado.")
+        return {}
+
+    try:
+        async with db_pool_async.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                return await _fechas_relevantes(cursor)
+    except aiomysql.Error as err:
+        logging.error(f"Error MySQL en obtener_fechas_relevantes_async: {err}", exc_info=True)
+        return {}
+
+
+async def obtener_secciones_alumno_async(boleta: str, secciones: Iterable[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Versión asíncrona de db_utils.obtener_secciones_alumno."""
+    if not boleta or not isinstance(boleta, str):
+        return None
+    if db_pool_async is None:
+        logging.error("El pool MySQL asíncrono no está inicializado.")
+        return None
+
+    try:
+        async with db_pool_async.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                pedidas = secciones_a_cargar(secciones, SECCIONES_ALUMNO)
+                if len(pedidas) == len(SECCIONES_ALUMNO):
+                    resultados = await _cargar_alumno_completo(cursor, boleta)
+                    return _secciones_alumno(*resultados) if resultados else None
+                return await _cargar_secciones(cursor, CONSULTAS_ALUMNO, FORMATEADORES_ALUMNO, boleta, pedidas)
+
+    except aiomysql.Error as err:
+        logging.error(f"Error MySQL en obtener_secciones_alumno_async: {err}", exc_info=True)
+        return None
+    except Exception as e:
+        logging.error(f"Error general en obtener_secciones_alumno_async: {e}", exc_info=True)
+        return None
+
+
+async def obtener_secciones_profesor_async(id_profesor: str, secciones: Iterable[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Versión asíncrona de db_utils.obtener_secciones_profesor."""
+    if not id_profesor or not isinstance(id_profesor, str):
+        return None
+    if db_pool_async is None:
+        logging.error("El pool MySQL asíncrono no está inicializado.")
+        return None
+
+    try:
+        async with db_pool_async.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                pedidas = secciones_a_cargar(secciones, SECCIONES_PROFESOR)
+                return await _cargar_secciones(cursor, CONSULTAS_PROFESOR, FORMATEADORES_PROFESOR, id_profesor, pedidas)
+
+    except aiomysql.Error as err:
+        logging.error(f"Error MySQL en obtener_secciones_profesor_async: {err}", exc_info=True)
+        return None
+    except Exception as e:
+        logging.error(f"Error general en obtener_secciones_profesor_async: {e}", exc_info=True)
+        return None
+
+
+async def obtener_datos_usuario_async(boleta: str) -> Optional[Dict[str, Any]]:
+    """Versión asíncrona de db_utils.obtener_datos_usuario (mismo diccionario)."""
+    if not boleta or not isinstance(boleta, str):
+        return None
+    if db_pool_async is None:
+        logging.error("El pool MySQL asíncrono no está inicializado.")
+        return None
+
+    try:
+        async with db_pool_async.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                resultados = await _cargar_alumno_completo(cursor, boleta)
+                if not resultados:
+                    return None
+                fechas_semestre = await _fechas_relevantes(cursor)
+
+        return _formatear_datos_usuario(*resultados, fechas_semestre)
+
+    except aiomysql.Error as err:
+        logging.error(f"Error MySQL en obtener_datos_usuario_async: {err}", exc_info=True)
+        return None
+    except Exception as e:
+        logging.error(f"Error general en obtener_datos_usuario_async: {e}", exc_info=True)
+        return None
+
+
+async def obtener_datos_profesor_async(id_profesor: str) -> Optional[Dict[str, Any]]:
+    """Versión asíncrona de db_utils.obtener_datos_profesor (mismo diccionario)."""
+    secciones = await obtener_secciones_profesor_async(id_profesor, SECCIONES_PROFESOR)
+    if not secciones:
+        return None
+    return unir_secciones(secciones, await obtener_fechas_relevantes_async())
@@ -1,9 +1,12 @@
 """
 Uso:
-    python ejecutar_pipeline.py                  # Ejecuta todos los pasos
+    python ejecutar_pipeline.py                  # Ejecuta los pasos 1 a 4
+    python ejecutar_pipeline.py --onnx           # Pasos 1 a 5 (también con PIPELINE_ONNX=1)
     python ejecutar_pipeline.py --paso 1         # Solo genera JSON
     python ejecutar_pipeline.py --paso 2         # Solo limpia JSON existente
     python ejecutar_pipeline.py --paso 3         # Solo genera embeddings
+    python ejecutar_pipeline.py --paso 4         # Solo genera el índice léxico
+    python ejecutar_pipeline.py --paso 5         # Solo exporta y verifica el codificador ONNX
     python ejecutar_pipeline.py --desde 2        # Ejecuta desde el paso 2
 """
 
@@ -13,6 +16,11 @@ from pipeline_completa import (
     paso_1_generar_json,
     paso_2_limpiar_json,
     paso_3_generar_embeddings,
+    paso_4_generar_indice_lexico,
+    paso_5_exportar_encoder,
+    EXPORTAR_ONNX,
+    TIPO_INDICE_FAISS,
+    PARAMETROS_INDICE_FAISS,
     ARCHIVO_JSON_SALIDA,
     EMBEDDING_MODEL,
     SentenceTransformer,
@@ -35,7 +43,7 @@ def cargar_json_existente():
         return None
 
 
-def ejecutar_paso(paso_num, kw_model=None, embed_model=None):
+def ejecutar_paso(paso_num, kw_model=None, embed_model=None, tipo_indice=TIPO_INDICE_FAISS):
     """Ejecuta un paso específico de la pipeline."""
     
     if paso_num == 1:
@@ -60,11 +68,29 @@ def ejecutar_paso(paso_num, kw_model=None, embed_model=None):
         if embed_model is None:
             print("Cargando modelo SentenceTransformer...")
             embed_model = SentenceTransformer(EMBEDDING_MODEL)
-        paso_3_generar_embeddings(embed_model, datos)
+        paso_3_generar_embeddings(embed_model, datos, tipo_indice)
         return datos
     
+    elif paso_num == 4:
+        print("\nEjecutando PASO 4: Generación del índice léxico")
+        if cargar_json_existente() is None:
+            return None
+        paso_4_generar_indice_lexico()
+        return None
+
+    elif paso_num == 5:
+        print("\nEjecutando PASO 5: Exportación ONNX y verificación de recall")
+        datos = cargar_json_existente()
+        if datos is None:
+            return None
+        if embed_model is None:
+            print("Cargando modelo SentenceTransformer...")
+            embed_model = SentenceTransformer(EMBEDDING_MODEL)
+        paso_5_exportar_encoder(embed_model, datos)
+        return datos
+
     else:
-        print(f"Paso {paso_num} no válido. Los pasos válidos son 1, 2 o 3.")
+        print(f"Paso {paso_num} no válido. Los pasos válidos son 1, 2, 3, 4 o 5.")
         return None
 
 
@@ -74,25 +100,34 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Ejemplos de uso:
-  python ejecutar_pipeline.py                    # Ejecuta toda la pipeline
+  python ejecutar_pipeline.py                    # Ejecuta los pasos 1 a 4
+  python ejecutar_pipeline.py --onnx             # Incluye el paso 5 (exportación ONNX)
   python ejecutar_pipeline.py --paso 1           # Solo extrae PDFs y genera JSON
   python ejecutar_pipeline.py --paso 2           # Solo limpia el JSON existente
   python ejecutar_pipeline.py --paso 3           # Solo genera embeddings del JSON existente
-  python ejecutar_pipeline.py --desde 2          # Ejecuta desde el paso 2 hasta el final
+  python ejecutar_pipeline.py --paso 4           # Solo genera el índice léxico del JSON existente
+  python ejecutar_pipeline.py --paso 5           # Solo exporta el codificador ONNX y verifica su recall
+  python ejecutar_pipeline.py --desde 2          # Ejecuta desde el paso 2 hasta el 4 (o el 5 con --onnx)
   python ejecutar_pipeline.py --hasta 2          # Ejecuta hasta el paso 2
+  python ejecutar_pipeline.py --paso 3 --indice ivfpq  # Índice FAISS IVF-PQ
         """
     )
     
-    parser.add_argument('--paso', type=int, choices=[1, 2, 3],
-                       help='Ejecuta solo un paso específico (1, 2 o 3)')
-    parser.add_argument('--desde', type=int, choices=[1, 2, 3],
+    parser.add_argument('--paso', type=int, choices=[1, 2, 3, 4, 5],
+                       help='Ejecuta solo un paso específico (1, 2, 3, 4 o 5)')
+    parser.add_argument('--desde', type=int, choices=[1, 2, 3, 4, 5],
                        help='Ejecuta desde este paso hasta el final')
-    parser.add_argument('--hasta', type=int, choices=[1, 2, 3],
+    parser.add_argument('--hasta', type=int, choices=[1, 2, 3, 4, 5],
                        help='Ejecuta hasta este paso')
+    parser.add_argument('--indice', choices=sorted(PARAMETROS_INDICE_FAISS), default=TIPO_INDICE_FAISS,
+                       help='Tipo de índice FAISS del paso 3 (por defecto %(default)s)')
+    parser.add_argument('--onnx', action='store_true', default=EXPORTAR_ONNX,
+                       help='Incluye el paso 5 (requiere onnx, onnxruntime y transformers; también PIPELINE_ONNX=1)')
     
     args = parser.parse_args()
     
-    # Determinar qué pasos ejecutar
+    # Determinar qué pasos ejecutar; el paso 5 es opcional
+    ultimo_paso = 5 if args.onnx else 4
     if args.paso:
         pasos = [args.paso]
     elif args.desde and args.hasta:
@@ -101,11 +136,11 @@ Ejemplos de uso:
             sys.exit(1)
         pasos = list(range(args.desde, args.hasta + 1))
     elif args.desde:
-        pasos = list(range(args.desde, 4))
+        pasos = list(range(args.desde, max(args.desde, ultimo_paso) + 1))
     elif args.hasta:
         pasos = list(range(1, args.hasta + 1))
     else:
-        pasos = [1, 2, 3]
+        pasos = list(range(1, ultimo_paso + 1))
     
     print(f"\nPasos a ejecutar: {pasos}")
     
@@ -117,15 +152,15 @@ Ejemplos de uso:
         print("\nInicializando modelo KeyBERT...")
         kw_model = KeyBERT(EMBEDDING_MODEL)
     
-    if 3 in pasos:
+    if 3 in pasos or 5 in pasos:
         print("\nInicializando modelo SentenceTransformer...")
         embed_model = SentenceTransformer(EMBEDDING_MODEL)
     
     # Ejecutar pasos
     datos = None
     for paso in pasos:
-        resultado = ejecutar_paso(paso, kw_model, embed_model)
-        if resultado is None and paso != 3:  # paso 3 no retorna datos
+        resultado = ejecutar_paso(paso, kw_model, embed_model, args.indice)
+        if resultado is None and paso not in (3, 4):  # pasos 3 y 4 no retornan datos
             print(f"\nError en el paso {paso}. Deteniendo ejecución.")
             sys.exit(1)
         if resultado is not None:
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Agrupa los embeddings de consultas concurrentes en un solo `encode`.
+
+    Cada llamador deja sus textos en una cola y espera. Un hilo toma el primer
+    texto, junta los que lleguen durante `ventana_ms` (o hasta `lote_max`),
+    codifica el lote en una pasada del modelo y reparte los vectores.
+    Expone la misma interfaz de `encode` que SentenceTransformer.
+    """
+
+    def __init__(self, modelo, lote_max: int = 32, ventana_ms: float = 2.0):
+        self.modelo = modelo
+        self.lote_max = max(1, lote_max)
+        self.ventana_s = max(0.0, ventana_ms) / 1000
+        self._cola: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self.lotes = 0
+        self.items = 0
+        self.espera_total_s = 0.0
+        self.encode_total_s = 0.0
+        self._hilo = threading.Thread(target=self._bucle, name="embedding-batcher", daemon=True)
+        self._hilo.start()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.modelo.get_sentence_embedding_dimension()
+
+    def encode(self, sentences, convert_to_numpy: bool = True, normalize_embeddings: bool = False, **_):
+        unico = isinstance(sentences, str)
+        textos = [sentences] if unico else list(sentences)
+        ahora = time.perf_counter()
+        futuros = []
+        for texto in textos:
+            futuro = Future()
+            self._cola.put((texto, futuro, ahora))
+            futuros.append(futuro)
+
+        vectores = np.stack([f.result() for f in futuros]).astype(np.float32, copy=False)
+        if normalize_embeddings:
+            normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+            vectores = vectores / np.maximum(normas, 1e-12)
+        return vectores[0] if unico else vectores
+
+    def _bucle(self):
+        while True:
+            item = self._cola.get()
+            if item is None:
+                return
+            lote = [item]
+            limite = time.perf_counter() + self.ventana_s
+            while len(lote) < self.lote_max:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    item = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._cola.put(None)
+                    break
+                lote.append(item)
+            self._procesar(lote)
+
+    def _procesar(self, lote: list):
+        inicio = time.perf_counter()
+        try:
+            vectores = self.modelo.encode(
+                [texto for texto, _, _ in lote], convert_to_numpy=True, batch_size=len(lote)
+            )
+        except Exception as e:
+            for _, futuro, _ in lote:
+                futuro.set_exception(e)
+            return
+        fin = time.perf_counter()
+
+        for (_, futuro, _), vector in zip(lote, vectores):
+            futuro.set_result(vector)
+
+        with self._lock:
+            self.lotes += 1
+            self.items += len(lote)
+            self.espera_total_s += sum(inicio - encolado for _, _, encolado in lote)
+            self.encode_total_s += fin - inicio
+
+    def cerrar(self):
+        self._cola.put(None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "lote_max": self.lote_max,
+                "ventana_ms": self.ventana_s * 1000,
+                "lotes": self.lotes,
+                "items": self.items,
+                "tamano_promedio_lote": round(self.items / self.lotes, 2) if self.lotes else 0.0,
+                "espera_promedio_ms": round(self.espera_total_s / self.items * 1000, 3) if self.items else 0.0,
+                "encode_promedio_ms": round(self.encode_total_s / self.lotes * 1000, 3) if self.lotes else 0.0,
+            }
@@ -0,0 +1,143 @@
+"""
+Backends del codificador de consultas de ReglamentoRAG.
+
+- "torch":     SentenceTransformer original (PyTorch).
+- "onnx":      el mismo modelo exportado a ONNX (fp32) y ejecutado con onnxruntime.
+- "onnx-int8": la exportación ONNX con cuantización dinámica a int8.
+
+Los backends ONNX se generan con el paso 5 del pipeline (ejecutar_pipeline.py),
+que también verifica el recall del modelo int8 contra el índice FAISS.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+
+MODELO_BASE = "all-mpnet-base-v2"
+DIR_ONNX = os.path.join("models", "encoder_onnx")
+ARCHIVO_ONNX = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+ARCHIVO_VERIFICACION = "verificacion.json"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+MAX_TOKENS = 384
+
+
+class OnnxEncoder:
+    """Codificador ONNX con mean pooling y normalización L2, como all-mpnet-base-v2."""
+
+    def __init__(self, dir_modelo: str, archivo: str, hilos: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        ruta = os.path.join(dir_modelo, archivo)
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"No se encontró el modelo ONNX: {ruta}. Ejecuta el paso 5 del pipeline.")
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if hilos > 0:
+            opciones.intra_op_num_threads = hilos
+        self.sesion = ort.InferenceSession(ruta, opciones, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(dir_modelo)
+        self._entradas = {e.name for e in self.sesion.get_inputs()}
+        self._dimension = int(self.sesion.get_outputs()[0].shape[-1])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+    def encode(self, sentences, convert_to_numpy: bool = True, normalize_embeddings: bool = False,
+               batch_size: int = 32, **_):
+        unico = isinstance(sentences, str)
+        textos = [sentences] if unico else list(sentences)
+        salidas = []
+        for i in range(0, len(textos), batch_size):
+            tokens = self.tokenizer(
+                textos[i:i + batch_size], padding=True, truncation=True,
+                max_length=MAX_TOKENS, return_tensors="np",
+            )
+            feed = {k: v.astype(np.int64) for k, v in tokens.items() if k in self._entradas}
+            ultima_capa = self.sesion.run(None, feed)[0]
+            mascara = tokens["attention_mask"][..., None].astype(np.float32)
+            promedio = (ultima_capa * mascara).sum(axis=1) / np.maximum(mascara.sum(axis=1), 1e-9)
+            salidas.append(promedio)
+
+        vectores = np.concatenate(salidas).astype(np.float32)
+        # all-mpnet-base-v2 termina con una capa Normalize: siempre se normaliza
+        vectores /= np.maximum(np.linalg.norm(vectores, axis=1, keepdims=True), 1e-12)
+        return vectores[0] if unico else vectores
+
+
+def crear_encoder(backend: str = "torch", dir_onnx: str = DIR_ONNX):
+    """Crea el codificador del backend indicado."""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(MODELO_BASE)
+    if backend in ARCHIVO_ONNX:
+        if backend == "onnx-int8" and not verificacion_aprobada(dir_onnx):
+            logging.warning("El modelo int8 no tiene una verificación de recall aprobada.")
+        return OnnxEncoder(dir_onnx, ARCHIVO_ONNX[backend])
+    raise ValueError(f"Backend de embeddings no soportado: {backend} (opciones: {', '.join(BACKENDS)})")
+
+
+def exportar_onnx(dir_destino: str = DIR_ONNX, modelo: str = MODELO_BASE) -> dict:
+    """Exporta el transformer a ONNX (fp32) y genera la versión int8 con cuantización dinámica."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(dir_destino, exist_ok=True)
+    st = SentenceTransformer(modelo)
+    transformer = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+    tokenizer.save_pretrained(dir_destino)
+
+    ejemplo = tokenizer(["texto de ejemplo"], return_tensors="pt")
+    nombres = [n for n in ("input_ids", "attention_mask") if n in ejemplo]
+    ejes = {n: {0: "lote", 1: "tokens"} for n in nombres}
+    ejes["last_hidden_state"] = {0: "lote", 1: "tokens"}
+
+    ruta_fp32 = os.path.join(dir_destino, ARCHIVO_ONNX["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(ejemplo[n] for n in nombres),
+            ruta_fp32,
+            input_names=nombres,
+            output_names=["last_hidden_state"],
+            dynamic_axes=ejes,
+            opset_version=14,
+        )
+
+    ruta_int8 = os.path.join(dir_destino, ARCHIVO_ONNX["onnx-int8"])
+    quantize_dynamic(ruta_fp32, ruta_int8, weight_type=QuantType.QInt8)
+    return {"onnx": ruta_fp32, "onnx-int8": ruta_int8}
+
+
+def recall_contra_indice(index, referencia, candidato, consultas: list, k: int = 10,
+                         normalizar: bool = False) -> float:
+    """Recall@k promedio de los vecinos del candidato respecto a los del codificador de referencia."""
+    emb_ref = np.asarray(referencia.encode(consultas, convert_to_numpy=True, normalize_embeddings=normalizar),
+                         dtype=np.float32)
+    emb_cand = np.asarray(candidato.encode(consultas, convert_to_numpy=True, normalize_embeddings=normalizar),
+                          dtype=np.float32)
+    _, vecinos_ref = index.search(emb_ref, k)
+    _, vecinos_cand = index.search(emb_cand, k)
+    aciertos = [
+        len(set(r[r >= 0]) & set(c[c >= 0])) / max(1, len(r[r >= 0]))
+        for r, c in zip(vecinos_ref, vecinos_cand)
+    ]
+    return float(np.mean(aciertos)) if aciertos else 0.0
+
+
+def guardar_verificacion(dir_onnx: str, resultado: dict):
+    with open(os.path.join(dir_onnx, ARCHIVO_VERIFICACION), "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+def verificacion_aprobada(dir_onnx: str = DIR_ONNX) -> bool:
+    ruta = os.path.join(dir_onnx, ARCHIVO_VERIFICACION)
+    if not os.path.exists(ruta):
+        return False
+    with open(ruta, "r", encoding="utf-8") as f:
+        return bool(json.load(f).get("onnx-int8", {}).get("aprobado", False))
@@ -0,0 +1,78 @@
+"""
+Entrena el motor de n-gramas del clasificador (CLASSIFIER_ENGINE=ml).
+
+Uso:
+    python entrenar_clasificador.py                                   # Solo semillas regex
+    python entrenar_clasificador.py --ejemplos consultas_etiquetadas.jsonl
+    python entrenar_clasificador.py --salida models/clasificador_ngramas.npz --epocas 400
+
+Los archivos de --ejemplos tienen el formato del corpus del benchmark: una
+línea JSON con "pregunta" y "esperado" (subtipo directo o "complex").
+El corpus de benchmarks/ se usa solo para evaluar, nunca para entrenar.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from ml_classifier import COMPLEX, RUTA_MODELO, NgramClassifier, ejemplos_semilla, entrenar, normalizar
+
+RUTA_CORPUS_EVALUACION = os.path.join("benchmarks", "corpus_clasificador.jsonl")
+
+
+def cargar_ejemplos(ruta: str) -> list:
+    with open(ruta, "r", encoding="utf-8") as f:
+        filas = [json.loads(linea) for linea in f if linea.strip()]
+    return [(normalizar(f["pregunta"]), f["esperado"]) for f in filas]
+
+
+def evaluar(modelo: NgramClassifier, ruta: str):
+    """Exactitud del modelo solo (sin respaldo regex) sobre el corpus del benchmark."""
+    ejemplos = [e for e in cargar_ejemplos(ruta) if not e[1].startswith("definicion_")]
+    predicciones = modelo.predecir([t for t, _ in ejemplos])
+    aciertos = sum(p == esperado for (p, _), (_, esperado) in zip(predicciones, ejemplos))
+    complejas_directas = sum(
+        p != COMPLEX and esperado == COMPLEX for (p, _), (_, esperado) in zip(predicciones, ejemplos)
+    )
+    print(
+        f"Evaluación en {ruta}: exactitud {aciertos / len(ejemplos):.1%} "
+        f"({len(ejemplos)} preguntas sin definiciones), complejas predichas como directas: {complejas_directas}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el clasificador de n-gramas")
+    parser.add_argument("--ejemplos", nargs="*", default=[], help="JSONL con ejemplos etiquetados adicionales")
+    parser.add_argument("--salida", default=RUTA_MODELO, help="Ruta del artefacto (por defecto %(default)s)")
+    parser.add_argument("--epocas", type=int, default=300)
+    args = parser.parse_args()
+
+    ejemplos = ejemplos_semilla()
+    print(f"Semillas de los patrones regex: {len(ejemplos)}")
+    for ruta in args.ejemplos:
+        if os.path.abspath(ruta) == os.path.abspath(RUTA_CORPUS_EVALUACION):
+            print("Error: el corpus del benchmark es para evaluar; usa otro archivo de ejemplos.")
+            sys.exit(1)
+        adicionales = [e for e in cargar_ejemplos(ruta) if not e[1].startswith("definicion_")]
+        print(f"Ejemplos de {ruta}: {len(adicionales)}")
+        ejemplos += adicionales
+
+    inicio = time.time()
+    modelo = entrenar(ejemplos, epocas=args.epocas)
+    print(
+        f"Entrenado en {time.time() - inicio:.2f} s: {len(modelo.clases)} clases, "
+        f"{len(modelo.vocabulario)} n-gramas"
+    )
+
+    os.makedirs(os.path.dirname(args.salida) or ".", exist_ok=True)
+    modelo.guardar(args.salida)
+    print(f"Modelo guardado en {args.salida} ({os.path.getsize(args.salida) / 1024:.0f} KB)")
+
+    if os.path.exists(RUTA_CORPUS_EVALUACION):
+        evaluar(NgramClassifier.cargar(args.salida), RUTA_CORPUS_EVALUACION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Genera ISSI/BD/07_procedimientos_agente.sql a partir de consultas_sql.py.
+
+sp_datos_alumno ejecuta las mismas consultas que el camino secuencial de
+db_utils; este script evita que el procedimiento y el código se desfasen.
+
+Uso (desde agenteSAES_phi/):
+    python generar_procedimientos.py              # Reescribe el .sql
+    python generar_procedimientos.py --verificar  # Código 1 si el .sql no está al día
+"""
+
+import argparse
+import os
+import sys
+
+from consultas_sql import sql_procedimiento_datos_alumno
+
+RUTA_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ISSI", "BD", "07_procedimientos_agente.sql")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera el procedimiento sp_datos_alumno")
+    parser.add_argument("--salida", default=RUTA_SQL, help="Archivo .sql (por defecto %(default)s)")
+    parser.add_argument("--verificar", action="store_true", help="Solo compara; no escribe")
+    args = parser.parse_args()
+
+    generado = sql_procedimiento_datos_alumno()
+    if args.verificar:
+        try:
+            with open(args.salida, "r", encoding="utf-8") as f:
+                actual = f.read()
+        except FileNotFoundError:
+            actual = None
+        if actual != generado:
+            print(f"{args.salida} no coincide con consultas_sql.py; ejecuta python generar_procedimientos.py")
+            sys.exit(1)
+        print(f"{args.salida} está al día.")
+        return
+
+    with open(args.salida, "w", encoding="utf-8", newline="\n") as f:
+        f.write(generado)
+    print(f"Procedimiento escrito en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
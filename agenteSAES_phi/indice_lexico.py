@@ -0,0 +1,82 @@
+"""
+Persistencia del índice léxico del RAG (reglamentos_ipn.lex.npz).
+
+Solo depende de numpy, así que los procesos de rag_worker y el pipeline
+pueden leerlo y escribirlo sin cargar spaCy. La construcción del índice
+está en utils_rag.construir_indice_lexico.
+"""
+
+import hashlib
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+# Índice léxico serializado: vocabulario de lemas, postings en formato CSR
+# (con frecuencia del lema), longitud de cada fragmento, máscara de ruido y
+# textos normalizados. Se asocia al JSON por su hash.
+ARCHIVO_INDICE_LEXICO = "reglamentos_ipn.lex.npz"
+FORMATO_INDICE_LEXICO = 3
+
+CLAVES_INDICE = ("vocab", "indptr", "docs", "tf", "longitudes", "ruido", "textos_norm")
+
+
+def hash_contenido(datos: bytes) -> str:
+    return hashlib.sha256(datos).hexdigest()
+
+
+def empacar_textos(textos) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Textos como un solo búfer UTF-8 más sus offsets. Un arreglo dtype=str
+    rellena cada entrada hasta el fragmento más largo y uno dtype=object
+    necesitaría pickle al cargar.
+    """
+    codificados = [t.encode("utf-8") for t in textos]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    return np.frombuffer(b"".join(codificados), dtype=np.uint8), offsets
+
+
+def desempacar_textos(datos: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    crudo = datos.tobytes()
+    textos = np.empty(len(offsets) - 1, dtype=object)
+    for i in range(len(textos)):
+        textos[i] = crudo[offsets[i]:offsets[i + 1]].decode("utf-8")
+    return textos
+
+
+def guardar_indice_lexico(path: str, json_hash: str, indice: dict[str, np.ndarray]):
+    """
+    Escribe el índice en un temporal del mismo directorio y lo mueve con
+    os.replace: con RAG_EXECUTOR=process varios procesos pueden reconstruirlo
+    a la vez, y ningún lector debe ver un archivo a medio escribir.
+    """
+    arreglos = {k: v for k, v in indice.items() if k != "textos_norm"}
+    arreglos["textos_norm_utf8"], arreglos["textos_norm_offsets"] = empacar_textos(indice["textos_norm"])
+
+    directorio = os.path.dirname(os.path.abspath(path))
+    fd, temporal = tempfile.mkstemp(prefix=".lex-", suffix=".npz", dir=directorio)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, json_hash=np.array(json_hash), formato=np.array(FORMATO_INDICE_LEXICO), **arreglos)
+        os.replace(temporal, path)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def cargar_indice_lexico(path: str, json_hash: str) -> dict[str, np.ndarray] | None:
+    """Carga el índice léxico si existe y corresponde al JSON actual; si no, None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f, np.load(f, allow_pickle=False) as npz:
+            if str(npz["json_hash"]) != json_hash or int(npz["formato"]) != FORMATO_INDICE_LEXICO:
+                return None
+            indice = {k: npz[k] for k in CLAVES_INDICE if k != "textos_norm"}
+            indice["textos_norm"] = desempacar_textos(npz["textos_norm_utf8"], npz["textos_norm_offsets"])
+            return indice
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        return None
@@ -1,22 +1,36 @@
 # c:\Users\rodri\ProyectosPython\agenteSAES_phi\main.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from pydantic import BaseModel
-from xai_sdk import Client
+from xai_sdk import AsyncClient
 from xai_sdk.chat import user, system
-from utils_rag import ReglamentoRAG
-from db_utils import obtener_datos_usuario, obtener_datos_profesor
+from utils_rag import ReglamentoRAG, cargar_metadatos_indice
+from encoders import crear_encoder
+from db_utils import (
+    obtener_secciones_alumno, obtener_secciones_profesor, obtener_fechas_relevantes, invalidar_fechas_relevantes,
+)
+from db_async import obtener_secciones_alumno_async, obtener_secciones_profesor_async, obtener_fechas_relevantes_async
+import db_async
 from question_classifier import QuestionClassifier, DirectAnswerBuilder
-from concurrent.futures import ThreadPoolExecutor
-from functools import lru_cache
-from cachetools import TTLCache
+from cache_utils import ProfileCache, SingleFlight
+from semantic_cache import SemanticCache, admite_pregunta
+import rag_worker
+import prompt_builder
+import db_utils
+import metrics
+from metrics import medir
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from cachetools import TTLCache, LRUCache
 from threading import Lock, RLock
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, AsyncIterator, Iterable, List
 import re
+import json
 import logging
 import unicodedata
 import time
 import asyncio
+import multiprocessing
 import hashlib
 import os
 import uuid
@@ -28,21 +42,60 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 # ============================================================================ 
 # CONFIGURACIÓN Y CACHÉ
 # ============================================================================ 
-executor = ThreadPoolExecutor(max_workers=8)
+# Pool de workers de la cola LLM; las respuestas directas no pasan por la cola.
+# Cada worker tiene su propio presupuesto de peticiones concurrentes.
+NUM_WORKERS_LLM = int(os.getenv("QUEUE_WORKERS_LLM", 4))
+WORKER_CONCURRENCY = int(os.getenv("QUEUE_WORKER_CONCURRENCY", 4))
+WORKER_TIMEOUT_S = float(os.getenv("QUEUE_WORKER_TIMEOUT", 60.0))
+TIMEOUT_RESPUESTA_S = 120.0  # Espera máxima de un cliente por su respuesta
+
+# Backend de BD para los perfiles: "sync" (mysql.connector en hilos) o "async" (aiomysql)
+DB_BACKEND = os.getenv("DB_BACKEND", "sync").lower()
+
+# Hilos para el trabajo bloqueante (consultas a BD) de las peticiones en vuelo
+executor = ThreadPoolExecutor(max_workers=max(8, NUM_WORKERS_LLM * WORKER_CONCURRENCY))
 
 # Caché con tiempo de vida (TTL)
-cache_usuarios = TTLCache(maxsize=1000, ttl=300)   # 5 minutos
+# Perfiles: una sola capa acotada por memoria, con invalidación por usuario
+cache_usuarios = ProfileCache(
+    max_bytes=int(os.getenv("PROFILE_CACHE_MAX_MB", 64)) * 1024 * 1024,
+    ttl=float(os.getenv("PROFILE_CACHE_TTL", 300)),  # 5 minutos
+)
 cache_respuestas = TTLCache(maxsize=500, ttl=600)  # 10 minutos
 
 # Locks para acceso seguro a recursos compartidos
 llm_lock = Lock()
 rag_lock = Lock()
-cache_usuarios_lock = RLock()
 cache_respuestas_lock = RLock()
 
 # Configuración de la API de Grok (xAI)
 XAI_API_KEY = os.getenv("XAI_API_KEY") # ¡Asegúrate de tener esta variable de entorno!
 GROK_MODEL = "grok-3-mini" # Modelo optimizado para velocidad y costo
+# Llamadas simultáneas a Grok (cola + streaming); ya no dependen de un pool de hilos
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 64))
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+# Caché semántica de respuestas LLM para preguntas que no dependen del usuario
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+SEMANTIC_CACHE_MAX = int(os.getenv("SEMANTIC_CACHE_MAX", 2000))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", 3600))  # 1 hora
+# Preguntas idénticas en vuelo (mismo prompt y misma consulta) comparten una llamada a Grok
+llm_vuelos = SingleFlight()
+# Cuántas peticiones comparten el prefijo del prompt (reutilizable por la caché de Grok)
+prefijos_prompt = prompt_builder.RegistroPrefijos(int(os.getenv("PROMPT_PREFIJOS_MAX", 1000)))
+
+# Búsquedas del RAG fuera del event loop: "thread" (hilos, un solo RAG en memoria)
+# o "process" (procesos con su propia copia del índice, sin competir por el GIL)
+RAG_EXECUTOR = os.getenv("RAG_EXECUTOR", "thread").lower()
+RAG_WORKERS = int(os.getenv("RAG_WORKERS", 4))
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", RAG_WORKERS))
+rag_semaphore = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+rag_executor: Optional[Executor] = None
+rag_workers_listos = False
+rag_en_curso = 0
+# Contexto recuperado por consulta expandida; solo se usa desde el event loop
+cache_contexto = LRUCache(maxsize=100)
+rag_vuelos = SingleFlight()
 
 # ============================================================================ 
 # SISTEMA DE COLA DE MENSAJES
@@ -54,16 +107,93 @@ class QueueRequest:
     pregunta: 'Pregunta'
     future: asyncio.Future
     timestamp: float
+    # Búsqueda del RAG iniciada antes de encolar (ver _iniciar_rag_especulativo)
+    tarea_rag: Optional[asyncio.Task] = None
+    # Subtipo directo que no se pudo responder sin el LLM; orienta el contexto del prompt
+    subtipo: Optional[str] = None
+    # Canal de tokens de /generate/stream; el worker cierra con None al terminar
+    tokens: Optional[asyncio.Queue] = None
 
-# Cola de mensajes para procesar peticiones secuencialmente
+
+@dataclass
+class WorkerStats:
+    """Estadísticas de un worker del pool."""
+    worker_id: str
+    concurrencia: int
+    en_proceso: int = 0
+    total_processed: int = 0
+    total_errors: int = 0
+    tiempo_total_ms: float = 0.0
+    espera_total_ms: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        atendidas = self.total_processed + self.total_errors
+        return {
+            "worker_id": self.worker_id,
+            "concurrencia": self.concurrencia,
+            "en_proceso": self.en_proceso,
+            "total_processed": self.total_processed,
+            "total_errors": self.total_errors,
+            "tiempo_promedio_ms": round(self.tiempo_total_ms / atendidas, 2) if atendidas else 0.0,
+            "espera_promedio_ms": round(self.espera_total_ms / atendidas, 2) if atendidas else 0.0,
+        }
+
+
+class QueueWorker:
+    """
+    Worker que consume la cola LLM. Solo toma una petición cuando tiene
+    un lugar libre en su presupuesto, así el resto queda disponible para
+    los demás workers del pool.
+    """
+
+    def __init__(self, worker_id: str, cola: asyncio.Queue, concurrencia: int):
+        self.cola = cola
+        self.stats = WorkerStats(worker_id=worker_id, concurrencia=concurrencia)
+        self._lugares = asyncio.Semaphore(concurrencia)
+        self._tareas: set = set()
+
+    async def run(self):
+        logging.info(f"Queue worker {self.stats.worker_id} iniciado")
+        while True:
+            await self._lugares.acquire()
+            request: QueueRequest = await self.cola.get()
+            tarea = asyncio.create_task(self._procesar(request))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+
+    async def _procesar(self, request: QueueRequest):
+        self.stats.en_proceso += 1
+        inicio = time.time()
+        self.stats.espera_total_ms += (inicio - request.timestamp) * 1000
+        metrics.ESPERA_COLA_SEGUNDOS.observe(inicio - request.timestamp)
+        try:
+            # Timeout interno por seguridad
+            resultado = await asyncio.wait_for(
+                _process_single_request(request.pregunta, request.tarea_rag, request.subtipo, request.tokens),
+                timeout=WORKER_TIMEOUT_S,
+            )
+            if not request.future.done():
+                request.future.set_result(resultado)
+            self.stats.total_processed += 1
+
+        except Exception as e:
+            logging.error(f"Error worker {self.stats.worker_id} request {request.request_id}: {e}")
+            if not request.future.done():
+                request.future.set_exception(e)
+            self.stats.total_errors += 1
+
+        finally:
+            if request.tokens is not None:
+                request.tokens.put_nowait(None)
+            self.stats.en_proceso -= 1
+            self.stats.tiempo_total_ms += (time.time() - inicio) * 1000
+            self.cola.task_done()
+            self._lugares.release()
+
+
+# Cola de mensajes del camino complejo (LLM)
 message_queue: asyncio.Queue = None
-queue_stats = {
-    "total_processed": 0,
-    "total_errors": 0,
-    "current_queue_size": 0,
-    "processing": False,
-}
-queue_stats_lock = Lock()
+queue_workers: list = []
 
 # ============================================================================ 
 # GESTIÓN DE MODELOS (CLIENTE API Y RAG)
@@ -71,41 +201,217 @@ queue_stats_lock = Lock()
 
 llm_client = None
 rag = None
+cache_semantica: Optional[SemanticCache] = None
+
+# Agrupación de embeddings de consultas concurrentes (EMBED_BATCH_MAX=0 la desactiva)
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", 32))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", 2.0))
+
+# Codificador de consultas del RAG: "torch", "onnx" u "onnx-int8" (ver encoders.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+
+# Carga de modelos en segundo plano al arrancar (WARMUP_ON_STARTUP=0 vuelve a la carga diferida)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+tarea_carga: Optional[asyncio.Task] = None
+# Tras una carga fallida, las peticiones reciben 503 durante estos segundos antes de reintentar
+CARGA_REINTENTO_S = float(os.getenv("CARGA_REINTENTO_S", 30))
+ultimo_fallo_carga = 0.0
+tiempos_arranque: Dict[str, float] = {}
+
+def _opciones_rag(lote_embeddings: int) -> Dict[str, Any]:
+    """Argumentos de ReglamentoRAG, compartidos por el servidor y los procesos de rag_worker."""
+    # Asegúrate de que estos archivos existan en tu carpeta
+    return {
+        "index_path": "reglamentos_ipn.index",
+        "json_path": "reglamentos_ipn.json",
+        "lote_embeddings": lote_embeddings,
+        "ventana_embeddings_ms": EMBED_BATCH_WINDOW_MS,
+        "backend_embeddings": EMBED_BACKEND,
+    }
+
+
+def _crear_executor_rag() -> Executor:
+    if RAG_EXECUTOR == "process":
+        # spawn: el servidor ya tiene hilos corriendo y fork los copiaría a medias.
+        # Cada proceso atiende una búsqueda a la vez, así que no agrupa embeddings.
+        return ProcessPoolExecutor(
+            max_workers=RAG_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=rag_worker.inicializar,
+            initargs=(_opciones_rag(0),),
+        )
+    return ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix="rag")
+
+
+def _crear_cache_semantica(embedder) -> SemanticCache:
+    return SemanticCache(
+        embedder,
+        umbral=SEMANTIC_CACHE_THRESHOLD,
+        max_entradas=SEMANTIC_CACHE_MAX,
+        ttl=SEMANTIC_CACHE_TTL,
+    )
 
-def garantizar_carga_modelos():
+
+def _cargar_embedder_cache():
     """
-    Función que verifica si el cliente API y RAG están listos.
-    Si no lo están, los inicializa (Lazy Loading).
+    Modo process: las búsquedas corren en los procesos del pool, así que el
+    servidor solo carga el codificador de consultas de la caché semántica.
     """
-    global llm_client, rag
-    
-    # 1. Carga de RAG (Base de conocimientos)
-    if rag is None:
-        with rag_lock: 
-            if rag is None:
-                try:
-                    logging.info("⏳ Iniciando carga diferida de RAG...")
-                    # Asegúrate de que estos archivos existan en tu carpeta
-                    rag = ReglamentoRAG(index_path="reglamentos_ipn.index", json_path="reglamentos_ipn.json")
-                    logging.info("✅ RAG cargado correctamente.")
-                except Exception as e:
-                    logging.error(f"❌ Error cargando RAG: {e}")
-
-    # 2. Inicialización del Cliente Grok
-    if llm_client is None:
-        with llm_lock:
-            if llm_client is None:
-                try:
-                    if not XAI_API_KEY:
-                        logging.warning("⚠️ ADVERTENCIA: No se encontró la variable XAI_API_KEY.")
-                    
-                    logging.info(f"⏳ Conectando con API de Grok (Modelo: {GROK_MODEL})...")
-                    llm_client = Client(
-                        api_key=XAI_API_KEY,
-                    )
-                    logging.info("✅ Cliente Grok inicializado correctamente.")
-                except Exception as e:
-                    logging.error(f"❌ Error inicializando cliente Grok: {e}", exc_info=True)
+    global cache_semantica
+    if not SEMANTIC_CACHE_ENABLED or cache_semantica is not None:
+        return
+    with rag_lock:
+        if cache_semantica is not None:
+            return
+        try:
+            logging.info("⏳ Cargando codificador de la caché semántica...")
+            inicio = time.time()
+            encoder = crear_encoder(EMBED_BACKEND)
+            # La primera inferencia es la más lenta
+            encoder.encode(["requisitos de reinscripción"], convert_to_numpy=True, normalize_embeddings=True)
+            tiempos_arranque["embedder_cache"] = round(time.time() - inicio, 3)
+            cache_semantica = _crear_cache_semantica(encoder)
+            logging.info(f"✅ Codificador de la caché semántica cargado en {tiempos_arranque['embedder_cache']} s")
+        except Exception as e:
+            logging.error(f"❌ Error cargando el codificador de la caché semántica (caché desactivada): {e}")
+
+
+def _cargar_rag():
+    """
+    Carga el RAG (y la caché semántica) y lo calienta con una búsqueda de
+    prueba. En modo process el RAG vive en los procesos del pool y aquí
+    solo se carga el codificador de la caché semántica.
+    """
+    global rag, cache_semantica
+    if RAG_EXECUTOR == "process":
+        _cargar_embedder_cache()
+        return
+    if rag is not None:
+        return
+    with rag_lock:
+        if rag is not None:
+            return
+        try:
+            logging.info("⏳ Iniciando carga de RAG...")
+            inicio = time.time()
+            nuevo_rag = ReglamentoRAG(**_opciones_rag(EMBED_BATCH_MAX))
+            for componente, segundos in nuevo_rag.tiempos_carga.items():
+                tiempos_arranque[f"rag_{componente}"] = round(segundos, 3)
+
+            # Búsqueda de prueba: la primera inferencia del modelo y de spaCy es la más lenta
+            inicio_calentamiento = time.time()
+            nuevo_rag.buscar_contexto("requisitos de reinscripción")
+            tiempos_arranque["rag_calentamiento"] = round(time.time() - inicio_calentamiento, 3)
+            tiempos_arranque["rag_total"] = round(time.time() - inicio, 3)
+
+            if SEMANTIC_CACHE_ENABLED:
+                cache_semantica = _crear_cache_semantica(nuevo_rag.embedder)
+            rag = nuevo_rag
+            logging.info(f"✅ RAG cargado correctamente. Tiempos (s): {tiempos_arranque}")
+        except Exception as e:
+            logging.error(f"❌ Error cargando RAG: {e}")
+
+
+def _crear_cliente_llm():
+    """Inicializa el cliente Grok. Debe llamarse desde el hilo del event loop."""
+    global llm_client
+    if llm_client is not None:
+        return
+    with llm_lock:
+        if llm_client is not None:
+            return
+        try:
+            if not XAI_API_KEY:
+                logging.warning("⚠️ ADVERTENCIA: No se encontró la variable XAI_API_KEY.")
+
+            logging.info(f"⏳ Conectando con API de Grok (Modelo: {GROK_MODEL})...")
+            inicio = time.time()
+            llm_client = AsyncClient(
+                api_key=XAI_API_KEY,
+            )
+            tiempos_arranque["llm_cliente"] = round(time.time() - inicio, 3)
+            logging.info("✅ Cliente Grok inicializado correctamente.")
+        except Exception as e:
+            logging.error(f"❌ Error inicializando cliente Grok: {e}", exc_info=True)
+
+
+class ModelosNoDisponibles(Exception):
+    """La carga de los modelos falló y aún no toca reintentarla."""
+
+
+async def _calentar_modelos():
+    """Carga los modelos en segundo plano; el RAG se carga en el executor, nunca en el event loop."""
+    global ultimo_fallo_carga
+    inicio = time.time()
+    _crear_cliente_llm()
+    await asyncio.get_running_loop().run_in_executor(executor, _cargar_rag)
+    await _calentar_workers_rag()
+    if modelos_listos():
+        logging.info(f"🔥 Arranque en frío completado en {time.time() - inicio:.2f} s")
+    else:
+        ultimo_fallo_carga = time.time()
+        logging.warning(f"⚠️ Carga de modelos incompleta; siguiente intento en {CARGA_REINTENTO_S:.0f} s")
+
+
+def _iniciar_carga_modelos() -> Optional[asyncio.Task]:
+    """
+    Devuelve la tarea de carga en curso o lanza una nueva, así todas las
+    peticiones esperan la misma carga. Devuelve None si la última falló
+    hace menos de CARGA_REINTENTO_S.
+    """
+    global tarea_carga
+    if tarea_carga is None or tarea_carga.done():
+        if time.time() - ultimo_fallo_carga < CARGA_REINTENTO_S:
+            return None
+        tarea_carga = asyncio.create_task(_calentar_modelos())
+    return tarea_carga
+
+
+async def _calentar_workers_rag():
+    """En modo process, arranca los procesos del pool y espera a que carguen su RAG."""
+    global rag_workers_listos, rag_executor
+    if RAG_EXECUTOR != "process" or rag_workers_listos:
+        return
+    inicio = time.time()
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(*[
+            loop.run_in_executor(rag_executor, rag_worker.listo) for _ in range(RAG_WORKERS)
+        ])
+        rag_workers_listos = True
+        tiempos_arranque["rag_workers"] = round(time.time() - inicio, 3)
+        logging.info(f"✅ {RAG_WORKERS} procesos RAG listos en {tiempos_arranque['rag_workers']} s")
+    except Exception as e:
+        logging.error(f"❌ Error iniciando los procesos RAG: {e}")
+        # Un pool con un proceso caído queda roto; el siguiente intento arranca uno nuevo
+        rag_executor.shutdown(wait=False, cancel_futures=True)
+        rag_executor = _crear_executor_rag()
+
+
+async def _esperar_modelos():
+    """
+    Espera a que Grok y el RAG estén listos sin bloquear el event loop (con
+    WARMUP_ON_STARTUP=0, la primera petición lanza la carga). Si la carga
+    falló, lanza ModelosNoDisponibles en vez de reintentarla en cada petición.
+    """
+    if modelos_listos():
+        return
+    tarea = _iniciar_carga_modelos()
+    if tarea is not None:
+        await asyncio.shield(tarea)
+    if not modelos_listos():
+        raise ModelosNoDisponibles("Los modelos no están disponibles; reintenta más tarde.")
+
+
+def rag_listo() -> bool:
+    """El RAG que atiende las búsquedas: el del servidor (thread) o el de los procesos del pool (process)."""
+    if RAG_EXECUTOR == "process":
+        return rag_workers_listos
+    return rag is not None
+
+
+def modelos_listos() -> bool:
+    return rag_listo() and llm_client is not None
 
 # ============================================================================ 
 # ESQUEMAS
@@ -125,8 +431,11 @@ class CacheStats(BaseModel):
 # ============================================================================ 
 # PROMPT Y FUNCIONES AUXILIARES
 # ============================================================================ 
-PROMPT_SISTEMA_BASE = (
-    "Eres un asistente académico del IPN (Instituto Politécnico Nacional de México). Usuario: **{tipo_usuario_upper}**.\n\n"
+# El prompt va de lo más estable a lo más variable para que Grok reutilice el
+# prefijo entre peticiones: reglas fijas, reglamento de la consulta y, al final,
+# los datos del usuario (ver prompt_builder). Nada por usuario en el prefijo.
+PROMPT_SISTEMA_ESTATICO = (
+    "Eres un asistente académico del IPN (Instituto Politécnico Nacional de México).\n\n"
     "CONTEXTO: Estás respondiendo preguntas sobre educación, reglamentos académicos, trámites escolares del IPN y situaciones académicas. "
     "Todas las preguntas son en contexto educativo. Términos como 'ETS' se refieren a 'Evaluación a Título de Suficiencia'.\n\n"
     "REGLA FUNDAMENTAL: Solo puedes responder usando la información que aparece en los CONTEXTOS de abajo. "
@@ -136,64 +445,70 @@ PROMPT_SISTEMA_BASE = (
     "Pregunta: ¿Qué es un crédito?\n"
     "Contexto: 'Crédito: A la unidad de reconocimiento académico...'\n"
     "Respuesta CORRECTA: Un crédito es la unidad de reconocimiento académico que mide las actividades de aprendizaje.\n\n"
-    "CONTEXTOS DISPONIBLES:\n\n"
-    "=== DATOS DEL USUARIO ===\n"
-    "{contexto_academico}\n\n"
-    "=== REGLAMENTO IPN ===\n"
-    "{contexto_rag}\n\n"
     "INSTRUCCIONES:\n"
     "1. Lee la pregunta del usuario\n"
-    "2. Busca la respuesta SOLO en los contextos de arriba\n"
+    "2. Busca la respuesta SOLO en los contextos de abajo\n"
     "3. Si la encuentras: responde en 2-3 oraciones, conciso.\n"
     "4. Si NO la encuentras: di que no tienes esa información\n"
     "5. RESPONDE SIEMPRE EN ESPAÑOL\n\n"
+    "CONTEXTOS DISPONIBLES:\n\n"
+)
+PROMPT_REGLAMENTO = (
+    "=== REGLAMENTO IPN ===\n"
+    "{contexto_rag}\n\n"
+)
+PROMPT_USUARIO = (
+    "=== DATOS DEL USUARIO ({tipo_usuario_upper}) ===\n"
+    "{contexto_academico}\n"
 )
 
 
-def _construir_contexto_alumno(datos: Dict[str, Any]) -> str:
-    """Construye el texto de contexto académico para el alumno."""
+def _bloques_contexto_alumno(datos: Dict[str, Any]) -> Dict[str, str]:
+    """Textos de contexto académico del alumno, por bloque (ver prompt_builder.BLOQUES)."""
     if not datos or not datos.get("boleta"):
-        return "No se pudo obtener información académica del alumno."
-    contexto = [
-        f"Boleta: {datos.get('boleta', 'N/A')}",
-        f"Nombre: {datos.get('nombre', 'N/A')}",
-        f"Carrera: {datos.get('carrera', 'N/A')}",
-        f"Promedio general: {datos.get('promedio', 0.0):.2f}",
-        f"Créditos disponibles: {datos.get('creditos_disponibles', 0)}",
-        f"Estado académico: {datos.get('estado_academico', 'N/A')}",
-        f"Situación en Kardex: {datos.get('situacion_kardex', 'N/A')}",
-        f"Semestre Actual: {datos.get('semestre_actual', 'N/A')}",
-        f"Reinscripción Activa: {'Sí' if datos.get('reinscripcion_activa') else 'No'} (Caduca: {datos.get('inscripcion_caduca', 'N/A')})",
-        "\n--- Materias Inscritas ---\n" + (datos.get("materias_inscritas_texto", "Ninguna")),
-        "\n--- Historial Académico (Aprobadas) ---\n" + (datos.get("materias_aprobadas_texto", "Sin materias aprobadas.")),
-        "\n--- Historial Académico (Reprobadas) ---\n" + (datos.get("materias_reprobadas_texto", "Sin materias reprobadas.")),
-        "\n--- Fechas Relevantes ---\n"
+        return {"resumen": "No se pudo obtener información académica del alumno."}
+    return {
+        "resumen": "\n".join([
+            f"Boleta: {datos.get('boleta', 'N/A')}",
+            f"Nombre: {datos.get('nombre', 'N/A')}",
+            f"Carrera: {datos.get('carrera', 'N/A')}",
+            f"Promedio general: {datos.get('promedio', 0.0):.2f}",
+            f"Créditos disponibles: {datos.get('creditos_disponibles', 0)}",
+            f"Estado académico: {datos.get('estado_academico', 'N/A')}",
+            f"Situación en Kardex: {datos.get('situacion_kardex', 'N/A')}",
+        ]),
+        "reinscripcion": f"Reinscripción Activa: {'Sí' if datos.get('reinscripcion_activa') else 'No'} (Caduca: {datos.get('inscripcion_caduca', 'N/A')})",
+        "inscritas": f"Semestre Actual: {datos.get('semestre_actual', 'N/A')}\n"
+        + "\n--- Materias Inscritas ---\n" + (datos.get("materias_inscritas_texto", "Ninguna")),
+        "aprobadas": "\n--- Historial Académico (Aprobadas) ---\n" + (datos.get("materias_aprobadas_texto", "Sin materias aprobadas.")),
+        "reprobadas": "\n--- Historial Académico (Reprobadas) ---\n" + (datos.get("materias_reprobadas_texto", "Sin materias reprobadas.")),
+        "fechas": "\n--- Fechas Relevantes ---\n"
         + "\n".join(
             [f"- {k}: {v}" for k, v in datos.get("fechas_semestre", {}).items()
              if k in ["inicio_semestre", "fin_semestre", "registro_primer_parcial"]]
         ),
-    ]
-    return "\n".join(contexto)
+    }
 
 
-def _construir_contexto_profesor(datos: Dict[str, Any]) -> str:
-    """Construye el texto de contexto académico para el profesor."""
+def _bloques_contexto_profesor(datos: Dict[str, Any]) -> Dict[str, str]:
+    """Textos de contexto académico del profesor, por bloque (ver prompt_builder.BLOQUES)."""
     if not datos or not datos.get("id_profesor"):
-        return "No se pudo obtener información académica del profesor."
-    contexto = [
-        f"ID Profesor: {datos.get('id_profesor', 'N/A')}",
-        f"Nombre: {datos.get('nombre', 'N/A')}",
-        f"Grado: {datos.get('grado', 'N/A')}",
-        f"Calificación promedio: {datos.get('calificacion_promedio', 0.0):.1f} ({datos.get('total_resenas', 0)} reseñas)",
-        "\n--- Grupos Impartidos ---\n" + (datos.get("grupos_texto", "Sin grupos asignados.")),
-        "\n--- Últimos Comentarios ---\n" + (datos.get("ultimos_comentarios", "Sin comentarios recientes.")),
-        "\n--- Fechas Relevantes ---\n"
+        return {"resumen": "No se pudo obtener información académica del profesor."}
+    return {
+        "resumen": "\n".join([
+            f"ID Profesor: {datos.get('id_profesor', 'N/A')}",
+            f"Nombre: {datos.get('nombre', 'N/A')}",
+            f"Grado: {datos.get('grado', 'N/A')}",
+            f"Calificación promedio: {datos.get('calificacion_promedio', 0.0):.1f} ({datos.get('total_resenas', 0)} reseñas)",
+        ]),
+        "grupos": "\n--- Grupos Impartidos ---\n" + (datos.get("grupos_texto", "Sin grupos asignados.")),
+        "resenas": "\n--- Últimos Comentarios ---\n" + (datos.get("ultimos_comentarios", "Sin comentarios recientes.")),
+        "fechas": "\n--- Fechas Relevantes ---\n"
         + "\n".join(
             [f"- {k}: {v}" for k, v in datos.get("fechas_semestre", {}).items()
              if k in ["evalu_profe", "registro_primer_parcial", "fin_registro_primer_parcial"]]
         ),
-    ]
-    return "\n".join(contexto)
+    }
 
 
 def _limpiar_respuesta(respuesta: str) -> str:
@@ -235,25 +550,33 @@ def _validar_respuesta(respuesta: str) -> bool:
         return False
     return True
 
-def _generar_respuesta_sync(prompt_sistema: str, texto_usuario: str) -> Tuple[str, float]:
+def _crear_chat(prompt_sistema: str, texto_usuario: str):
+    """Crea la conversación de Grok con el prompt de sistema y la pregunta."""
+    chat = llm_client.chat.create(model=GROK_MODEL)
+    chat.append(system(prompt_sistema))
+    chat.append(user(texto_usuario))
+    return chat
+
+
+async def _generar_respuesta_async(prompt_sistema: str, texto_usuario: str) -> Tuple[str, float]:
     """
-    Genera la respuesta usando la API de Grok (xAI).
-    Sustituye la llamada local a Llama.
+    Genera la respuesta usando la API de Grok (xAI) con el cliente asíncrono,
+    sin ocupar un hilo durante la llamada.
     """
     if not llm_client:
         return "Error interno: El cliente Grok no está inicializado. Verifica tu API Key.", 0.0
 
     inicio = time.time()
     try:
-        # Llamada a la API de Grok usando xai-sdk
-        chat = llm_client.chat.create(model=GROK_MODEL)
-        chat.append(system(prompt_sistema))
-        chat.append(user(texto_usuario))
+        async with llm_semaphore:
+            response = await _crear_chat(prompt_sistema, texto_usuario).sample()
 
-        response = chat.sample()
-        
         respuesta = response.content.strip()
         tiempo_ms = round((time.time() - inicio) * 1000, 2)
+        uso = getattr(response, "usage", None)
+        if uso is not None and getattr(uso, "prompt_tokens", 0):
+            # Conteo real del proveedor, para calibrar PROMPT_CHARS_POR_TOKEN
+            metrics.PROMPT_TOKENS.labels("reportado").observe(uso.prompt_tokens)
         return respuesta, tiempo_ms
 
     except Exception as e:
@@ -261,10 +584,69 @@ def _generar_respuesta_sync(prompt_sistema: str, texto_usuario: str) -> Tuple[st
         return f"Lo siento, hubo un error al consultar mi cerebro digital: {e}", 0.0
 
 
-@lru_cache(maxsize=100)
-def _buscar_contexto_cached(query: str, tipo_usuario: str, top_k: int = 3) -> str:
-    """Busca contexto en el RAG con caché LRU."""
-    if not rag:
+async def _stream_respuesta(prompt_sistema: str, texto_usuario: str) -> AsyncIterator[str]:
+    """Emite los tokens de Grok conforme llegan."""
+    if not llm_client:
+        yield "Error interno: El cliente Grok no está inicializado. Verifica tu API Key."
+        return
+
+    async with llm_semaphore:
+        async for _, chunk in _crear_chat(prompt_sistema, texto_usuario).stream():
+            if chunk.content:
+                yield chunk.content
+
+
+async def _generar_respuesta_stream(prompt_sistema: str, texto_usuario: str,
+                                    tokens: asyncio.Queue) -> Tuple[str, float]:
+    """Como _generar_respuesta_async, pero deja cada token en `tokens` conforme llega."""
+    inicio = time.time()
+    partes = []
+    async for token in _stream_respuesta(prompt_sistema, texto_usuario):
+        partes.append(token)
+        tokens.put_nowait(token)
+    return "".join(partes).strip(), round((time.time() - inicio) * 1000, 2)
+
+
+def _post_procesar_respuesta(respuesta_llm: str) -> str:
+    """Aplica la limpieza final a la respuesta completa del LLM."""
+    if not respuesta_llm:
+        return "Hubo un problema de conexión con el asistente."
+    respuesta_limpia = _limpiar_respuesta(respuesta_llm)
+    return respuesta_limpia if _validar_respuesta(respuesta_limpia) else respuesta_llm
+
+
+def _recuperar_en_hilo(consulta: str, top_k: int) -> Tuple[str, Dict[str, float]]:
+    tiempos = {}
+    contexto = rag.buscar_contexto(consulta, top_merge=top_k, max_chars=None, tiempos=tiempos)
+    return contexto, tiempos
+
+
+async def _ejecutar_busqueda_rag(consulta: str, top_k: int) -> str:
+    """Corre la búsqueda en el executor del RAG, con su propio límite de concurrencia."""
+    global rag_en_curso
+    loop = asyncio.get_running_loop()
+    inicio = time.perf_counter()
+    async with rag_semaphore:
+        metrics.observar_etapa("rag_espera", time.perf_counter() - inicio)
+        rag_en_curso += 1
+        metrics.RAG_EN_CURSO.set(rag_en_curso)
+        try:
+            if RAG_EXECUTOR == "process":
+                contexto, tiempos = await loop.run_in_executor(rag_executor, rag_worker.buscar, consulta, top_k)
+            else:
+                contexto, tiempos = await loop.run_in_executor(rag_executor, _recuperar_en_hilo, consulta, top_k)
+        finally:
+            rag_en_curso -= 1
+            metrics.RAG_EN_CURSO.set(rag_en_curso)
+
+    for parte, segundos in tiempos.items():
+        metrics.observar_etapa(f"rag_{parte}", segundos)
+    return _dedup_sentences(contexto)
+
+
+async def _buscar_contexto(query: str, tipo_usuario: str, top_k: int = 3) -> str:
+    """Busca contexto en el RAG con caché LRU, sin bloquear el event loop."""
+    if not rag_listo():
         return "El sistema RAG no está inicializado."
 
     expanded_query = query
@@ -272,10 +654,18 @@ def _buscar_contexto_cached(query: str, tipo_usuario: str, top_k: int = 3) -> st
         expanded_query = f"{query} docente enseñanza responsabilidades"
     elif tipo_usuario and tipo_usuario.lower() == "alumno":
         expanded_query = f"{query} estudiante requisitos académicos"
-    
+
+    clave = (expanded_query, top_k)
+    contexto = cache_contexto.get(clave)
+    metrics.registrar_consulta_cache("rag", contexto is not None)
+    if contexto is not None:
+        return contexto
+
     logging.info(f"Query RAG expandida para {tipo_usuario}: {expanded_query}")
-    contexto = rag.buscar_contexto(expanded_query, top_merge=top_k)
-    return _dedup_sentences(contexto)
+    # Consultas idénticas en vuelo comparten la misma búsqueda
+    contexto = await rag_vuelos.run(clave, lambda: _ejecutar_busqueda_rag(expanded_query, top_k))
+    cache_contexto[clave] = contexto
+    return contexto
 
 
 def _dedup_sentences(text: str) -> str:
@@ -294,160 +684,360 @@ def _dedup_sentences(text: str) -> str:
     return "\n---\n".join(cleaned_fragments)
 
 
-async def _process_single_request(pregunta: Pregunta) -> Dict[str, Any]:
-    """Procesa una única petición."""
-    
-    # Aseguramos que Grok y RAG estén listos
-    garantizar_carga_modelos()
+def _clasificar(pregunta: Pregunta) -> Tuple[str, Optional[str]]:
+    """Clasifica la pregunta respetando el modo razonamiento (forzar LLM)."""
+    if pregunta.razonamiento == 1:
+        return ("complex", None)
+    with medir("clasificacion"):
+        return QuestionClassifier.classify(pregunta.query)
 
-    texto_usuario = pregunta.query
-    id_usuario = pregunta.id_usuario
+
+def _cache_key_respuesta(pregunta: Pregunta) -> str:
+    """Llave de caché de respuestas: tipo_usuario:id_usuario:query."""
     tipo_usuario = pregunta.tipo_usuario.lower()
-    razonamiento = pregunta.razonamiento
-    
-    logging.info(f"Procesando: {tipo_usuario} {id_usuario} -> {texto_usuario}")
+    return hashlib.sha256(f"{tipo_usuario}:{pregunta.id_usuario}:{pregunta.query}".encode("utf-8")).hexdigest()
 
-    # 1. Clasificación
-    if razonamiento == 1:
-        tipo_pregunta = "complex"
-        subtipo = None
-    else:
-        tipo_pregunta, subtipo = QuestionClassifier.classify(texto_usuario)
 
-    # 2. Verificar Caché de Respuestas
-    cache_key = hashlib.sha256(f"{tipo_usuario}:{id_usuario}:{texto_usuario}".encode("utf-8")).hexdigest()
-    with cache_respuestas_lock:
-        if cache_key in cache_respuestas:
-            logging.info("Respuesta obtenida de caché.")
-            return {
-                "response": cache_respuestas[cache_key],
-                "tiempo_ms": 0,
-                "tipo_respuesta": "cached",
-                "from_cache": True,
-            }
-
-    # 3. Obtener datos de usuario
-    datos_usuario = _obtener_datos_usuario_cached(id_usuario, tipo_usuario)
+def _respuesta_en_cache(pregunta: Pregunta) -> Optional[Dict[str, Any]]:
+    """Devuelve la respuesta guardada en caché para la pregunta, si existe."""
+    with medir("cache_respuestas"), cache_respuestas_lock:
+        respuesta = cache_respuestas.get(_cache_key_respuesta(pregunta))
+    metrics.registrar_consulta_cache("respuestas", respuesta is not None)
+    if respuesta is None:
+        return None
+    return {
+        "response": respuesta,
+        "tiempo_ms": 0,
+        "tipo_respuesta": "cached",
+        "from_cache": True,
+    }
+
+
+# Frases que indican que la respuesta directa no es útil y conviene el LLM
+NEGACIONES_DIRECTAS = ["No tienes", "Sin comentarios", "No se pudo", "No cuentas"]
+
+# Calendario del semestre: no es una sección del perfil, es igual para todos los usuarios
+SECCION_FECHAS = "fechas"
+
+
+def _construir_respuesta_directa(subtipo: str, datos_usuario: Optional[Dict]) -> Optional[str]:
+    """Construye la respuesta directa o devuelve None si hay que recurrir al LLM."""
+    secciones = DirectAnswerBuilder.secciones(subtipo)
+    if not secciones:
+        # Definiciones y respuestas fijas: no leen datos del usuario
+        return DirectAnswerBuilder.build_answer(subtipo, datos_usuario or {})
+    if secciones == {SECCION_FECHAS}:
+        if not (datos_usuario and datos_usuario.get("fechas_semestre")):
+            return None
+        return DirectAnswerBuilder.build_answer(subtipo, datos_usuario)
+
     datos_encontrados = bool(datos_usuario and (datos_usuario.get("boleta") or datos_usuario.get("id_profesor")))
+    if not datos_encontrados:
+        return None
 
-    # 4. Generación de Respuesta
-    respuesta_final = None
-    tiempo_ms = 0
-    tipo_respuesta = "llm"
+    respuesta_directa = DirectAnswerBuilder.build_answer(subtipo, datos_usuario)
+    if any(n in respuesta_directa for n in NEGACIONES_DIRECTAS):
+        return None
+    return respuesta_directa
 
-    # -- Intento de Respuesta Directa --
-    if tipo_pregunta == "direct" and subtipo:
-        if subtipo.startswith("definicion_"):
-            inicio = time.time()
-            respuesta_final = DirectAnswerBuilder.build_answer(subtipo, datos_usuario or {})
-            tiempo_ms = round((time.time() - inicio) * 1000, 2)
-            tipo_respuesta = "direct"
-        elif datos_encontrados:
-            inicio = time.time()
-            respuesta_directa = DirectAnswerBuilder.build_answer(subtipo, datos_usuario)
-            tiempo_ms = round((time.time() - inicio) * 1000, 2)
-            
-            # Validar si la respuesta directa es útil
-            negaciones = ["No tienes", "Sin comentarios", "No se pudo", "No cuentas"]
-            if any(n in respuesta_directa for n in negaciones):
-                tipo_pregunta = "complex" # Fallback a LLM
-            else:
-                respuesta_final = respuesta_directa
-                tipo_respuesta = "direct"
-        else:
-            tipo_pregunta = "complex"
 
-    # -- Uso de Grok (LLM) --
-    if tipo_pregunta == "complex" or respuesta_final is None:
-        # Construcción de Contextos
-        if tipo_usuario == "profesor":
-            contexto_academico = _construir_contexto_profesor(datos_usuario or {})
+async def _responder_directo(pregunta: Pregunta, subtipo: str) -> Optional[Dict[str, Any]]:
+    """
+    Carril rápido: responde en la propia tarea de la petición, sin pasar por la cola.
+    Devuelve None cuando la pregunta debe ir al LLM.
+    """
+    tipo_usuario = pregunta.tipo_usuario.lower()
+
+    # Solo las secciones que el builder va a mostrar (p. ej. el horario no lee el kardex)
+    secciones = DirectAnswerBuilder.secciones(subtipo)
+    datos_usuario = None
+    if secciones:
+        datos_usuario = await _obtener_datos_usuario_cached(pregunta.id_usuario, tipo_usuario, secciones)
+
+    inicio = time.time()
+    respuesta = _construir_respuesta_directa(subtipo, datos_usuario)
+    tiempo_ms = round((time.time() - inicio) * 1000, 2)
+    if respuesta is None:
+        return None
+
+    with cache_respuestas_lock:
+        cache_respuestas[_cache_key_respuesta(pregunta)] = respuesta
+
+    return {
+        "response": respuesta,
+        "tiempo_ms": tiempo_ms,
+        "tipo_respuesta": "direct",
+        "from_cache": False,
+    }
+
+
+CONTEXTO_ACADEMICO_NO_APLICA = "No aplica: la pregunta no depende de los datos del usuario."
+
+
+def _descartar_error(tarea: asyncio.Task):
+    """Marca como recuperado el error de una tarea que quizá nadie espere."""
+    if not tarea.cancelled():
+        tarea.exception()
+
+
+def _iniciar_rag_especulativo(pregunta: Pregunta) -> Optional[asyncio.Task]:
+    """
+    Arranca la búsqueda del RAG en cuanto se sabe que la pregunta va al LLM,
+    para que avance mientras la petición espera en la cola. Si al final la
+    respuesta sale de una caché, el contexto queda guardado en cache_contexto.
+    """
+    if not rag_listo():
+        return None
+    tarea = asyncio.create_task(_buscar_contexto(pregunta.query, pregunta.tipo_usuario.lower()))
+    tarea.add_done_callback(_descartar_error)
+    return tarea
+
+
+async def _contexto_academico(pregunta: Pregunta, subtipo: Optional[str],
+                              tiempos: Dict[str, float]) -> List[prompt_builder.SeccionContexto]:
+    """Bloques de datos del usuario relevantes para la pregunta; solo se cargan sus secciones."""
+    tipo_usuario = pregunta.tipo_usuario.lower()
+    if not QuestionClassifier.depends_on_user(pregunta.query):
+        # Sin datos personales el prompt es igual para todos y las peticiones se pueden agrupar
+        return [prompt_builder.SeccionContexto("no_aplica", CONTEXTO_ACADEMICO_NO_APLICA, obligatoria=True)]
+
+    secciones_subtipo = DirectAnswerBuilder.secciones(subtipo) if subtipo else ()
+    relevancias = prompt_builder.relevancia_bloques(
+        tipo_usuario, _normalizar_consulta(pregunta.query), secciones_subtipo
+    )
+    inicio = time.perf_counter()
+    with medir("datos_usuario"):
+        datos_usuario = await _obtener_datos_usuario_cached(
+            pregunta.id_usuario, tipo_usuario, prompt_builder.secciones_de(tipo_usuario, relevancias)
+        )
+    tiempos["datos_usuario"] = time.perf_counter() - inicio
+    if tipo_usuario == "profesor":
+        textos = _bloques_contexto_profesor(datos_usuario or {})
+    else:
+        textos = _bloques_contexto_alumno(datos_usuario or {})
+    return prompt_builder.secciones_usuario(tipo_usuario, textos, relevancias)
+
+
+async def _contexto_rag(pregunta: Pregunta, tarea_rag: Optional[asyncio.Task], tiempos: Dict[str, float]) -> str:
+    inicio = time.perf_counter()
+    with medir("rag"):
+        if tarea_rag is not None:
+            # Solo se mide lo que falta de la búsqueda especulativa
+            contexto = await tarea_rag
         else:
-            contexto_academico = _construir_contexto_alumno(datos_usuario or {})
-        
-        contexto_rag = _buscar_contexto_cached(texto_usuario, tipo_usuario)
-        
-        prompt_sistema = PROMPT_SISTEMA_BASE.format(
-            tipo_usuario_upper=tipo_usuario.upper(),
-            contexto_academico=contexto_academico,
-            contexto_rag=contexto_rag,
+            contexto = await _buscar_contexto(pregunta.query, pregunta.tipo_usuario.lower())
+    tiempos["rag"] = time.perf_counter() - inicio
+    return contexto
+
+
+async def _preparar_prompt(pregunta: Pregunta, tarea_rag: Optional[asyncio.Task] = None,
+                           tiempos: Optional[Dict[str, float]] = None,
+                           subtipo: Optional[str] = None) -> prompt_builder.PromptArmado:
+    """
+    Obtiene datos del usuario y contexto RAG en paralelo y arma el prompt de
+    sistema dentro de PROMPT_MAX_TOKENS. Si se pasa `tiempos`, se llena con la
+    duración de cada etapa en segundos.
+    """
+    tiempos = {} if tiempos is None else tiempos
+    inicio = time.perf_counter()
+    with medir("contexto"):
+        secciones_usuario, contexto_rag = await asyncio.gather(
+            _contexto_academico(pregunta, subtipo, tiempos),
+            _contexto_rag(pregunta, tarea_rag, tiempos),
         )
+    tiempos["contexto"] = time.perf_counter() - inicio
 
-        logging.info("Consultando a Grok...")
-        # Llamada a la función sync que usa la API
-        respuesta_llm, tiempo_ms = await asyncio.get_event_loop().run_in_executor(
-            executor, _generar_respuesta_sync, prompt_sistema, texto_usuario
+    inicio = time.perf_counter()
+    with medir("prompt"):
+        prompt = prompt_builder.armar_prompt(
+            PROMPT_SISTEMA_ESTATICO, PROMPT_REGLAMENTO, PROMPT_USUARIO,
+            pregunta.query, secciones_usuario, contexto_rag,
+            tipo_usuario_upper=pregunta.tipo_usuario.upper(),
         )
+    tiempos["prompt"] = time.perf_counter() - inicio
 
-        if not respuesta_llm:
-            respuesta_final = "Hubo un problema de conexión con el asistente."
-        else:
-            respuesta_limpia = _limpiar_respuesta(respuesta_llm)
-            respuesta_final = respuesta_limpia if _validar_respuesta(respuesta_limpia) else respuesta_llm
-            tipo_respuesta = "llm"
+    for nivel, huella in (("estatico", prompt.hash_estatico), ("reglamento", prompt.hash_reglamento)):
+        repetido = prefijos_prompt.registrar(nivel, huella)
+        metrics.PROMPT_PREFIJOS.labels(nivel, "repetido" if repetido else "nuevo").inc()
+
+    metrics.PROMPT_TOKENS.labels("total").observe(prompt.tokens)
+    metrics.PROMPT_TOKENS.labels("usuario").observe(prompt.tokens_usuario)
+    metrics.PROMPT_TOKENS.labels("reglamento").observe(prompt.tokens_reglamento)
+    logging.info(
+        f"🧮 Prompt ~{prompt.tokens} tokens (usuario={prompt.tokens_usuario}, "
+        f"reglamento={prompt.tokens_reglamento} en {prompt.fragmentos_rag}/{prompt.fragmentos_rag_total} fragmentos), "
+        f"prefijo ~{prompt.tokens_prefijo} tokens [{prompt.hash_reglamento}], omitidas={prompt.omitidas}"
+    )
+    return prompt
+
+
+def _formatear_tiempos(tiempos: Dict[str, float]) -> str:
+    return ", ".join(f"{etapa}={segundos * 1000:.1f}" for etapa, segundos in tiempos.items())
 
-    # 5. Guardar en Caché (si aplica)
-    if respuesta_final and tipo_respuesta == "direct":
-        with cache_respuestas_lock:
-            cache_respuestas[cache_key] = respuesta_final
 
+def _normalizar_consulta(texto: str) -> str:
+    """Minúsculas, sin acentos, signos ni espacios repetidos."""
+    texto = QuestionClassifier.normalize_text(texto)
+    texto = re.sub(r"[¿?¡!.,;:]", " ", texto)
+    return " ".join(texto.split())
+
+
+def _clave_llm(prompt_sistema: str, texto_usuario: str) -> str:
+    """Clave de agrupamiento: el prompt ya incluye el contexto RAG y, si aplica, el del usuario."""
+    contenido = f"{prompt_sistema}\n{_normalizar_consulta(texto_usuario)}"
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+# Respuestas que no deben reutilizarse entre usuarios
+RESPUESTAS_NO_CACHEABLES = ["Error interno", "Lo siento, hubo un error", "No tengo esa información"]
+
+
+async def _respuesta_semantica(pregunta: Pregunta) -> Optional[Dict[str, Any]]:
+    """
+    Busca en la caché semántica si la pregunta es de reglamento o política
+    general. Se consulta antes de encolar; mientras el codificador no esté
+    cargado no hay caché y la petición sigue su camino.
+    """
+    if cache_semantica is None or not admite_pregunta(pregunta.query):
+        return None
+
+    inicio = time.time()
+    with medir("cache_semantica"):
+        respuesta = await asyncio.get_running_loop().run_in_executor(
+            executor, cache_semantica.buscar, pregunta.query, pregunta.tipo_usuario.lower()
+        )
+    if respuesta is None:
+        return None
     return {
-        "response": respuesta_final,
+        "response": respuesta,
+        "tiempo_ms": round((time.time() - inicio) * 1000, 2),
+        "tipo_respuesta": "semantic_cache",
+        "from_cache": True,
+    }
+
+
+async def _guardar_respuesta_semantica(pregunta: Pregunta, respuesta: str):
+    """Guarda la respuesta del LLM en la caché semántica cuando es reutilizable."""
+    if cache_semantica is None or not admite_pregunta(pregunta.query):
+        return
+    if any(n in respuesta for n in RESPUESTAS_NO_CACHEABLES):
+        return
+    await asyncio.get_running_loop().run_in_executor(
+        executor, cache_semantica.guardar, pregunta.query, pregunta.tipo_usuario.lower(), respuesta
+    )
+
+
+async def _process_single_request(pregunta: Pregunta, tarea_rag: Optional[asyncio.Task] = None,
+                                  subtipo: Optional[str] = None,
+                                  tokens: Optional[asyncio.Queue] = None) -> Dict[str, Any]:
+    """
+    Procesa una petición compleja (RAG + Grok) tomada de la cola. `tarea_rag`
+    es la búsqueda del RAG que se inició antes de encolar, si la hay, y
+    `subtipo` el de la respuesta directa que no alcanzó. Con `tokens`
+    (/generate/stream), los tokens de Grok se dejan ahí conforme llegan.
+    """
+    
+    # Aseguramos que Grok y RAG estén listos
+    await _esperar_modelos()
+
+    texto_usuario = pregunta.query
+    id_usuario = pregunta.id_usuario
+    tipo_usuario = pregunta.tipo_usuario.lower()
+    
+    logging.info(f"Procesando: {tipo_usuario} {id_usuario} -> {texto_usuario}")
+
+    # 1. Verificar Caché de Respuestas
+    resultado_cache = _respuesta_en_cache(pregunta)
+    if resultado_cache is not None:
+        logging.info("Respuesta obtenida de caché.")
+        return resultado_cache
+
+    # 2. Datos de usuario y contexto RAG (en paralelo) y prompt
+    tiempos: Dict[str, float] = {}
+    prompt = await _preparar_prompt(pregunta, tarea_rag, tiempos, subtipo)
+    prompt_sistema = prompt.texto
+
+    # 3. Uso de Grok (LLM), agrupando preguntas idénticas que ya estén en vuelo
+    logging.info("Consultando a Grok...")
+    clave = _clave_llm(prompt_sistema, texto_usuario)
+    inicio = time.perf_counter()
+    if tokens is None:
+        generar = lambda: _generar_respuesta_async(prompt_sistema, texto_usuario)
+    else:
+        # Si la misma pregunta ya está en vuelo, el stream recibe solo la respuesta final
+        generar = lambda: _generar_respuesta_stream(prompt_sistema, texto_usuario, tokens)
+    with medir("llm"):
+        respuesta_llm, tiempo_ms = await llm_vuelos.run(clave, generar)
+    tiempos["llm"] = time.perf_counter() - inicio
+    with medir("post_procesado"):
+        respuesta = _post_procesar_respuesta(respuesta_llm)
+    await _guardar_respuesta_semantica(pregunta, respuesta)
+    logging.info(f"⏱️ Etapas (ms): {_formatear_tiempos(tiempos)}, rag_especulativo={tarea_rag is not None}")
+
+    return {
+        "response": respuesta,
         "tiempo_ms": tiempo_ms,
-        "tipo_respuesta": tipo_respuesta,
+        "tipo_respuesta": "llm",
         "from_cache": False,
+        "tokens_prompt": prompt.tokens,
     }
 
 
-async def queue_worker():
-    """Worker que procesa peticiones de la cola secuencialmente."""
-    logging.info("Queue worker iniciado")
-    while True:
-        request: QueueRequest = await message_queue.get()
-        
-        with queue_stats_lock:
-            queue_stats["processing"] = True
-            queue_stats["current_queue_size"] = message_queue.qsize()
-        
-        try:
-            # Timeout interno por seguridad
-            resultado = await asyncio.wait_for(_process_single_request(request.pregunta), timeout=60.0)
-            request.future.set_result(resultado)
-            with queue_stats_lock:
-                queue_stats["total_processed"] += 1
-            
-        except Exception as e:
-            logging.error(f"Error worker request {request.request_id}: {e}")
-            request.future.set_exception(e)
-            with queue_stats_lock:
-                queue_stats["total_errors"] += 1
-        
-        finally:
-            message_queue.task_done()
-            with queue_stats_lock:
-                queue_stats["processing"] = False
-                queue_stats["current_queue_size"] = message_queue.qsize()
-
-
-@lru_cache(maxsize=100)
-def _obtener_datos_usuario_cached(id_usuario: str, tipo_usuario: str) -> Optional[Dict]:
-    """Obtiene datos de usuario con caché."""
-    with cache_usuarios_lock:
-        cache_key = f"{tipo_usuario}:{id_usuario}"
-        if cache_key in cache_usuarios:
-            return cache_usuarios[cache_key]
-        
-        if tipo_usuario.lower() == "alumno":
-            datos = obtener_datos_usuario(id_usuario)
-        elif tipo_usuario.lower() == "profesor":
-            datos = obtener_datos_profesor(id_usuario)
-        else:
-            datos = None
-            
-        if datos:
-            cache_usuarios[cache_key] = datos
-            return datos
+async def _cargar_secciones_usuario(id_usuario: str, tipo_usuario: str, secciones: List[str]) -> Optional[Dict]:
+    """Carga secciones del perfil desde la BD sin bloquear el event loop, según DB_BACKEND."""
+    tipo_usuario = tipo_usuario.lower()
+    if DB_BACKEND == "async":
+        if tipo_usuario == "alumno":
+            return await obtener_secciones_alumno_async(id_usuario, secciones)
+        if tipo_usuario == "profesor":
+            return await obtener_secciones_profesor_async(id_usuario, secciones)
+        return None
+
+    if tipo_usuario == "alumno":
+        cargador = obtener_secciones_alumno
+    elif tipo_usuario == "profesor":
+        cargador = obtener_secciones_profesor
+    else:
         return None
+    return await asyncio.get_running_loop().run_in_executor(executor, cargador, id_usuario, secciones)
+
+
+async def _obtener_fechas_relevantes() -> Dict[str, str]:
+    """Calendario del semestre (cacheado en db_utils) sin bloquear el event loop."""
+    if DB_BACKEND == "async":
+        return await obtener_fechas_relevantes_async()
+    return await asyncio.get_running_loop().run_in_executor(executor, obtener_fechas_relevantes)
+
+
+async def _obtener_datos_usuario_cached(id_usuario: str, tipo_usuario: str, secciones: Iterable[str]) -> Optional[Dict]:
+    """
+    Obtiene las secciones pedidas del perfil con caché por sección; los fallos
+    concurrentes comparten una sola carga. El calendario sale de su propia caché.
+    Devuelve None si el usuario no existe.
+    """
+    secciones = set(secciones)
+    secciones_perfil = sorted(secciones - {SECCION_FECHAS})
+    if secciones_perfil and "identidad" not in secciones_perfil:
+        # La identidad confirma que el usuario existe (boleta / id_profesor)
+        secciones_perfil.append("identidad")
+
+    async def _perfil():
+        if not secciones_perfil:
+            return {}
+        return await cache_usuarios.get_or_load(
+            tipo_usuario, id_usuario, secciones_perfil,
+            lambda faltantes: _cargar_secciones_usuario(id_usuario, tipo_usuario, faltantes),
+        )
+
+    async def _fechas():
+        return await _obtener_fechas_relevantes() if SECCION_FECHAS in secciones else None
+
+    datos_usuario, fechas_semestre = await asyncio.gather(_perfil(), _fechas())
+    if datos_usuario is None:
+        return None
+    if fechas_semestre is not None:
+        datos_usuario = {**datos_usuario, "fechas_semestre": fechas_semestre}
+    return datos_usuario
 
 
 # ============================================================================ 
@@ -466,15 +1056,34 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def startup_event():
-    global message_queue
+    global message_queue, rag_executor
     message_queue = asyncio.Queue()
-    asyncio.create_task(queue_worker())
-    logging.info("🚀 Sistema iniciado (Modo: API Grok)")
+    rag_executor = _crear_executor_rag()
+
+    for i in range(max(1, NUM_WORKERS_LLM)):
+        worker = QueueWorker(f"llm-{i}", message_queue, WORKER_CONCURRENCY)
+        queue_workers.append(worker)
+        asyncio.create_task(worker.run())
+
+    if DB_BACKEND == "async":
+        await db_async.init_pool()
+
+    if WARMUP_ON_STARTUP:
+        _iniciar_carga_modelos()
+
+    logging.info(
+        f"🚀 Sistema iniciado (Modo: API Grok) - workers={NUM_WORKERS_LLM}, "
+        f"concurrencia={WORKER_CONCURRENCY}, BD={DB_BACKEND}, RAG={RAG_EXECUTOR}x{RAG_WORKERS}, "
+        f"clasificador={QuestionClassifier.motor}"
+    )
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logging.info("🛑 Cerrando sistema")
+    await db_async.close_pool()
+    if rag_executor is not None:
+        rag_executor.shutdown(wait=False, cancel_futures=True)
 
 
 @app.post("/generate/")
@@ -483,59 +1092,229 @@ async def responder(pregunta: Pregunta):
     request_id = str(uuid.uuid4())
     
     # Quick Cache Check antes de encolar
-    texto_usuario = pregunta.query
-    id_usuario = pregunta.id_usuario
-    tipo_usuario = pregunta.tipo_usuario.lower()
-    
-    cache_key = hashlib.sha256(f"{tipo_usuario}:{id_usuario}:{texto_usuario}".encode("utf-8")).hexdigest()
-    with cache_respuestas_lock:
-        if cache_key in cache_respuestas:
-            return {
-                "response": cache_respuestas[cache_key],
-                "tiempo_ms": 0,
-                "tipo_respuesta": "cached",
-                "from_cache": True,
-                "request_id": request_id,
-            }
-
-    # Encolar
-    future = asyncio.Future()
+    resultado = _respuesta_en_cache(pregunta)
+    if resultado is not None:
+        resultado["request_id"] = request_id
+        return resultado
+
+    # Carril rápido: las preguntas directas se responden sin entrar a la cola
+    tipo_pregunta, subtipo = _clasificar(pregunta)
+    if tipo_pregunta == "direct" and subtipo:
+        resultado = await _responder_directo(pregunta, subtipo)
+        if resultado is not None:
+            resultado["request_id"] = request_id
+            return resultado
+
+    # Una pregunta general ya respondida a otro usuario no necesita esperar en la cola
+    resultado = await _respuesta_semantica(pregunta)
+    if resultado is not None:
+        logging.info("Respuesta obtenida de caché semántica.")
+        resultado["request_id"] = request_id
+        return resultado
+
+    # Encolar solo el camino complejo (LLM); la búsqueda del RAG avanza mientras espera
+    future = asyncio.get_running_loop().create_future()
     queue_request = QueueRequest(
         request_id=request_id,
         pregunta=pregunta,
         future=future,
-        timestamp=time.time()
+        timestamp=time.time(),
+        tarea_rag=_iniciar_rag_especulativo(pregunta),
+        subtipo=subtipo,
     )
     
     await message_queue.put(queue_request)
     
     # Esperar resultado
     try:
-        resultado = await asyncio.wait_for(future, timeout=120.0)
+        resultado = await asyncio.wait_for(future, timeout=TIMEOUT_RESPUESTA_S)
         resultado["request_id"] = request_id
         return resultado
     except asyncio.TimeoutError:
         return {"response": "Tiempo de espera agotado.", "error": "timeout", "request_id": request_id}
+    except ModelosNoDisponibles as e:
+        return JSONResponse(
+            status_code=503,
+            content={"response": "El asistente se está iniciando.", "error": str(e), "request_id": request_id},
+        )
     except Exception as e:
         return {"response": "Error interno.", "error": str(e), "request_id": request_id}
 
 
+def _evento_sse(evento: str, datos: Dict[str, Any]) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+@app.post("/generate/stream")
+async def responder_stream(pregunta: Pregunta):
+    """
+    Endpoint con streaming (SSE). Emite eventos `token` conforme llegan de Grok
+    y un evento `done` con la respuesta final ya post-procesada. Las respuestas
+    en caché y directas se envían en un único evento `done`.
+    """
+    request_id = str(uuid.uuid4())
+
+    async def eventos():
+        # Todo va dentro del try: un fallo de BD, RAG o Grok llega al cliente como evento `error`
+        try:
+            subtipo = None
+            resultado = _respuesta_en_cache(pregunta)
+            if resultado is None:
+                tipo_pregunta, subtipo = _clasificar(pregunta)
+                if tipo_pregunta == "direct" and subtipo:
+                    resultado = await _responder_directo(pregunta, subtipo)
+            if resultado is None:
+                resultado = await _respuesta_semantica(pregunta)
+            if resultado is None:
+                # Misma cola y mismos workers que /generate/: respeta sus límites de concurrencia
+                future = asyncio.get_running_loop().create_future()
+                tokens: asyncio.Queue = asyncio.Queue()
+                await message_queue.put(QueueRequest(
+                    request_id=request_id,
+                    pregunta=pregunta,
+                    future=future,
+                    timestamp=time.time(),
+                    tarea_rag=_iniciar_rag_especulativo(pregunta),
+                    subtipo=subtipo,
+                    tokens=tokens,
+                ))
+
+                limite = time.time() + TIMEOUT_RESPUESTA_S
+                while True:
+                    token = await asyncio.wait_for(tokens.get(), timeout=max(0.0, limite - time.time()))
+                    if token is None:
+                        break
+                    yield _evento_sse("token", {"token": token})
+                resultado = await future
+        except asyncio.TimeoutError:
+            yield _evento_sse("error", {"response": "Tiempo de espera agotado.", "error": "timeout", "request_id": request_id})
+            return
+        except ModelosNoDisponibles as e:
+            yield _evento_sse("error", {"response": "El asistente se está iniciando.", "error": str(e), "request_id": request_id})
+            return
+        except Exception as e:
+            logging.error(f"Error en streaming {request_id}: {e}")
+            yield _evento_sse("error", {"response": "Error interno.", "error": str(e), "request_id": request_id})
+            return
+
+        resultado["request_id"] = request_id
+        yield _evento_sse("done", resultado)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 solo cuando el RAG y el cliente Grok están cargados."""
+    estado = {
+        "ready": modelos_listos(),
+        "rag": rag_listo(),
+        "llm": llm_client is not None,
+        "tiempos_carga_s": tiempos_arranque,
+    }
+    if not estado["ready"]:
+        return JSONResponse(status_code=503, content=estado)
+    return estado
+
+
 @app.get("/queue/status")
 async def get_queue_status():
-    with queue_stats_lock:
-        return {
-            "queue_size": message_queue.qsize() if message_queue else 0,
-            "processing": queue_stats["processing"],
-            "total_processed": queue_stats["total_processed"],
-            "total_errors": queue_stats["total_errors"],
-        }
+    workers = [w.stats.as_dict() for w in queue_workers]
+    return {
+        "queue_size": message_queue.qsize() if message_queue else 0,
+        "processing": any(w["en_proceso"] for w in workers),
+        "total_processed": sum(w["total_processed"] for w in workers),
+        "total_errors": sum(w["total_errors"] for w in workers),
+        "llm_en_vuelo": llm_vuelos.en_vuelo(),
+        "llm_coalescidas": llm_vuelos.compartidas,
+        "workers": workers,
+    }
+
+def _actualizar_metricas():
+    """Refresca los gauges que se leen del estado actual al momento del scrape."""
+    metrics.COLA_TAMANO.set(message_queue.qsize() if message_queue else 0)
+
+    perfiles = cache_usuarios.stats()
+    metrics.actualizar_hit_ratio("perfiles", perfiles["hits"], perfiles["misses"])
+    if cache_semantica is not None:
+        semantica = cache_semantica.stats()
+        metrics.actualizar_hit_ratio("semantica", semantica["hits"], semantica["misses"])
+    if rag is not None and rag.batcher is not None:
+        lotes = rag.batcher.stats()
+        metrics.EMBEDDING_LOTES.set(lotes["lotes"])
+        metrics.EMBEDDING_LOTE_PROMEDIO.set(lotes["tamano_promedio_lote"])
+        metrics.EMBEDDING_ESPERA_PROMEDIO.set(lotes["espera_promedio_ms"] / 1000)
+
+    pools = {"sync": db_utils.estado_pool()}
+    if DB_BACKEND == "async":
+        pools["async"] = db_async.estado_pool()
+    for backend, estado in pools.items():
+        if estado is None:
+            continue
+        tamano, en_uso = estado
+        metrics.DB_POOL_TAMANO.labels(backend).set(tamano)
+        metrics.DB_POOL_EN_USO.labels(backend).set(en_uso)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas en formato Prometheus."""
+    _actualizar_metricas()
+    contenido, content_type = metrics.exportar()
+    return Response(content=contenido, media_type=content_type)
+
+
+@app.get("/rag/stats")
+async def get_rag_stats():
+    if not rag_listo():
+        return {"cargado": False}
+    # En modo process el índice vive en los procesos del pool; sus metadatos se leen del disco
+    metadatos = rag.metadatos_indice if rag is not None else cargar_metadatos_indice(_opciones_rag(0)["index_path"])
+    return {
+        "cargado": True,
+        "indice_faiss": metadatos.get("tipo"),
+        "backend_embeddings": EMBED_BACKEND,
+        "embeddings": rag.batcher.stats() if rag is not None and rag.batcher else None,
+        "executor": {
+            "tipo": RAG_EXECUTOR,
+            "workers": RAG_WORKERS,
+            "max_concurrencia": RAG_MAX_CONCURRENCY,
+            "en_curso": rag_en_curso,
+            "en_vuelo": rag_vuelos.en_vuelo(),
+            "coalescidas": rag_vuelos.compartidas,
+            "cache_contexto_size": len(cache_contexto),
+        },
+    }
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    with cache_respuestas_lock:
+        respuestas_size = len(cache_respuestas)
+    return {
+        "perfiles": cache_usuarios.stats(),
+        "cache_respuestas_size": respuestas_size,
+        "semantica": cache_semantica.stats() if cache_semantica else None,
+        "prefijos_prompt": prefijos_prompt.stats(),
+    }
+
+@app.post("/cache/invalidate/{tipo_usuario}/{id_usuario}")
+async def invalidate_user_cache(tipo_usuario: str, id_usuario: str):
+    estaba = cache_usuarios.invalidate(tipo_usuario, id_usuario)
+    return {"message": "Perfil invalidado." if estaba else "El perfil no estaba en caché."}
 
 @app.post("/cache/clear")
 async def clear_cache():
-    with cache_usuarios_lock:
-        cache_usuarios.clear()
+    cache_usuarios.clear()
     with cache_respuestas_lock:
         cache_respuestas.clear()
-    _obtener_datos_usuario_cached.cache_clear()
-    _buscar_contexto_cached.cache_clear()
+    invalidar_fechas_relevantes()
+    if cache_semantica is not None:
+        cache_semantica.clear()
+    cache_contexto.clear()
     return {"message": "Cachés limpiados."}
\ No newline at end of file
@@ -0,0 +1,90 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Buckets en segundos: desde consultas a caché (ms) hasta llamadas lentas a Grok
+BUCKETS_ETAPA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+ETAPA_SEGUNDOS = Histogram(
+    "saes_etapa_segundos",
+    "Latencia de cada etapa del pipeline de respuesta",
+    ["etapa"],
+    buckets=BUCKETS_ETAPA,
+)
+ESPERA_COLA_SEGUNDOS = Histogram(
+    "saes_espera_cola_segundos",
+    "Tiempo que una petición compleja espera en la cola LLM",
+    buckets=BUCKETS_ETAPA,
+)
+CACHE_CONSULTAS = Counter(
+    "saes_cache_consultas_total",
+    "Consultas a cada caché por resultado (hit/miss)",
+    ["cache", "resultado"],
+)
+CACHE_HIT_RATIO = Gauge(
+    "saes_cache_hit_ratio",
+    "Proporción de aciertos acumulada de cada caché",
+    ["cache"],
+)
+EMBEDDING_LOTE_PROMEDIO = Gauge(
+    "saes_embedding_lote_tamano_promedio", "Consultas por llamada a encode en el agrupador de embeddings"
+)
+EMBEDDING_ESPERA_PROMEDIO = Gauge(
+    "saes_embedding_espera_promedio_segundos", "Espera promedio de una consulta antes de entrar a un lote"
+)
+EMBEDDING_LOTES = Gauge("saes_embedding_lotes", "Lotes codificados por el agrupador de embeddings")
+COLA_TAMANO = Gauge("saes_cola_tamano", "Peticiones esperando en la cola LLM")
+PROMPT_TOKENS = Histogram(
+    "saes_prompt_tokens",
+    "Tokens del prompt de sistema: estimados por parte o reportados por Grok",
+    ["parte"],
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000),
+)
+PROMPT_PREFIJOS = Counter(
+    "saes_prompt_prefijos_total",
+    "Prompts por nivel de prefijo (estatico, reglamento) y si el prefijo ya se había visto",
+    ["nivel", "resultado"],
+)
+RAG_EN_CURSO = Gauge("saes_rag_en_curso", "Búsquedas del RAG ejecutándose en su executor")
+DB_POOL_TAMANO = Gauge("saes_db_pool_tamano", "Conexiones del pool de BD", ["backend"])
+DB_POOL_EN_USO = Gauge("saes_db_pool_en_uso", "Conexiones del pool de BD prestadas", ["backend"])
+
+
+@contextmanager
+def medir(etapa: str):
+    """Registra la duración del bloque en el histograma de la etapa."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        ETAPA_SEGUNDOS.labels(etapa).observe(time.perf_counter() - inicio)
+
+
+def observar_etapa(etapa: str, segundos: float):
+    ETAPA_SEGUNDOS.labels(etapa).observe(segundos)
+
+
+# Conteos propios para las cachés que no llevan sus contadores (hits, misses)
+_conteos_cache = defaultdict(lambda: [0, 0])
+_conteos_lock = Lock()
+
+
+def registrar_consulta_cache(cache: str, hit: bool):
+    CACHE_CONSULTAS.labels(cache, "hit" if hit else "miss").inc()
+    with _conteos_lock:
+        conteo = _conteos_cache[cache]
+        conteo[0 if hit else 1] += 1
+        actualizar_hit_ratio(cache, *conteo)
+
+
+def actualizar_hit_ratio(cache: str, hits: int, misses: int):
+    total = hits + misses
+    CACHE_HIT_RATIO.labels(cache).set(hits / total if total else 0.0)
+
+
+def exportar() -> tuple:
+    """Cuerpo y content-type de la exposición de métricas."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,221 @@
+"""
+Motor alternativo de QuestionClassifier: n-gramas de caracteres con TF-IDF
+y una regresión logística multiclase (softmax), todo en NumPy.
+
+Se entrena con las semillas de DIRECT_PATTERNS_RAW y COMPLEX_PATTERNS_RAW
+(convertidas a texto) más ejemplos etiquetados opcionales, por ejemplo
+consultas reales revisadas a mano. El artefacto es un solo .npz con el
+vocabulario, los pesos IDF y la matriz de pesos (ver entrenar_clasificador.py).
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RUTA_MODELO = "models/clasificador_ngramas.npz"
+COMPLEX = "complex"
+N_MIN, N_MAX = 2, 4
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9ñ ]+")
+
+# Preguntas de reglamento y trámites: las semillas de COMPLEX_PATTERNS_RAW son
+# pocas frente a las de los subtipos directos y el modelo las subestimaría
+PREGUNTAS_COMPLEJAS_SEMILLA = [
+    "que requisitos piden para inscribirme de nuevo",
+    "como tramito la baja definitiva de la escuela",
+    "cuantas veces se puede recursar una unidad de aprendizaje",
+    "que dice el reglamento de estudios sobre la titulacion",
+    "que pasa si no apruebo el extraordinario",
+    "cuales son las modalidades de titulacion del ipn",
+    "en que casos procede una baja temporal",
+    "como se solicita la revision de una calificacion",
+    "que sanciones contempla el reglamento",
+    "como funciona el servicio social",
+    "que necesito para solicitar movilidad academica",
+    "como se acredita una materia por saberes previos",
+    "cuanto tiempo maximo tengo para terminar segun el reglamento",
+    "que hago si me dieron de baja por exceder el plazo",
+    "cuales son los derechos y obligaciones de los alumnos",
+    "se puede cambiar de programa academico",
+    "como se pide un dictamen a la comision de situacion escolar",
+    "que pasa si repruebo una materia varias veces",
+    "como solicito equivalencia de estudios",
+    "que requisitos hay para obtener el titulo",
+    "cuantos ets puedo presentar por periodo",
+    "como me inscribo a materias de otro plan",
+    "que ocurre si abandono la escuela un semestre",
+    "que obligaciones tienen los docentes segun el reglamento",
+    "como se registra una tesis",
+    "que documentos necesito para la reinscripcion",
+    "se puede presentar ets sin haber cursado la materia",
+    "que procede si un alumno comete plagio",
+    "como apelo una resolucion de la comision",
+    "que reglas hay para la evaluacion extraordinaria",
+]
+
+
+def limpiar(texto_normalizado: str) -> str:
+    """Quita signos y espacios repetidos de un texto ya pasado por normalize_text."""
+    return " ".join(_NO_ALFANUMERICO.sub(" ", texto_normalizado).split())
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas sin acentos ni signos, como ve el texto el modelo."""
+    from question_classifier import QuestionClassifier
+
+    return limpiar(QuestionClassifier.normalize_text(texto))
+
+
+def ngramas(texto: str) -> Counter:
+    """N-gramas de caracteres del texto ya normalizado, con un espacio en cada borde."""
+    texto = f" {texto} "
+    return Counter(
+        texto[i:i + n] for n in range(N_MIN, N_MAX + 1) for i in range(len(texto) - n + 1)
+    )
+
+
+def texto_de_patron(patron: str) -> str:
+    """Convierte una semilla regex ('cual.*es.*mi.*promedio') en texto ('cual es mi promedio')."""
+    texto = re.sub(r"\\[sbw][+*]?|\.\*|\.\+|[\^$().|?+*]", " ", patron)
+    return " ".join(texto.replace("\\", "").split())
+
+
+def ejemplos_semilla() -> List[Tuple[str, str]]:
+    """(texto, etiqueta) a partir de los patrones del clasificador regex."""
+    from question_classifier import QuestionClassifier
+
+    ejemplos = []
+    for subtipo, patrones in QuestionClassifier.DIRECT_PATTERNS_RAW.items():
+        if subtipo.startswith("definicion_"):
+            continue  # Las definiciones las resuelve la búsqueda de términos
+        ejemplos += [(texto_de_patron(p), subtipo) for p in patrones]
+    ejemplos += [(texto_de_patron(p), COMPLEX) for p in QuestionClassifier.COMPLEX_PATTERNS_RAW]
+    ejemplos += [(p, COMPLEX) for p in PREGUNTAS_COMPLEJAS_SEMILLA]
+    return [(normalizar(t), etiqueta) for t, etiqueta in ejemplos if normalizar(t)]
+
+
+class NgramClassifier:
+    """TF-IDF de n-gramas de caracteres + softmax lineal."""
+
+    def __init__(self, vocabulario: Sequence[str], idf: np.ndarray, pesos: np.ndarray,
+                 sesgo: np.ndarray, clases: Sequence[str]):
+        self.vocabulario = {ng: i for i, ng in enumerate(vocabulario)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.pesos = np.asarray(pesos, dtype=np.float32)
+        self.sesgo = np.asarray(sesgo, dtype=np.float32)
+        self.clases = list(clases)
+        forma = (len(self.vocabulario), len(self.clases))
+        if self.pesos.shape != forma or self.idf.shape != forma[:1] or self.sesgo.shape != forma[1:]:
+            raise ValueError(
+                f"Modelo inconsistente: pesos {self.pesos.shape}, idf {self.idf.shape}, "
+                f"sesgo {self.sesgo.shape} para {forma[0]} n-gramas y {forma[1]} clases"
+            )
+
+    def _vector(self, texto: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Columnas y valores TF-IDF (tf sublineal, norma L2) del texto normalizado."""
+        conteos = [(self.vocabulario[ng], c) for ng, c in ngramas(texto).items() if ng in self.vocabulario]
+        if not conteos:
+            return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.float32)
+        columnas = np.fromiter((col for col, _ in conteos), dtype=np.int64, count=len(conteos))
+        tf = np.fromiter((1.0 + math.log(c) for _, c in conteos), dtype=np.float32, count=len(conteos))
+        valores = tf * self.idf[columnas]
+        return columnas, valores / np.linalg.norm(valores)
+
+    def predict_proba(self, textos: Sequence[str]) -> np.ndarray:
+        """Probabilidades (n_textos x n_clases) para textos ya normalizados."""
+        vectores = [self._vector(t) for t in textos]
+        columnas = np.concatenate([c for c, _ in vectores])
+        valores = np.concatenate([v for _, v in vectores])
+        inicios = np.cumsum([0] + [len(c) for c, _ in vectores[:-1]])
+        # Producto disperso por filas: suma de las filas de pesos de cada texto
+        logits = np.add.reduceat(self.pesos[columnas] * valores[:, None], inicios, axis=0) + self.sesgo
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predecir(self, textos: Sequence[str]) -> List[Tuple[str, float]]:
+        """(etiqueta, confianza) de cada texto normalizado."""
+        if not textos:
+            return []
+        probabilidades = self.predict_proba(textos)
+        mejores = probabilidades.argmax(axis=1)
+        return [(self.clases[i], float(probabilidades[fila, i])) for fila, i in enumerate(mejores)]
+
+    def guardar(self, ruta: str = RUTA_MODELO):
+        ordenado = sorted(self.vocabulario, key=self.vocabulario.get)
+        np.savez_compressed(
+            ruta,
+            vocabulario=np.array(ordenado),
+            idf=self.idf,
+            pesos=self.pesos.astype(np.float16),  # basta para una decisión por argmax
+            sesgo=self.sesgo,
+            clases=np.array(self.clases),
+        )
+
+    @classmethod
+    def cargar(cls, ruta: str = RUTA_MODELO) -> "NgramClassifier":
+        with open(ruta, "rb") as f, np.load(f, allow_pickle=False) as datos:
+            return cls(
+                datos["vocabulario"].tolist(), datos["idf"], datos["pesos"].astype(np.float32),
+                datos["sesgo"], datos["clases"].tolist(),
+            )
+
+
+def entrenar(ejemplos: Iterable[Tuple[str, str]], epocas: int = 300, tasa: float = 0.5,
+             l2: float = 1e-4, semilla: Optional[int] = 0) -> NgramClassifier:
+    """
+    Entrena con descenso de gradiente (Adam) sobre la matriz TF-IDF densa.
+    Las clases se ponderan por su frecuencia inversa para que "complex"
+    no quede subrepresentada frente a los subtipos con muchas semillas.
+    """
+    ejemplos = list(ejemplos)
+    textos = [t for t, _ in ejemplos]
+    clases = sorted({e for _, e in ejemplos})
+    indice_clase = {c: i for i, c in enumerate(clases)}
+    y = np.array([indice_clase[e] for _, e in ejemplos])
+
+    conteos = [ngramas(t) for t in textos]
+    df = Counter(ng for c in conteos for ng in c)
+    vocabulario = sorted(df)
+    columna = {ng: i for i, ng in enumerate(vocabulario)}
+    n = len(textos)
+    idf = np.array([math.log((1 + n) / (1 + df[ng])) + 1 for ng in vocabulario], dtype=np.float32)
+
+    X = np.zeros((n, len(vocabulario)), dtype=np.float32)
+    for fila, c in enumerate(conteos):
+        for ng, tf in c.items():
+            X[fila, columna[ng]] = (1.0 + math.log(tf)) * idf[columna[ng]]
+    X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+    Y = np.eye(len(clases), dtype=np.float32)[y]
+    frecuencia = np.bincount(y, minlength=len(clases)).astype(np.float32)
+    peso_ejemplo = (n / (len(clases) * frecuencia))[y][:, None]
+
+    rng = np.random.default_rng(semilla)
+    W = rng.normal(0, 0.01, (len(vocabulario), len(clases))).astype(np.float32)
+    b = np.zeros(len(clases), dtype=np.float32)
+    m_w, v_w = np.zeros_like(W), np.zeros_like(W)
+    m_b, v_b = np.zeros_like(b), np.zeros_like(b)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for t in range(1, epocas + 1):
+        logits = X @ W + b
+        logits -= logits.max(axis=1, keepdims=True)
+        P = np.exp(logits)
+        P /= P.sum(axis=1, keepdims=True)
+        error = (P - Y) * peso_ejemplo / n
+        grad_w = X.T @ error + l2 * W
+        grad_b = error.sum(axis=0)
+
+        m_w = beta1 * m_w + (1 - beta1) * grad_w
+        v_w = beta2 * v_w + (1 - beta2) * grad_w ** 2
+        m_b = beta1 * m_b + (1 - beta1) * grad_b
+        v_b = beta2 * v_b + (1 - beta2) * grad_b ** 2
+        correccion1, correccion2 = 1 - beta1 ** t, 1 - beta2 ** t
+        W -= tasa * (m_w / correccion1) / (np.sqrt(v_w / correccion2) + eps)
+        b -= tasa * (m_b / correccion1) / (np.sqrt(v_b / correccion2) + eps)
+
+    return NgramClassifier(vocabulario, idf, W, b, clases)
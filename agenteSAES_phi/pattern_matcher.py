@@ -0,0 +1,159 @@
+"""
+Búsqueda de muchos patrones regex en una sola pasada, respetando su prioridad.
+
+De cada patrón se extraen los literales que cualquier coincidencia tiene que
+contener (en "cual.*es.*mi.*promedio", "promedio" es obligatorio). El literal
+más largo de cada patrón se usa como ancla. Un autómata Aho-Corasick recorre
+el texto una vez y encuentra todas las anclas presentes. Solo los patrones
+cuya ancla apareció (más los que no tienen ancla) se verifican con su regex,
+en orden de prioridad. Así el costo depende del largo del texto y de los
+candidatos, no del número total de patrones.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+_CARACTER_LITERAL = re.compile(r"[a-z0-9ñ]")
+# Construcciones que el extractor no interpreta: el patrón queda sin ancla
+_NO_SOPORTADO = set("([|{")
+
+
+def required_literals(pattern: str) -> Optional[List[str]]:
+    """
+    Literales que deben aparecer en el texto para que el patrón coincida.
+    Devuelve None si el patrón usa construcciones que no se analizan.
+    """
+    if any(c in _NO_SOPORTADO for c in pattern):
+        return None
+
+    literales, actual = [], []
+
+    def cerrar():
+        if actual:
+            literales.append("".join(actual))
+            actual.clear()
+
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        siguiente = pattern[i + 1] if i + 1 < len(pattern) else ""
+        if c == "\\":
+            # \s, \b, \ , \. ...: separan literales (conservador)
+            cerrar()
+            i += 2
+            continue
+        if _CARACTER_LITERAL.match(c):
+            if siguiente in ("?", "*"):
+                # Carácter opcional: no se puede exigir
+                cerrar()
+            else:
+                actual.append(c)
+                if siguiente == "+":
+                    cerrar()
+        else:
+            cerrar()
+        i += 1
+    cerrar()
+    return literales
+
+
+class AhoCorasick:
+    """Autómata Aho-Corasick: todas las claves presentes en un texto en una pasada."""
+
+    def __init__(self, claves: Iterable[str]):
+        self._transiciones: List[Dict[str, int]] = [{}]
+        self._fallo: List[int] = [0]
+        self._salidas: List[Set[str]] = [set()]
+        for clave in claves:
+            self._agregar(clave)
+        self._construir_fallos()
+
+    def _agregar(self, clave: str):
+        estado = 0
+        for c in clave:
+            siguiente = self._transiciones[estado].get(c)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones[estado][c] = siguiente
+                self._transiciones.append({})
+                self._fallo.append(0)
+                self._salidas.append(set())
+            estado = siguiente
+        self._salidas[estado].add(clave)
+
+    def _construir_fallos(self):
+        cola = deque(self._transiciones[0].values())
+        while cola:
+            estado = cola.popleft()
+            for c, hijo in self._transiciones[estado].items():
+                cola.append(hijo)
+                fallo = self._fallo[estado]
+                while fallo and c not in self._transiciones[fallo]:
+                    fallo = self._fallo[fallo]
+                destino = self._transiciones[fallo].get(c, 0)
+                self._fallo[hijo] = destino if destino != hijo else 0
+                self._salidas[hijo] |= self._salidas[self._fallo[hijo]]
+
+    def buscar(self, texto: str) -> Set[str]:
+        """Claves que aparecen en el texto."""
+        encontradas: Set[str] = set()
+        transiciones, fallo, salidas = self._transiciones, self._fallo, self._salidas
+        estado = 0
+        for c in texto:
+            while estado and c not in transiciones[estado]:
+                estado = fallo[estado]
+            estado = transiciones[estado].get(c, 0)
+            if salidas[estado]:
+                encontradas |= salidas[estado]
+        return encontradas
+
+
+class PatternMatcher:
+    """
+    Devuelve la etiqueta del primer patrón (en orden de prioridad) que
+    coincide con el texto, con el mismo resultado que probar los regex uno
+    por uno con `search`. El texto debe llegar normalizado (minúsculas).
+    """
+
+    def __init__(self, entradas: Iterable[Tuple[Hashable, str]], flags: int = re.IGNORECASE):
+        self._regex: List[re.Pattern] = []
+        self._etiquetas: List[Hashable] = []
+        self._por_ancla: Dict[str, List[int]] = {}
+        self._sin_ancla: List[int] = []
+
+        for prioridad, (etiqueta, patron) in enumerate(entradas):
+            self._regex.append(re.compile(patron, flags))
+            self._etiquetas.append(etiqueta)
+            literales = required_literals(patron)
+            if not literales:
+                self._sin_ancla.append(prioridad)
+                continue
+            ancla = max(literales, key=len)
+            self._por_ancla.setdefault(ancla, []).append(prioridad)
+
+        self._automata = AhoCorasick(self._por_ancla.keys())
+
+    def __len__(self) -> int:
+        return len(self._regex)
+
+    def candidates(self, texto: str) -> List[int]:
+        """Prioridades de los patrones que podrían coincidir, en orden."""
+        candidatos = list(self._sin_ancla)
+        for ancla in self._automata.buscar(texto):
+            candidatos.extend(self._por_ancla[ancla])
+        candidatos.sort()
+        return candidatos
+
+    def first_match(self, texto: str) -> Optional[Hashable]:
+        for prioridad in self.candidates(texto):
+            if self._regex[prioridad].search(texto):
+                return self._etiquetas[prioridad]
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "patrones": len(self._regex),
+            "anclas": len(self._por_ancla),
+            "sin_ancla": len(self._sin_ancla),
+        }
@@ -0,0 +1,269 @@
+"""
+Perfiles de alumno y profesor: secciones, consultas por sección,
+formateadores de los result sets y caché del calendario del semestre.
+
+No abre conexiones: lo comparten db_utils (mysql.connector) y db_async
+(aiomysql), y cada uno crea solo su propio pool.
+"""
+
+import datetime
+import os
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional
+
+from cachetools import TTLCache
+
+from consultas_sql import (
+    SQL_ALUMNO_INFO,
+    SQL_KARDEX_RESUMEN,
+    SQL_UA_APROBADAS,
+    SQL_UA_REPROBADAS,
+    SQL_MATERIAS_INSCRITAS,
+    SQL_REINSCRIPCION,
+    SQL_PROFESOR_INFO,
+    SQL_PROFESOR_GRUPOS,
+    SQL_PROFESOR_CONTADOR,
+    SQL_PROFESOR_COMENTARIOS,
+)
+
+# Código de MySQL para un procedimiento que no existe (esquemas sin sp_datos_alumno)
+ER_SP_DOES_NOT_EXIST = 1305
+
+# Calendario del semestre: una sola fila que cambia pocas veces por semestre,
+# compartida por todos los perfiles. Se invalida con invalidar_fechas_relevantes().
+FECHAS_CACHE_TTL = int(os.getenv("FECHAS_CACHE_TTL", 3600))
+cache_fechas = TTLCache(maxsize=1, ttl=FECHAS_CACHE_TTL)
+cache_fechas_lock = Lock()
+_FECHAS_KEY = "fechas_relevantes"
+
+def _formatear_fechas(fechas_raw: Dict[str, Any]) -> Dict[str, str]:
+    """Convierte la fila de fechas_relevantes a cadenas."""
+    fechas_dict = {}
+    for k, v in fechas_raw.items():
+        if isinstance(v, (datetime.datetime, datetime.date)):
+            fechas_dict[k] = v.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            fechas_dict[k] = str(v) if v else "N/A"
+    return fechas_dict
+
+
+def _guardar_fechas_en_cache(fechas_raw: Dict[str, Any]) -> Dict[str, str]:
+    """Formatea la fila de fechas_relevantes y la guarda en cache_fechas."""
+    fechas = _formatear_fechas(fechas_raw or {})
+    if fechas:
+        with cache_fechas_lock:
+            cache_fechas[_FECHAS_KEY] = fechas
+    return fechas
+
+
+def fechas_en_cache() -> Optional[Dict[str, str]]:
+    """Devuelve el calendario del semestre si está en caché."""
+    with cache_fechas_lock:
+        return cache_fechas.get(_FECHAS_KEY)
+
+
+def invalidar_fechas_relevantes():
+    """Descarta el calendario en caché; la siguiente lectura va a la BD."""
+    with cache_fechas_lock:
+        cache_fechas.clear()
+
+
+# Secciones del perfil de alumno, en el orden de los result sets de sp_datos_alumno.
+# Se cargan y se guardan en caché por separado: cada respuesta directa declara
+# las que necesita (DirectAnswerBuilder.register) y el prompt del LLM, las suyas.
+SECCIONES_ALUMNO = ("identidad", "kardex", "aprobadas", "reprobadas", "inscritas", "reinscripcion")
+SECCIONES_PROFESOR = ("identidad", "grupos", "resenas")
+
+# Consultas de cada sección: (sql, veces que se pasa el id, varias filas, valor si no hay filas)
+CONSULTAS_ALUMNO = {
+    "identidad": [(SQL_ALUMNO_INFO, 1, False, None)],
+    "kardex": [(SQL_KARDEX_RESUMEN, 1, False, {})],
+    "aprobadas": [(SQL_UA_APROBADAS, 1, True, [])],
+    "reprobadas": [(SQL_UA_REPROBADAS, 1, True, [])],
+    "inscritas": [(SQL_MATERIAS_INSCRITAS, 1, True, [])],
+    "reinscripcion": [(SQL_REINSCRIPCION, 2, False, {"reinscripcion_activa": 0, "inscripcion_caduca": None})],
+}
+
+
+def _formatear_identidad_alumno(info) -> Dict[str, Any]:
+    return {
+        "boleta": info["boleta"],
+        "nombre": f"{info['nombre']} {info['ape_paterno']} {info['ape_materno']}",
+        "correo": info["email"],
+        "telefono": info.get("telefono", "N/A"),
+        "direccion_completa": info.get("direccion_completa", "N/A"),
+        "carrera": info["carrera"],
+        "promedio": info.get("promedio"),
+        "creditos_disponibles": info.get("creditos_disponibles"),
+        "estado_academico": info.get("estado_academico"),
+    }
+
+
+def _formatear_kardex_alumno(kardex_resumen) -> Dict[str, Any]:
+    return {
+        "situacion_kardex": kardex_resumen.get("situacion_academica"),
+        "semestres_restantes": kardex_resumen.get("semestres_restantes"),
+    }
+
+
+def _formatear_aprobadas(materias_aprobadas_raw) -> Dict[str, Any]:
+    materias_aprobadas_txt = [
+        f"- {m['materia']} (Calif: {m['calificacion']}, {m['metodo_aprobado']})"
+        for m in materias_aprobadas_raw
+    ]
+    return {
+        "total_materias_aprobadas": len(materias_aprobadas_raw),
+        "materias_aprobadas_texto": "\n".join(materias_aprobadas_txt) or "Sin materias aprobadas registradas",
+    }
+
+
+def _formatear_reprobadas(materias_reprobadas_raw) -> Dict[str, Any]:
+    # Materias Reprobadas (Kardex Detalle)
+    materias_reprobadas_txt = [
+        f"- {m['materia']} (Recursos restantes: {m['periodos_restantes']}, Estado: {m['estado_actual']})"
+        for m in materias_reprobadas_raw
+    ]
+    return {
+        "materias_reprobadas_texto": "\n".join(materias_reprobadas_txt) or "Sin materias reprobadas registradas",
+    }
+
+
+def _formatear_inscritas(materias_inscritas_raw) -> Dict[str, Any]:
+    # Materias Inscritas (Horario/Grupos) con Horarios Detallados
+    materias_inscritas_txt = []
+    for m in materias_inscritas_raw:
+        horario_raw = m.get('horario_detallado', '')
+        # Formatear horario de manera más clara para el LLM
+        if horario_raw:
+            # Convertir "Lunes 7:00-8:30, Martes 10:00-11:30" a formato más legible
+            horarios_list = horario_raw.split(', ')
+            horario_formateado = []
+            for h in horarios_list:
+                partes = h.split(' ')
+                if len(partes) == 2:
+                    dia = partes[0]
+                    horas = partes[1].split('-')
+                    if len(horas) == 2:
+                        horario_formateado.append(f"{dia} de {horas[0]} a {horas[1]}")
+                    else:
+                        horario_formateado.append(h)
+                else:
+                    horario_formateado.append(h)
+            horario_texto = ', '.join(horario_formateado)
+        else:
+            horario_texto = 'Sin horario asignado'
+        
+        materias_inscritas_txt.append(
+            f"- {m['materia']} (Gpo: {m['grupo']}, Turno: {m['turno']}, Prof: {m['profesor_nombre']})\n"
+            f"  Horario: {horario_texto}"
+        )
+
+    semestre_actual = max((m.get("semestre") or 0) for m in materias_inscritas_raw) if materias_inscritas_raw else None
+    return {
+        "semestre_actual": semestre_actual,
+        "total_materias_inscritas": len(materias_inscritas_raw),
+        "materias_inscritas_texto": "\n".join(materias_inscritas_txt) or "Sin materias inscritas actualmente",
+    }
+
+
+def _formatear_reinscripcion(reinsc) -> Dict[str, Any]:
+    caduca_val = reinsc.get("inscripcion_caduca")
+    caduca_str = caduca_val.strftime("%Y-%m-%d %H:%M:%S") if isinstance(caduca_val, (datetime.datetime, datetime.date)) else "N/A"
+    return {
+        "reinscripcion_activa": bool(reinsc.get("reinscripcion_activa", 0)),
+        "inscripcion_caduca": caduca_str,
+    }
+
+
+FORMATEADORES_ALUMNO = {
+    "identidad": _formatear_identidad_alumno,
+    "kardex": _formatear_kardex_alumno,
+    "aprobadas": _formatear_aprobadas,
+    "reprobadas": _formatear_reprobadas,
+    "inscritas": _formatear_inscritas,
+    "reinscripcion": _formatear_reinscripcion,
+}
+
+
+def _secciones_alumno(*resultados) -> Dict[str, Dict[str, Any]]:
+    """Formatea los seis result sets del alumno, sección por sección."""
+    return {seccion: FORMATEADORES_ALUMNO[seccion](raw) for seccion, raw in zip(SECCIONES_ALUMNO, resultados)}
+
+
+def unir_secciones(secciones: Dict[str, Dict[str, Any]], fechas_semestre: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Junta las secciones en el diccionario plano que usan los builders y el prompt."""
+    datos = {}
+    for campos in secciones.values():
+        datos.update(campos)
+    if fechas_semestre is not None:
+        datos["fechas_semestre"] = fechas_semestre
+    return datos
+
+
+def _formatear_datos_usuario(info, kardex_resumen, materias_aprobadas_raw, materias_reprobadas_raw,
+                             materias_inscritas_raw, reinsc, fechas_semestre) -> Dict[str, Any]:
+    """Construye el diccionario completo del alumno a partir de los result sets."""
+    secciones = _secciones_alumno(info, kardex_resumen, materias_aprobadas_raw, materias_reprobadas_raw,
+                                  materias_inscritas_raw, reinsc)
+    return unir_secciones(secciones, fechas_semestre)
+
+
+def secciones_a_cargar(secciones: Iterable[str], disponibles: tuple) -> List[str]:
+    """Secciones pedidas en orden de carga. La identidad va siempre: confirma que el usuario existe."""
+    pedidas = set(secciones)
+    return [s for s in disponibles if s == "identidad" or s in pedidas]
+
+
+CONSULTAS_PROFESOR = {
+    # La calificación promedio sale de datos_personales o de la tabla contador
+    "identidad": [(SQL_PROFESOR_INFO, 1, False, None), (SQL_PROFESOR_CONTADOR, 1, False, {})],
+    "grupos": [(SQL_PROFESOR_GRUPOS, 1, True, [])],
+    "resenas": [(SQL_PROFESOR_COMENTARIOS, 1, True, [])],
+}
+
+
+def _formatear_identidad_profesor(info, stats_contador) -> Dict[str, Any]:
+    # Calificación
+    calificacion_promedio = stats_contador.get("promedio_calculado") if stats_contador.get("registrados", 0) > 0 else info.get("calificacion", 0.0)
+    return {
+        "id_profesor": info["id_profesor"],
+        "nombre": f"{info['nombre']} {info['ape_paterno']} {info['ape_materno']}",
+        "correo": info["email"],
+        "telefono": info.get("telefono", "N/A"),
+        "grado": info.get("grado", "N/A"),
+        "calificacion_promedio": calificacion_promedio,
+        "total_resenas": stats_contador.get("registrados", 0),
+    }
+
+
+def _formatear_grupos_profesor(grupos_raw) -> Dict[str, Any]:
+    grupos_txt = [
+        f"- {g['materia']} (Gpo: {g['grupo']}, Turno: {g['turno']}, Cupo: {g['cupo']})"
+        for g in grupos_raw
+    ]
+    return {"grupos_texto": "\n".join(grupos_txt) or "Sin grupos asignados para este semestre."}
+
+
+def _formatear_resenas_profesor(ultimos_comentarios_raw) -> Dict[str, Any]:
+    comentarios_txt = []
+    for c in ultimos_comentarios_raw:
+        fecha_str = c['fecha'].strftime("%Y-%m-%d") if isinstance(c['fecha'], (datetime.datetime, datetime.date)) else "N/A"
+        comentarios_txt.append(f"- \"{c['comentarios']}\" (Calif: {c['calificacion']}, Fecha: {fecha_str})")
+    return {"ultimos_comentarios": "\n".join(comentarios_txt) or "Sin comentarios recientes."}
+
+
+FORMATEADORES_PROFESOR = {
+    "identidad": _formatear_identidad_profesor,
+    "grupos": _formatear_grupos_profesor,
+    "resenas": _formatear_resenas_profesor,
+}
+
+
+def _formatear_datos_profesor(info, grupos_raw, stats_contador, ultimos_comentarios_raw, fechas_semestre) -> Dict[str, Any]:
+    """Construye el diccionario completo del profesor a partir de los result sets."""
+    secciones = {
+        "identidad": _formatear_identidad_profesor(info, stats_contador),
+        "grupos": _formatear_grupos_profesor(grupos_raw),
+        "resenas": _formatear_resenas_profesor(ultimos_comentarios_raw),
+    }
+    return unir_secciones(secciones, fechas_semestre)
@@ -3,6 +3,8 @@
 2. Genera fragmentos y palabras clave
 3. Limpia ambigüedades léxicas del JSON
 4. Genera embeddings y crea índice FAISS
+5. Genera el índice léxico (lemas) que carga ReglamentoRAG
+6. Exporta el codificador a ONNX (fp32 e int8) y verifica su recall
 """
 
 import os
@@ -17,6 +19,8 @@ import faiss
 import spacy
 from unidecode import unidecode
 import unicodedata
+from utils_rag import generar_indice_lexico, ARCHIVO_INDICE_LEXICO, ruta_metadatos_indice, cargar_metadatos_indice
+from encoders import OnnxEncoder, exportar_onnx, recall_contra_indice, guardar_verificacion, ARCHIVO_ONNX, DIR_ONNX
 
 CARPETA_PDFS = "reglamentos"
 ARCHIVO_JSON_SALIDA = "reglamentos_ipn.json"
@@ -25,6 +29,17 @@ EMBEDDING_MODEL = "all-mpnet-base-v2"
 LONGITUD_MAX_FRAGMENTO = 800
 NUM_KEYWORDS = 8
 
+# Índice FAISS: "flat" (exacto), "hnsw" o "ivfpq" (aproximados, para corpus grandes).
+# Todos usan producto interno sobre vectores normalizados (similitud coseno). Con los
+# ~560 fragmentos del reglamento la búsqueda exacta ya es rápida: los aproximados
+# solo pierden recall, así que el predeterminado es "flat".
+TIPO_INDICE_FAISS = os.getenv("FAISS_INDEX_TYPE", "flat")
+PARAMETROS_INDICE_FAISS = {
+    "hnsw": {"M": 32, "efConstruction": 200, "efSearch": 64},
+    "ivfpq": {"nlist": 256, "m": 48, "nbits": 8, "nprobe": 16},
+    "flat": {},
+}
+
 nlp = spacy.load("es_core_news_sm")
 
 def es_texto_relevante(texto: str) -> bool:
@@ -315,8 +330,35 @@ def paso_2_limpiar_json(datos):
     return datos
 
 
-def paso_3_generar_embeddings(embed_model, datos):
-    """PASO 3: Genera embeddings y crea índice FAISS."""
+def construir_indice_faiss(embeddings: np.ndarray, tipo: str) -> tuple:
+    """Crea el índice FAISS de producto interno del tipo indicado. Devuelve (índice, parámetros)."""
+    n, dimension = embeddings.shape
+    parametros = dict(PARAMETROS_INDICE_FAISS[tipo])
+
+    if tipo == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif tipo == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, parametros["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = parametros["efConstruction"]
+    elif tipo == "ivfpq":
+        # FAISS recomienda ~39 vectores de entrenamiento por lista
+        parametros["nlist"] = max(1, min(parametros["nlist"], n // 39))
+        if dimension % parametros["m"] != 0:
+            raise ValueError(f"m={parametros['m']} debe dividir la dimensión {dimension}")
+        cuantizador = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(cuantizador, dimension, parametros["nlist"], parametros["m"],
+                                 parametros["nbits"], faiss.METRIC_INNER_PRODUCT)
+        print(f"Entrenando IVF-PQ (nlist={parametros['nlist']})...")
+        index.train(embeddings)
+    else:
+        raise ValueError(f"Tipo de índice FAISS no soportado: {tipo}")
+
+    index.add(embeddings)
+    return index, parametros
+
+
+def paso_3_generar_embeddings(embed_model, datos, tipo_indice: str = TIPO_INDICE_FAISS):
+    """PASO 3: Genera embeddings normalizados y crea el índice FAISS con sus metadatos."""
     print("\n" + "="*70)
     print("PASO 3: GENERACIÓN DE EMBEDDINGS E ÍNDICE FAISS")
     print("="*70)
@@ -333,7 +375,10 @@ def paso_3_generar_embeddings(embed_model, datos):
         return
         
     try:
-        embeddings = np.array(embed_model.encode(textos, convert_to_numpy=True, show_progress_bar=True))
+        embeddings = np.array(
+            embed_model.encode(textos, convert_to_numpy=True, show_progress_bar=True, normalize_embeddings=True),
+            dtype=np.float32,
+        )
         
         if embeddings.size == 0:
             print("Error: No se generaron embeddings")
@@ -341,12 +386,23 @@ def paso_3_generar_embeddings(embed_model, datos):
             
         print(f"Dimensión de embeddings: {embeddings.shape}")
         
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings)
+        index, parametros = construir_indice_faiss(embeddings, tipo_indice)
         faiss.write_index(index, ARCHIVO_INDEX_FAISS)
+
+        metadatos = {
+            "tipo": tipo_indice,
+            "metrica": "ip",
+            "normalizado": True,
+            "modelo": EMBEDDING_MODEL,
+            "dimension": int(embeddings.shape[1]),
+            "total": int(index.ntotal),
+            "parametros": parametros,
+        }
+        with open(ruta_metadatos_indice(ARCHIVO_INDEX_FAISS), "w", encoding="utf-8") as f:
+            json.dump(metadatos, f, ensure_ascii=False, indent=2)
         
-        print(f"Índice FAISS guardado en '{ARCHIVO_INDEX_FAISS}'")
+        print(f"Índice FAISS ({tipo_indice}) guardado en '{ARCHIVO_INDEX_FAISS}'")
+        print(f"Parámetros: {parametros}")
         print(f"Total de vectores: {index.ntotal}")
         
     except Exception as e:
@@ -354,6 +410,57 @@ def paso_3_generar_embeddings(embed_model, datos):
         raise
 
 
+def paso_4_generar_indice_lexico():
+    """PASO 4: Serializa el índice léxico del JSON para que el RAG no lematice al arrancar."""
+    print("\n" + "="*70)
+    print("PASO 4: GENERACIÓN DEL ÍNDICE LÉXICO")
+    print("="*70)
+
+    indice = generar_indice_lexico(ARCHIVO_JSON_SALIDA, ARCHIVO_INDICE_LEXICO)
+
+    print(f"Índice léxico guardado en '{ARCHIVO_INDICE_LEXICO}'")
+    print(f"Lemas: {len(indice['vocab'])} | Postings: {len(indice['docs'])} | "
+          f"Fragmentos con ruido: {int(indice['ruido'].sum())}")
+
+
+# Recall@k mínimo de los codificadores ONNX frente al original sobre el índice FAISS
+RECALL_MINIMO_ONNX = float(os.getenv("ONNX_RECALL_MIN", 0.95))
+# El paso 5 necesita onnx, onnxruntime y transformers; solo corre si se pide
+EXPORTAR_ONNX = os.getenv("PIPELINE_ONNX", "0") == "1"
+MUESTRA_RECALL = 200
+
+
+def paso_5_exportar_encoder(embed_model, datos, dir_onnx: str = DIR_ONNX) -> bool:
+    """PASO 5: Exporta el codificador a ONNX/int8 y verifica su recall contra el índice FAISS."""
+    print("\n" + "="*70)
+    print("PASO 5: EXPORTACIÓN ONNX Y VERIFICACIÓN DE RECALL")
+    print("="*70)
+
+    rutas = exportar_onnx(dir_onnx, EMBEDDING_MODEL)
+    print(f"Modelos exportados: {rutas}")
+
+    index = faiss.read_index(ARCHIVO_INDEX_FAISS)
+    normalizar = bool(cargar_metadatos_indice(ARCHIVO_INDEX_FAISS).get("normalizado", False))
+    # Consultas de prueba: el inicio de fragmentos repartidos por todo el corpus
+    paso = max(1, len(datos) // MUESTRA_RECALL)
+    consultas = [item["texto"][:200] for item in datos[::paso] if item["texto"].strip()][:MUESTRA_RECALL]
+
+    resultado = {}
+    for backend, archivo in ARCHIVO_ONNX.items():
+        encoder = OnnxEncoder(dir_onnx, archivo)
+        recall = recall_contra_indice(index, embed_model, encoder, consultas, k=10, normalizar=normalizar)
+        resultado[backend] = {"recall_at_10": round(recall, 4), "aprobado": recall >= RECALL_MINIMO_ONNX}
+        print(f"- {backend}: recall@10 = {recall:.4f} (mínimo {RECALL_MINIMO_ONNX})")
+    resultado["recall_minimo"] = RECALL_MINIMO_ONNX
+    resultado["consultas"] = len(consultas)
+    guardar_verificacion(dir_onnx, resultado)
+
+    aprobado = all(resultado[b]["aprobado"] for b in ARCHIVO_ONNX)
+    if not aprobado:
+        print("ADVERTENCIA: algún backend ONNX quedó por debajo del recall mínimo; usa EMBED_BACKEND=torch.")
+    return aprobado
+
+
 # ============================================================================
 # PIPELINE PRINCIPAL
 # ============================================================================
@@ -362,7 +469,8 @@ def ejecutar_pipeline_completa():
     print(f"\nConfiguración:")
     print(f"- Carpeta de PDFs: {CARPETA_PDFS}")
     print(f"- Archivo JSON: {ARCHIVO_JSON_SALIDA}")
-    print(f"- Archivo índice: {ARCHIVO_INDEX_FAISS}")
+    print(f"- Archivo índice: {ARCHIVO_INDEX_FAISS} ({TIPO_INDICE_FAISS})")
+    print(f"- Archivo índice léxico: {ARCHIVO_INDICE_LEXICO}")
     print(f"- Modelo embedding: {EMBEDDING_MODEL}")
     print(f"- Longitud máx. fragmento: {LONGITUD_MAX_FRAGMENTO}")
     print(f"- Número de keywords: {NUM_KEYWORDS}")
@@ -384,6 +492,13 @@ def ejecutar_pipeline_completa():
     
     # PASO 3: Generar embeddings e índice FAISS
     paso_3_generar_embeddings(embed_model, datos)
+
+    # PASO 4: Generar índice léxico
+    paso_4_generar_indice_lexico()
+
+    # PASO 5 (opcional): Exportar y verificar el codificador ONNX
+    if EXPORTAR_ONNX:
+        paso_5_exportar_encoder(embed_model, datos)
     
 
 def main():
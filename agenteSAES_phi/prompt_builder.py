@@ -0,0 +1,283 @@
+"""
+Armado del prompt de sistema con presupuesto de tokens.
+
+Los datos del usuario se dividen en bloques (resumen, materias inscritas,
+historial de aprobadas, etc.). Cada bloque se puntúa según la pregunta y
+el subtipo, y solo se cargan de la BD los bloques relevantes. Los
+fragmentos del reglamento también compiten por el presupuesto, en el
+orden en que los devolvió el RAG. Se empacan fragmentos completos, nunca
+cortados a la mitad. El conteo de tokens es una estimación por
+caracteres: no depende del tokenizador del proveedor.
+
+El prompt va de lo más estable a lo más variable: primero el prefijo
+estático (reglas, ejemplos, instrucciones), luego el reglamento y al final
+los datos del usuario (la pregunta va en el mensaje de usuario). Así el
+proveedor puede reutilizar el prefijo entre peticiones.
+RegistroPrefijos cuenta cuántas peticiones comparten cada prefijo.
+"""
+
+import hashlib
+import math
+import os
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", 1600))
+# Caracteres por token en español; un valor bajo sobreestima y deja margen
+PROMPT_CHARS_POR_TOKEN = float(os.getenv("PROMPT_CHARS_POR_TOKEN", 3.5))
+
+SEPARADOR_RAG = "\n---\n"
+
+# Relevancia de un bloque del usuario que la pregunta menciona, y de los que
+# se incluyen solo como respaldo cuando la pregunta no menciona ninguno
+RELEVANCIA_MENCIONADO = 1.0
+RELEVANCIA_RESPALDO = 0.3
+# El primer fragmento del RAG vale casi como un bloque mencionado; los siguientes decaen
+RELEVANCIA_RAG = 0.9
+DECAIMIENTO_RAG = 0.8
+
+
+@dataclass(frozen=True)
+class Bloque:
+    """Parte del contexto del usuario: secciones del perfil que lee y palabras que la hacen relevante."""
+    secciones: Tuple[str, ...]
+    palabras: Tuple[str, ...] = ()
+    obligatorio: bool = False
+
+
+# Palabras clave normalizadas (minúsculas, sin acentos). Una palabra suelta
+# coincide como prefijo de una palabra de la pregunta ("reprob" con "reprobe" y
+# "reprobadas"); las de varias palabras se buscan como frase.
+BLOQUES = {
+    "alumno": {
+        "resumen": Bloque(("identidad", "kardex"), obligatorio=True),
+        "reinscripcion": Bloque(("reinscripcion",), (
+            "reinscri", "inscripcion", "inscribir", "baja", "tramite", "limite",
+        )),
+        "inscritas": Bloque(("inscritas",), (
+            "horario", "clase", "materia", "inscrit", "grupo", "profesor", "maestro",
+            "semestre", "turno", "cursando", "curso", "salon",
+        )),
+        "aprobadas": Bloque(("aprobadas",), (
+            "aprob", "apruebo", "acredit", "kardex", "historial", "credito", "titul",
+            "egres", "servicio social", "avance", "llevo",
+        )),
+        "reprobadas": Bloque(("reprobadas",), (
+            "reprob", "repruebo", "recurs", "ets", "extraordinario", "suficiencia", "baja",
+            "desfase", "irregular", "dictamen", "plazo", "situacion", "riesgo",
+        )),
+        "fechas": Bloque(("fechas",), (
+            "fecha", "cuando", "calendario", "periodo", "parcial", "inicio", "termina",
+            "vacaciones",
+        )),
+    },
+    "profesor": {
+        "resumen": Bloque(("identidad",), obligatorio=True),
+        "grupos": Bloque(("grupos",), (
+            "grupo", "materia", "clase", "curso", "imparto", "doy", "cupo", "turno", "horario",
+        )),
+        "resenas": Bloque(("resenas",), (
+            "resena", "comentario", "opinion", "evaluacion", "calificacion",
+        )),
+        "fechas": Bloque(("fechas",), (
+            "fecha", "cuando", "calendario", "periodo", "parcial", "registro", "captura",
+            "evaluacion",
+        )),
+    },
+}
+
+
+@dataclass
+class SeccionContexto:
+    """Texto candidato a entrar al prompt, con su relevancia para la pregunta."""
+    nombre: str
+    texto: str
+    relevancia: float = 0.0
+    obligatoria: bool = False
+    tokens: int = field(init=False)
+
+    def __post_init__(self):
+        self.tokens = estimar_tokens(self.texto)
+
+
+@dataclass
+class PromptArmado:
+    texto: str
+    tokens: int
+    tokens_usuario: int
+    tokens_reglamento: int
+    fragmentos_rag: int
+    fragmentos_rag_total: int
+    omitidas: List[str]
+    # Huellas del prefijo estático y del prefijo hasta el reglamento inclusive
+    hash_estatico: str = ""
+    hash_reglamento: str = ""
+    tokens_prefijo: int = 0
+
+
+def estimar_tokens(texto: str) -> int:
+    return math.ceil(len(texto) / PROMPT_CHARS_POR_TOKEN) if texto else 0
+
+
+def _coincide(palabra: str, palabras_pregunta: List[str], pregunta: str) -> bool:
+    if " " in palabra:
+        return f" {palabra}" in f" {pregunta}"
+    return any(p.startswith(palabra) for p in palabras_pregunta)
+
+
+def relevancia_bloques(tipo_usuario: str, pregunta_normalizada: str,
+                       secciones_subtipo: Iterable[str] = ()) -> Dict[str, float]:
+    """
+    Relevancia de cada bloque del usuario para la pregunta. Los bloques sin
+    relevancia no se cargan. Si la pregunta no menciona ninguno, todos
+    quedan como respaldo y el presupuesto decide cuáles entran.
+    """
+    bloques = BLOQUES.get(tipo_usuario, {})
+    palabras_pregunta = pregunta_normalizada.split()
+    secciones_subtipo = set(secciones_subtipo)
+    relevancias: Dict[str, float] = {}
+    for nombre, bloque in bloques.items():
+        if bloque.obligatorio:
+            continue
+        aciertos = sum(_coincide(p, palabras_pregunta, pregunta_normalizada) for p in bloque.palabras)
+        if secciones_subtipo & set(bloque.secciones):
+            aciertos += 1
+        if aciertos:
+            # Más menciones, más arriba entre los bloques mencionados
+            relevancias[nombre] = RELEVANCIA_MENCIONADO + 0.05 * (aciertos - 1)
+
+    if not relevancias:
+        relevancias = {n: RELEVANCIA_RESPALDO for n, b in bloques.items() if not b.obligatorio}
+    for nombre, bloque in bloques.items():
+        if bloque.obligatorio:
+            relevancias[nombre] = math.inf
+    return relevancias
+
+
+def secciones_de(tipo_usuario: str, relevancias: Dict[str, float]) -> Set[str]:
+    """Secciones del perfil que hay que cargar para los bloques relevantes."""
+    bloques = BLOQUES.get(tipo_usuario, {})
+    return {s for nombre in relevancias if nombre in bloques for s in bloques[nombre].secciones}
+
+
+def secciones_usuario(tipo_usuario: str, textos: Dict[str, str],
+                      relevancias: Dict[str, float]) -> List[SeccionContexto]:
+    """Bloques ya redactados, en el orden de BLOQUES, con su relevancia."""
+    bloques = BLOQUES.get(tipo_usuario, {})
+    return [
+        SeccionContexto(nombre, textos[nombre], relevancias[nombre], bloques[nombre].obligatorio)
+        for nombre in bloques
+        if nombre in relevancias and textos.get(nombre)
+    ]
+
+
+def fragmentos_rag(contexto_rag: str) -> List[SeccionContexto]:
+    """Fragmentos del reglamento en orden de recuperación; el primero siempre entra."""
+    fragmentos = [f for f in contexto_rag.split(SEPARADOR_RAG) if f.strip()] if contexto_rag else []
+    return [
+        SeccionContexto(f"rag_{i}", texto, RELEVANCIA_RAG * DECAIMIENTO_RAG ** i, obligatoria=(i == 0))
+        for i, texto in enumerate(fragmentos)
+    ]
+
+
+def empacar(candidatas: List[SeccionContexto], presupuesto: int) -> Tuple[Set[str], List[str]]:
+    """
+    Elige secciones completas de mayor a menor relevancia mientras quepan en
+    el presupuesto; una que no cabe no impide que entre otra más chica.
+    Las obligatorias entran siempre. Devuelve (incluidas, omitidas).
+    """
+    incluidas: Set[str] = set()
+    omitidas: List[str] = []
+    usados = sum(s.tokens for s in candidatas if s.obligatoria)
+    incluidas.update(s.nombre for s in candidatas if s.obligatoria)
+    for seccion in sorted((s for s in candidatas if not s.obligatoria), key=lambda s: -s.relevancia):
+        if usados + seccion.tokens <= presupuesto:
+            incluidas.add(seccion.nombre)
+            usados += seccion.tokens
+        else:
+            omitidas.append(seccion.nombre)
+    return incluidas, omitidas
+
+
+def huella(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def armar_prompt(estatico: str, plantilla_reglamento: str, plantilla_usuario: str, pregunta: str,
+                 usuario: List[SeccionContexto], contexto_rag: str,
+                 max_tokens: Optional[int] = None, **campos) -> PromptArmado:
+    """
+    Une el prefijo `estatico`, `plantilla_reglamento` ({contexto_rag}) y
+    `plantilla_usuario` ({contexto_academico} y `campos`), con las secciones
+    que caben en `max_tokens` contando las plantillas y la pregunta.
+    Dentro del prompt cada parte conserva su orden original.
+    """
+    max_tokens = PROMPT_MAX_TOKENS if max_tokens is None else max_tokens
+    reglamento = fragmentos_rag(contexto_rag)
+    base = estimar_tokens(
+        estatico + plantilla_reglamento.format(contexto_rag="")
+        + plantilla_usuario.format(contexto_academico="", **campos)
+    )
+    presupuesto = max_tokens - base - estimar_tokens(pregunta)
+    incluidas, omitidas = empacar(usuario + reglamento, presupuesto)
+
+    usuario_incluido = [s for s in usuario if s.nombre in incluidas]
+    reglamento_incluido = [s for s in reglamento if s.nombre in incluidas]
+    prefijo = estatico + plantilla_reglamento.format(
+        contexto_rag=SEPARADOR_RAG.join(s.texto for s in reglamento_incluido)
+    )
+    texto = prefijo + plantilla_usuario.format(
+        contexto_academico="\n".join(s.texto for s in usuario_incluido), **campos
+    )
+    return PromptArmado(
+        texto=texto,
+        tokens=estimar_tokens(texto),
+        tokens_usuario=sum(s.tokens for s in usuario_incluido),
+        tokens_reglamento=sum(s.tokens for s in reglamento_incluido),
+        fragmentos_rag=len(reglamento_incluido),
+        fragmentos_rag_total=len(reglamento),
+        omitidas=omitidas,
+        hash_estatico=huella(estatico),
+        hash_reglamento=huella(prefijo),
+        tokens_prefijo=estimar_tokens(prefijo),
+    )
+
+
+class RegistroPrefijos:
+    """
+    Cuenta las peticiones por huella de prefijo en cada nivel ("estatico",
+    "reglamento"). Guarda a lo más `max_huellas` huellas por nivel; las
+    menos recientes se olvidan.
+    """
+
+    def __init__(self, max_huellas: int = 1000):
+        self.max_huellas = max_huellas
+        self._huellas: Dict[str, "OrderedDict[str, int]"] = {}
+        self._peticiones = Counter()
+        self._repetidas = Counter()
+
+    def registrar(self, nivel: str, huella_prefijo: str) -> bool:
+        """Anota una petición; devuelve True si el prefijo ya se había visto."""
+        huellas = self._huellas.setdefault(nivel, OrderedDict())
+        repetida = huella_prefijo in huellas
+        huellas[huella_prefijo] = huellas.get(huella_prefijo, 0) + 1
+        huellas.move_to_end(huella_prefijo)
+        if len(huellas) > self.max_huellas:
+            huellas.popitem(last=False)
+        self._peticiones[nivel] += 1
+        self._repetidas[nivel] += repetida
+        return repetida
+
+    def stats(self, top: int = 5) -> Dict[str, Dict]:
+        resultado = {}
+        for nivel, huellas in self._huellas.items():
+            peticiones = self._peticiones[nivel]
+            resultado[nivel] = {
+                "peticiones": peticiones,
+                "prefijo_repetido": self._repetidas[nivel],
+                "tasa_compartida": round(self._repetidas[nivel] / peticiones, 4) if peticiones else 0.0,
+                "prefijos_distintos": len(huellas),
+                "mas_frecuentes": Counter(huellas).most_common(top),
+            }
+        return resultado
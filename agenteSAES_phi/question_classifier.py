@@ -1,6 +1,17 @@
+import logging
+import os
 import re
 import unicodedata
-from typing import Dict, Tuple, Optional, Callable
+import zipfile
+from typing import Dict, FrozenSet, List, Tuple, Optional, Callable
+
+from pattern_matcher import PatternMatcher
+
+# Motor de clasificación: "regex" (patrones) o "ml" (n-gramas, ver ml_classifier.py).
+# Con "ml", las predicciones por debajo de CLASSIFIER_MIN_CONFIDENCE usan los patrones.
+CLASSIFIER_ENGINE = os.getenv("CLASSIFIER_ENGINE", "regex").lower()
+CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", os.path.join("models", "clasificador_ngramas.npz"))
+CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", 0.5))
 
 DEFINICIONES = {
     "Academia": "Órgano constituido por profesores que tiene la finalidad de proponer, analizar, opinar, estructurar y evaluar el proceso educativo.",
@@ -66,7 +77,19 @@ def normalize_for_regex(text: str) -> str:
     text = text.replace(" ", r"\s+")
     return text
 
+# Términos de DEFINICIONES ya normalizados: (original, normalizado, palabras de más de una letra)
+TERMINOS_DEFINICION = []
+for _termino in DEFINICIONES:
+    if len(_termino) > 50:  # Ignorar claves muy largas (como el header)
+        continue
+    _termino_norm = "".join(c for c in unicodedata.normalize("NFD", _termino.lower())
+                            if unicodedata.category(c) != "Mn")
+    TERMINOS_DEFINICION.append((_termino, _termino_norm, [p for p in _termino_norm.split() if len(p) > 1]))
+
 _ANSWER_BUILDERS: Dict[str, Callable[[Dict], str]] = {}
+# Secciones del perfil que lee cada builder (ver db_utils.SECCIONES_ALUMNO/PROFESOR).
+# "fechas" es el calendario compartido del semestre.
+_SECCIONES_BUILDERS: Dict[str, FrozenSet[str]] = {}
 
 class QuestionClassifier:
     """Clasifica preguntas en directas (BD) o complejas (LLM)."""
@@ -212,6 +235,25 @@ class QuestionClassifier:
         r"como.*inscribo.*materias", r"reglas.*del.*ipn", r"cuantos.*extraordinarios.*puedo", 
     ]
 
+    # Marcas de primera persona: la respuesta depende de los datos del usuario
+    USER_DEPENDENT_PATTERNS_RAW = [
+        r"\bmis?\b", r"\bme\b", r"\byo\b", r"\bmio\b", r"\bconmigo\b",
+        r"\btengo\b", r"\bllevo\b", r"\bdebo\b", r"\bestoy\b", r"\bsoy\b",
+        r"\bpuedo\b", r"\bnecesito\b", r"\bquiero\b", r"\bvoy\b", r"\breprobe\b",
+        r"\bpase\b", r"\bboleta\b", r"\bkardex\b", r"\bnos\b", r"\bhe\b",
+        r"\badeudo\b", r"\brepruebo\b", r"\btermino\b", r"\bcumplo\b", r"\bcurso\b",
+        r"\bpresento\b", r"\binscribo\b", r"\bdoy\b", r"\b\w+[aei]rme\b",
+    ]
+
+    # Preguntas sobre el reglamento o la política general, sin datos del usuario.
+    # Solo estas se tratan como independientes del usuario; todo lo demás, sí depende.
+    GENERAL_PATTERNS_RAW = [
+        r"\breglamento\b", r"\barticulos?\b", r"\bnormatividad\b", r"\breglas\b",
+        r"\bse\s+(puede|pueden|permite|permiten|necesita|necesitan|requiere|requieren)\b",
+        r"\b(un|el|los|las|una)\s+alumn[oa]s?\b", r"\ben\s+general\b", r"\brequisitos?\b",
+        r"\bque\s+(es|son)\b", r"\bdefinicion\b", r"\bsignifica(do)?\b",
+    ]
+
     for term in DEFINICIONES.keys():
         if len(term) > 50: continue # Ignorar claves muy largas (como el header)
         term_norm = normalize_for_regex(term)
@@ -227,6 +269,25 @@ class QuestionClassifier:
 
     DIRECT_PATTERNS = compile_patterns(DIRECT_PATTERNS_RAW)
     COMPLEX_PATTERNS = compile_list(COMPLEX_PATTERNS_RAW)
+    USER_DEPENDENT_PATTERNS = compile_list(USER_DEPENDENT_PATTERNS_RAW)
+    GENERAL_PATTERNS = compile_list(GENERAL_PATTERNS_RAW)
+
+    # Todos los patrones directos en un solo autómata; la prioridad es el orden del diccionario
+    DIRECT_MATCHER = PatternMatcher(
+        (subtipo, patron) for subtipo, patrones in DIRECT_PATTERNS_RAW.items() for patron in patrones
+    )
+
+    motor = CLASSIFIER_ENGINE
+    ruta_modelo = CLASSIFIER_MODEL_PATH
+    umbral_confianza = CLASSIFIER_MIN_CONFIDENCE
+    _modelo = None
+    _modelo_no_disponible = False
+
+    INDICADORES_DEFINICION = ('que es', 'que son', 'definicion', 'significa', 'significado',
+                              'cual es', 'cuales son', 'explica')
+    PALABRAS_IGNORAR_DEFINICION = {'que', 'es', 'la', 'el', 'un', 'una', 'son', 'los', 'las',
+                                   'definicion', 'de', 'significa', 'significado', 'cual', 'cuales',
+                                   'me', 'puedes', 'explicar'}
 
     @staticmethod
     def normalize_text(text: str) -> str:
@@ -241,8 +302,7 @@ class QuestionClassifier:
         """Busca una definición que coincida con la pregunta usando similitud de texto."""
         q_norm = QuestionClassifier.normalize_text(question)
         
-        palabras_ignorar = {'que', 'es', 'la', 'el', 'un', 'una', 'son', 'los', 'las',
-                           'definicion', 'de', 'significa', 'significado', 'cual', 'cuales', 'me', 'puedes', 'explicar'}
+        palabras_ignorar = QuestionClassifier.PALABRAS_IGNORAR_DEFINICION
         palabras_pregunta = [p for p in q_norm.split() if p not in palabras_ignorar and len(p) > 1]
         
         q_limpia = ' '.join(palabras_pregunta)
@@ -253,22 +313,16 @@ class QuestionClassifier:
         mejor_coincidencia = None
         mejor_score = 0
         
-        for term_original in DEFINICIONES.keys():
-            if len(term_original) > 50: 
-                continue
-                
-            term_norm = QuestionClassifier.normalize_text(term_original)
-            
+        for term_original, term_norm, palabras_term in TERMINOS_DEFINICION:
             score = 0
             
             if term_norm in q_norm:
                 score = 100
             elif term_norm in q_limpia:
                 score = 95
-            elif all(palabra in q_norm for palabra in term_norm.split() if len(palabra) > 1):
+            elif all(palabra in q_norm for palabra in palabras_term):
                 score = 85
             else:
-                palabras_term = [p for p in term_norm.split() if len(p) > 1]
                 if palabras_term:
                     coincidencias = sum(1 for p in palabras_term if p in palabras_pregunta or p in q_norm)
                     porcentaje = coincidencias / len(palabras_term)
@@ -283,28 +337,105 @@ class QuestionClassifier:
             return f"definicion_{mejor_coincidencia}"
         return None
 
+    @staticmethod
+    def configurar_motor(motor: str, ruta_modelo: Optional[str] = None, umbral: Optional[float] = None):
+        """Cambia el motor de clasificación; el modelo se carga en la siguiente clasificación."""
+        QuestionClassifier.motor = motor.lower()
+        if ruta_modelo is not None:
+            QuestionClassifier.ruta_modelo = ruta_modelo
+        if umbral is not None:
+            QuestionClassifier.umbral_confianza = umbral
+        QuestionClassifier._modelo = None
+        QuestionClassifier._modelo_no_disponible = False
+
+    @staticmethod
+    def _modelo_ml():
+        """Modelo de n-gramas cargado una sola vez; None si no está disponible."""
+        if QuestionClassifier._modelo is None and not QuestionClassifier._modelo_no_disponible:
+            try:
+                from ml_classifier import NgramClassifier
+                QuestionClassifier._modelo = NgramClassifier.cargar(QuestionClassifier.ruta_modelo)
+            except (ImportError, OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile) as e:
+                # Un modelo ausente, corrupto o de otra versión no debe tumbar las peticiones
+                logging.warning(f"Clasificador ML no disponible ({e}); se usan los patrones regex.")
+                QuestionClassifier._modelo_no_disponible = True
+        return QuestionClassifier._modelo
+
+    @staticmethod
+    def _definicion(question: str, q: str) -> Optional[str]:
+        if any(ind in q for ind in QuestionClassifier.INDICADORES_DEFINICION):
+            return QuestionClassifier._buscar_definicion_similar(question)
+        return None
+
+    @staticmethod
+    def _desde_prediccion(etiqueta: str, confianza: float) -> Optional[Tuple[str, Optional[str]]]:
+        if confianza < QuestionClassifier.umbral_confianza:
+            return None
+        return ("complex", None) if etiqueta == "complex" else ("direct", etiqueta)
+
     @staticmethod
     def classify(question: str) -> Tuple[str, Optional[str]]:
         """Clasifica la pregunta como ('direct', subtipo) o ('complex', None)."""
 
         q = QuestionClassifier.normalize_text(question)
 
-        indicadores_definicion = ['que es', 'que son', 'definicion', 'significa', 'significado', 
-                                 'cual es', 'cuales son', 'explica']
-        if any(ind in q for ind in indicadores_definicion):
-            definicion_match = QuestionClassifier._buscar_definicion_similar(question)
+        definicion_match = QuestionClassifier._definicion(question, q)
+        if definicion_match:
+            return ("direct", definicion_match)
+
+        if QuestionClassifier.motor == "ml" and QuestionClassifier._modelo_ml() is not None:
+            from ml_classifier import limpiar
+            resultado = QuestionClassifier._desde_prediccion(*QuestionClassifier._modelo.predecir([limpiar(q)])[0])
+            if resultado is not None:
+                return resultado
+
+        return QuestionClassifier._classify_regex(q)
+
+    @staticmethod
+    def classify_batch(questions: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """Clasifica varias preguntas; con el motor ML, el modelo las evalúa en un solo lote."""
+        if QuestionClassifier.motor != "ml" or QuestionClassifier._modelo_ml() is None:
+            return [QuestionClassifier.classify(question) for question in questions]
+
+        from ml_classifier import limpiar
+        normalizadas = [QuestionClassifier.normalize_text(question) for question in questions]
+        resultados: List[Optional[Tuple[str, Optional[str]]]] = [None] * len(questions)
+        pendientes = []
+        for i, (question, q) in enumerate(zip(questions, normalizadas)):
+            definicion_match = QuestionClassifier._definicion(question, q)
             if definicion_match:
-                return ("direct", definicion_match)
+                resultados[i] = ("direct", definicion_match)
+            else:
+                pendientes.append(i)
 
-        for subtipo, patterns in QuestionClassifier.DIRECT_PATTERNS.items():
-            if any(p.search(q) for p in patterns):
-                return ("direct", subtipo)
-        for pattern in QuestionClassifier.COMPLEX_PATTERNS:
-            if pattern.search(q):
-                return ("complex", None)
+        predicciones = QuestionClassifier._modelo.predecir([limpiar(normalizadas[i]) for i in pendientes])
+        for i, prediccion in zip(pendientes, predicciones):
+            resultados[i] = (QuestionClassifier._desde_prediccion(*prediccion)
+                             or QuestionClassifier._classify_regex(normalizadas[i]))
+        return resultados
 
+    @staticmethod
+    def _classify_regex(q: str) -> Tuple[str, Optional[str]]:
+        """Motor de patrones sobre el texto ya normalizado."""
+        subtipo = QuestionClassifier.DIRECT_MATCHER.first_match(q)
+        if subtipo is not None:
+            return ("direct", subtipo)
+
+        # COMPLEX_PATTERNS no cambia el resultado: sin patrón directo la pregunta va al LLM
         return ("complex", None)
 
+    @staticmethod
+    def depends_on_user(question: str) -> bool:
+        """
+        Indica si la respuesta necesita los datos académicos del usuario. Ante
+        la duda, sí: solo es independiente si coincide con un patrón de
+        reglamento o política general y no tiene marcas de primera persona.
+        """
+        q = QuestionClassifier.normalize_text(question)
+        if any(p.search(q) for p in QuestionClassifier.USER_DEPENDENT_PATTERNS):
+            return True
+        return not any(p.search(q) for p in QuestionClassifier.GENERAL_PATTERNS)
+
 
 class DirectAnswerBuilder:
 
@@ -318,21 +449,27 @@ class DirectAnswerBuilder:
         except Exception as e:
             return f"Ha ocurrido un error procesando la información: {str(e)}"
 
+    @classmethod
+    def secciones(cls, subtipo: str) -> FrozenSet[str]:
+        """Secciones del perfil que hay que cargar para responder este subtipo."""
+        return _SECCIONES_BUILDERS.get(subtipo, frozenset())
+
     @staticmethod
-    def register(name: str):
+    def register(name: str, secciones: Tuple[str, ...] = ()):
         def decorator(func):
             _ANSWER_BUILDERS[name] = func
+            _SECCIONES_BUILDERS[name] = frozenset(secciones)
             return func
         return decorator
 
-    @register("horario")
+    @register("horario", secciones=("inscritas",))
     def _horario(datos):
         materias = datos.get("materias_inscritas_texto", "")
         if not materias:
             return "No cuentas con materias inscritas este período."
         return f"Tu horario de clases es el siguiente:\n{materias}"
 
-    @register("materias_inscritas")
+    @register("materias_inscritas", secciones=("inscritas",))
     def _materias_inscritas(datos):
         total = datos.get("total_materias_inscritas", 0)
         mat = datos.get("materias_inscritas_texto", "")
@@ -341,19 +478,19 @@ class DirectAnswerBuilder:
         return f"Estás inscrito en {total} materias:\n{mat}"
 
 
-    @register("promedio")
+    @register("promedio", secciones=("identidad",))
     def _promedio(datos):
         prom = datos.get("promedio")
         if prom is None:
             return "No se tiene registrado un promedio en tu expediente."
         return f"Tu promedio general actual es: {prom}"
 
-    @register("creditos")
+    @register("creditos", secciones=("identidad",))
     def _creditos(datos):
         disp = datos.get("creditos_disponibles", 0)
         return f"Créditos disponibles: {disp}"
 
-    @register("estado")
+    @register("estado", secciones=("identidad", "kardex"))
     def _estado(datos):
         e = datos.get("estado_academico", "No disponible")
         k = datos.get("situacion_kardex", "")
@@ -361,7 +498,7 @@ class DirectAnswerBuilder:
             return f"Tu estado académico es: {e}\nSituación en kardex: {k}"
         return f"Tu estado académico es: {e}"
 
-    @register("materias_aprobadas")
+    @register("materias_aprobadas", secciones=("aprobadas",))
     def _aprobadas(datos):
         total = datos.get("total_materias_aprobadas", 0)
         if total == 0:
@@ -370,18 +507,18 @@ class DirectAnswerBuilder:
         return f"Has aprobado {total} materias:\n{mats}"
 
 
-    @register("carrera")
+    @register("carrera", secciones=("identidad",))
     def _carrera(datos):
         return f"Tu carrera es: {datos.get('carrera', 'No disponible')}"
 
-    @register("semestre")
+    @register("semestre", secciones=("inscritas",))
     def _semestre(datos):
         sem = datos.get("semestre_actual")
         if sem is None:
             return "No hay registro de tu semestre actual."
         return f"Actualmente cursas el semestre {sem}."
 
-    @register("datos_personales")
+    @register("datos_personales", secciones=("identidad",))
     def _datos(datos):
         return (
             "Datos personales registrados:\n"
@@ -392,7 +529,7 @@ class DirectAnswerBuilder:
             f"- Dirección: {datos.get('direccion_completa','No disponible')}"
         )
 
-    @register("inscripcion_info")
+    @register("inscripcion_info", secciones=("reinscripcion",))
     def _inscripcion(datos):
         activa = datos.get("reinscripcion_activa", False)
         fecha = datos.get("inscripcion_caduca", "No disponible")
@@ -400,14 +537,14 @@ class DirectAnswerBuilder:
             return f"La reinscripción está activa. Fecha límite: {fecha}"
         return f"La reinscripción no está activa. Última fecha registrada: {fecha}"
 
-    @register("creditos_detalle")
+    @register("creditos_detalle", secciones=("identidad",))
     def _detalle(datos):
         return (
             "Información de créditos:\n"
             f"- Disponibles: {datos.get('creditos_disponibles',0)}"
         )
 
-    @register("programa_info")
+    @register("programa_info", secciones=("identidad", "kardex"))
     def _programa(datos):
         return (
             "Información académica del programa:\n"
@@ -415,7 +552,7 @@ class DirectAnswerBuilder:
             f"- Semestres restantes: {datos.get('semestres_restantes','N/A')}"
         )
 
-    @register("conteo_materias")
+    @register("conteo_materias", secciones=("inscritas", "aprobadas"))
     def _conteo(datos):
         return (
             "Resumen de materias:\n"
@@ -423,7 +560,7 @@ class DirectAnswerBuilder:
             f"- Aprobadas: {datos.get('total_materias_aprobadas',0)}"
         )
 
-    @register("kardex_info")
+    @register("kardex_info", secciones=("identidad", "kardex", "aprobadas"))
     def _kardex(datos):
         return (
             "Información del kardex:\n"
@@ -437,7 +574,7 @@ class DirectAnswerBuilder:
         # Note: turno_principal doesn't exist in db_utils, would need to extract from materias_inscritas_raw
         return "La información de turno no está disponible actualmente."
 
-    @register("profesores_info")
+    @register("profesores_info", secciones=("inscritas",))
     def _profesores(datos):
         # Note: profesores list doesn't exist in db_utils, info is in materias_inscritas_texto
         mat_texto = datos.get("materias_inscritas_texto", "")
@@ -445,7 +582,7 @@ class DirectAnswerBuilder:
             return "No tienes profesores registrados actualmente."
         return f"Información de profesores incluida en tu horario:\n{mat_texto}"
 
-    @register("fechas_semestre")
+    @register("fechas_semestre", secciones=("fechas",))
     def _fechas_semestre(datos):
         f = datos.get("fechas_semestre", {})
         return (
@@ -455,7 +592,7 @@ class DirectAnswerBuilder:
             f"- Período: {f.get('periodo','N/A')}"
         )
 
-    @register("fechas_parciales")
+    @register("fechas_parciales", secciones=("fechas",))
     def _fechas_parciales(datos):
         f = datos.get("fechas_semestre", {})
         return (
@@ -465,7 +602,7 @@ class DirectAnswerBuilder:
             f"- Tercer parcial: {f.get('registro_tercer_parcial','N/A')} - {f.get('fin_registro_tercer_parcial','N/A')}"
         )
 
-    @register("fechas_ets")
+    @register("fechas_ets", secciones=("fechas",))
     def _fechas_ets(datos):
         f = datos.get("fechas_semestre", {})
         return (
@@ -476,28 +613,28 @@ class DirectAnswerBuilder:
             f"- Calificación ETS: {f.get('cal_ets','N/A')}"
         )
 
-    @register("profesor_grupos")
+    @register("profesor_grupos", secciones=("grupos",))
     def _prof_grupos(datos):
         g = datos.get("grupos_texto", "")
         if not g:
             return "No tienes grupos asignados para este semestre."
         return f"Grupos asignados:\n{g}"
 
-    @register("profesor_calificacion")
+    @register("profesor_calificacion", secciones=("identidad",))
     def _prof_calif(datos):
         return (
             f"Tu calificación promedio es {datos.get('calificacion_promedio',0):.1f}, "
             f"con un total de {datos.get('total_resenas',0)} reseñas registradas."
         )
 
-    @register("profesor_resenas")
+    @register("profesor_resenas", secciones=("resenas",))
     def _prof_resenas(datos):
         c = datos.get("ultimos_comentarios", "")
         if not c:
             return "No se han registrado comentarios recientes."
         return f"Últimos comentarios recibidos:\n{c}"
 
-    @register("profesor_fechas")
+    @register("profesor_fechas", secciones=("fechas",))
     def _prof_fechas(datos):
         f = datos.get("fechas_semestre", {})
         return (
@@ -0,0 +1,33 @@
+"""
+Búsqueda del RAG en procesos aparte (RAG_EXECUTOR=process).
+
+Cada proceso del pool carga su propia copia de ReglamentoRAG en el
+inicializador, así la lematización, el encode y la búsqueda FAISS no
+compiten por el GIL con el event loop del servidor.
+"""
+
+import time
+from typing import Dict, Tuple
+
+from utils_rag import ReglamentoRAG
+
+_rag = None
+
+
+def inicializar(opciones: dict):
+    """Carga y calienta el RAG del proceso. Se ejecuta una vez por proceso del pool."""
+    global _rag
+    _rag = ReglamentoRAG(**opciones)
+    _rag.buscar_contexto("requisitos de reinscripción")
+
+
+def buscar(consulta: str, top_merge: int) -> Tuple[str, Dict[str, float]]:
+    """Devuelve el contexto recuperado y los tiempos de cada parte de la búsqueda."""
+    tiempos = {}
+    contexto = _rag.buscar_contexto(consulta, top_merge=top_merge, max_chars=None, tiempos=tiempos)
+    return contexto, tiempos
+
+
+def listo() -> float:
+    """Tarea vacía para esperar a que el inicializador del proceso termine."""
+    return time.time()
@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+from question_classifier import QuestionClassifier
+
+
+def admite_pregunta(pregunta: str) -> bool:
+    """
+    Solo se comparten entre usuarios las respuestas a preguntas que coinciden
+    con un patrón de reglamento o política general; una respuesta con datos
+    del usuario nunca se guarda ni se busca.
+    """
+    return not QuestionClassifier.depends_on_user(pregunta)
+
+
+class SemanticCache:
+    """
+    Caché semántica de respuestas del LLM para preguntas que no dependen del usuario.
+    Guarda el embedding de cada pregunta en un índice FAISS de producto interno
+    (coseno, con vectores normalizados) y reutiliza la respuesta de una pregunta
+    casi idéntica del mismo tipo de usuario.
+    """
+
+    def __init__(self, embedder, umbral: float = 0.92, max_entradas: int = 2000, ttl: float = 3600):
+        self.embedder = embedder
+        self.umbral = umbral
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        dim = embedder.get_sentence_embedding_dimension()
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        # id -> (tipo_usuario, respuesta, expira); en orden de inserción para desalojar la más vieja
+        self._entradas: "OrderedDict[int, tuple]" = OrderedDict()
+        self._siguiente_id = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _embed(self, pregunta: str) -> np.ndarray:
+        emb = self.embedder.encode([pregunta], convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(emb, dtype="float32")
+
+    def _quitar(self, ids: list):
+        if not ids:
+            return
+        for i in ids:
+            self._entradas.pop(i, None)
+        self.index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def _purgar_expiradas(self, ahora: float):
+        self._quitar([i for i, (_, _, expira) in self._entradas.items() if expira <= ahora])
+
+    def _vecina(self, emb: np.ndarray, tipo_usuario: str) -> Optional[str]:
+        """Respuesta vigente más parecida por encima del umbral (requiere el lock)."""
+        if self.index.ntotal == 0:
+            return None
+        ahora = time.time()
+        similitudes, ids = self.index.search(emb, min(5, self.index.ntotal))
+        for similitud, i in zip(similitudes[0], ids[0]):
+            if similitud < self.umbral:
+                break
+            entrada = self._entradas.get(int(i))
+            if entrada and entrada[0] == tipo_usuario and entrada[2] > ahora:
+                return entrada[1]
+        return None
+
+    def buscar(self, pregunta: str, tipo_usuario: str) -> Optional[str]:
+        """Devuelve la respuesta de una pregunta casi idéntica, o None."""
+        tipo_usuario = tipo_usuario.lower()
+        emb = self._embed(pregunta)
+        with self._lock:
+            respuesta = self._vecina(emb, tipo_usuario)
+            if respuesta is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return respuesta
+
+    def guardar(self, pregunta: str, tipo_usuario: str, respuesta: str):
+        tipo_usuario = tipo_usuario.lower()
+        emb = self._embed(pregunta)
+        with self._lock:
+            # Las peticiones agrupadas en una sola llamada guardan la misma pregunta
+            if self._vecina(emb, tipo_usuario) is not None:
+                return
+            ahora = time.time()
+            self._purgar_expiradas(ahora)
+            while len(self._entradas) >= self.max_entradas:
+                self._quitar([next(iter(self._entradas))])
+                self.evictions += 1
+
+            nuevo_id = self._siguiente_id
+            self._siguiente_id += 1
+            self.index.add_with_ids(emb, np.asarray([nuevo_id], dtype="int64"))
+            self._entradas[nuevo_id] = (tipo_usuario, respuesta, ahora + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self.index.reset()
+            self._entradas.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "umbral": self.umbral,
+            }
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    from ml_classifier import NgramClassifier
+except ImportError:  # numpy no instalado
+    np = None
+
+from question_classifier import QuestionClassifier
+
+
+@unittest.skipIf(np is None, "requiere numpy")
+class ModeloMlNoDisponibleTest(unittest.TestCase):
+    """Con un modelo ausente o dañado, el clasificador cae a los patrones regex."""
+
+    PREGUNTA = "¿Qué dice el reglamento sobre la baja temporal?"
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "modelo.npz")
+        self.anterior = (QuestionClassifier.motor, QuestionClassifier.ruta_modelo, QuestionClassifier.umbral_confianza)
+        QuestionClassifier.configurar_motor("regex")
+        self.esperado = QuestionClassifier.classify(self.PREGUNTA)
+
+    def tearDown(self):
+        QuestionClassifier.configurar_motor(*self.anterior)
+        self.directorio.cleanup()
+
+    def _clasificar_con_modelo(self):
+        QuestionClassifier.configurar_motor("ml", self.ruta)
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(QuestionClassifier.classify(self.PREGUNTA), self.esperado)
+        self.assertTrue(QuestionClassifier._modelo_no_disponible)
+        # Las siguientes clasificaciones no reintentan la carga
+        self.assertEqual(QuestionClassifier.classify_batch([self.PREGUNTA]), [self.esperado])
+
+    def test_sin_archivo(self):
+        self._clasificar_con_modelo()
+
+    def test_zip_danado(self):
+        with open(self.ruta, "wb") as f:
+            f.write(b"PK\x03\x04 esto no es un npz")
+        self._clasificar_con_modelo()
+
+    def test_falta_una_clave(self):
+        np.savez(self.ruta, vocabulario=np.array(["ab"]), idf=np.ones(1))
+        self._clasificar_con_modelo()
+
+    def test_forma_incorrecta(self):
+        np.savez(self.ruta, vocabulario=np.array(["ab", "bc"]), idf=np.ones(2), pesos=np.ones((3, 2)),
+                 sesgo=np.zeros(2), clases=np.array(["complex", "horario"]))
+        self._clasificar_con_modelo()
+
+    def test_modelo_valido_se_usa(self):
+        NgramClassifier(["ab", "bc"], np.ones(2), np.ones((2, 2)), np.zeros(2), ["complex", "horario"]).guardar(self.ruta)
+        QuestionClassifier.configurar_motor("ml", self.ruta)
+        QuestionClassifier.classify(self.PREGUNTA)
+        self.assertFalse(QuestionClassifier._modelo_no_disponible)
+        self.assertIsNotNone(QuestionClassifier._modelo)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    import indice_lexico
+except ImportError:  # numpy no instalado
+    indice_lexico = None
+
+
+def _indice_de_prueba():
+    return {
+        "vocab": np.array(["baja", "credito", "ets"], dtype=str),
+        "indptr": np.array([0, 1, 3, 4], dtype=np.int64),
+        "docs": np.array([0, 1, 2, 2], dtype=np.int32),
+        "tf": np.array([1, 2, 1, 3], dtype=np.int32),
+        "longitudes": np.array([4, 7, 0], dtype=np.int32),
+        "ruido": np.array([False, False, True]),
+        "textos_norm": np.array(["articulo 49 baja temporal", "", "evaluacion a titulo de suficiencia (ets) ñ"],
+                                dtype=object),
+    }
+
+
+@unittest.skipIf(indice_lexico is None, "requiere numpy")
+class IndiceLexicoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, indice_lexico.ARCHIVO_INDICE_LEXICO)
+        self.hash = indice_lexico.hash_contenido(b'[{"texto": "..."}]')
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def test_ida_y_vuelta(self):
+        original = _indice_de_prueba()
+        indice_lexico.guardar_indice_lexico(self.ruta, self.hash, original)
+        cargado = indice_lexico.cargar_indice_lexico(self.ruta, self.hash)
+        self.assertIsNotNone(cargado)
+        self.assertEqual(set(cargado), set(indice_lexico.CLAVES_INDICE))
+        for clave in ("vocab", "indptr", "docs", "tf", "longitudes", "ruido"):
+            np.testing.assert_array_equal(cargado[clave], original[clave])
+        self.assertEqual(cargado["textos_norm"].tolist(), original["textos_norm"].tolist())
+
+    def test_no_deja_temporales(self):
+        indice_lexico.guardar_indice_lexico(self.ruta, self.hash, _indice_de_prueba())
+        self.assertEqual(os.listdir(self.directorio.name), [indice_lexico.ARCHIVO_INDICE_LEXICO])
+
+    def test_hash_distinto_invalida(self):
+        indice_lexico.guardar_indice_lexico(self.ruta, self.hash, _indice_de_prueba())
+        otro_hash = indice_lexico.hash_contenido(b"[]")
+        self.assertIsNone(indice_lexico.cargar_indice_lexico(self.ruta, otro_hash))
+
+    def test_sin_archivo(self):
+        self.assertIsNone(indice_lexico.cargar_indice_lexico(self.ruta, self.hash))
+
+    def test_archivo_truncado(self):
+        indice_lexico.guardar_indice_lexico(self.ruta, self.hash, _indice_de_prueba())
+        with open(self.ruta, "rb") as f:
+            contenido = f.read()
+        with open(self.ruta, "wb") as f:
+            f.write(contenido[: len(contenido) // 2])
+        self.assertIsNone(indice_lexico.cargar_indice_lexico(self.ruta, self.hash))
+
+    def test_formato_anterior(self):
+        np.savez(self.ruta, json_hash=np.array(self.hash), formato=np.array(2), **_indice_de_prueba())
+        self.assertIsNone(indice_lexico.cargar_indice_lexico(self.ruta, self.hash))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from question_classifier import QuestionClassifier
+
+
+class DependsOnUserTest(unittest.TestCase):
+    """Solo las preguntas de reglamento/política general son independientes del usuario."""
+
+    def test_preguntas_personales_sin_marcas_obvias(self):
+        for pregunta in (
+            "¿Cuántas veces he reprobado cálculo?",
+            "¿Qué materias adeudo?",
+            "¿cuantos ets he presentado?",
+            "¿Qué pasa si repruebo cálculo otra vez?",
+            "¿Cuándo termino la carrera?",
+            "¿Cumplo los requisitos para titularme?",
+        ):
+            with self.subTest(pregunta=pregunta):
+                self.assertTrue(QuestionClassifier.depends_on_user(pregunta))
+
+    def test_primera_persona(self):
+        for pregunta in ("¿Cuál es mi promedio?", "¿Puedo dar de baja una materia?", "Muéstrame mi kardex"):
+            with self.subTest(pregunta=pregunta):
+                self.assertTrue(QuestionClassifier.depends_on_user(pregunta))
+
+    def test_sin_patron_general_depende_del_usuario(self):
+        self.assertTrue(QuestionClassifier.depends_on_user("¿Y ahora?"))
+        self.assertTrue(QuestionClassifier.depends_on_user("horario"))
+
+    def test_reglamento_y_politica_general(self):
+        for pregunta in (
+            "¿Qué dice el reglamento sobre la baja temporal?",
+            "¿Cuántas veces se puede presentar un ETS?",
+            "¿Qué es la evaluación a título de suficiencia?",
+            "¿Cuáles son los requisitos de titulación?",
+            "¿Cuántos extraordinarios puede presentar un alumno?",
+        ):
+            with self.subTest(pregunta=pregunta):
+                self.assertFalse(QuestionClassifier.depends_on_user(pregunta))
+
+    def test_primera_persona_gana_sobre_patron_general(self):
+        self.assertTrue(QuestionClassifier.depends_on_user("Según el reglamento, ¿cuántos ETS me quedan?"))
+
+
+if __name__ == "__main__":
+    unittest.main()
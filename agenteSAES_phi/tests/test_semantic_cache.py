@@ -0,0 +1,73 @@
+import unittest
+
+try:
+    import numpy as np
+    from semantic_cache import SemanticCache, admite_pregunta
+except ImportError as e:  # faiss-cpu / numpy no instalados
+    SemanticCache = None
+    MOTIVO = str(e)
+
+
+class EmbedderPalabras:
+    """Embedder de prueba: bolsa de palabras con dimensiones fijas por palabra."""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.vocab = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=False):
+        salida = np.zeros((len(sentences), self.dim), dtype="float32")
+        for fila, texto in enumerate(sentences):
+            for palabra in texto.lower().split():
+                salida[fila, self.vocab.setdefault(palabra, len(self.vocab) % self.dim)] += 1.0
+        if normalize_embeddings:
+            salida /= np.maximum(np.linalg.norm(salida, axis=1, keepdims=True), 1e-12)
+        return salida
+
+
+@unittest.skipIf(SemanticCache is None, "requiere numpy y faiss-cpu")
+class SemanticCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SemanticCache(EmbedderPalabras(), umbral=0.9)
+        self.pregunta = "que dice el reglamento sobre la baja temporal"
+        self.cache.guardar(self.pregunta, "alumno", "Artículo 49 ...")
+
+    def test_hit_con_la_misma_pregunta(self):
+        self.assertEqual(self.cache.buscar(self.pregunta, "alumno"), "Artículo 49 ...")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_tipo_usuario_sin_distinguir_mayusculas(self):
+        self.assertEqual(self.cache.buscar(self.pregunta, "Alumno"), "Artículo 49 ...")
+
+    def test_miss_con_otra_pregunta(self):
+        self.assertIsNone(self.cache.buscar("cuantos creditos tiene la carrera de ingenieria", "alumno"))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_miss_con_otro_tipo_de_usuario(self):
+        self.assertIsNone(self.cache.buscar(self.pregunta, "profesor"))
+
+    def test_miss_tras_expirar(self):
+        cache = SemanticCache(EmbedderPalabras(), umbral=0.9, ttl=-1)
+        cache.guardar(self.pregunta, "alumno", "vieja")
+        self.assertIsNone(cache.buscar(self.pregunta, "alumno"))
+
+
+@unittest.skipIf(SemanticCache is None, "requiere numpy y faiss-cpu")
+class AdmitePreguntaTest(unittest.TestCase):
+    """Las respuestas personalizadas no se comparten entre usuarios."""
+
+    def test_preguntas_del_usuario_no_se_cachean(self):
+        for pregunta in ("¿Qué materias adeudo?", "¿Cuál es mi promedio?", "¿Cuándo termino la carrera?"):
+            with self.subTest(pregunta=pregunta):
+                self.assertFalse(admite_pregunta(pregunta))
+
+    def test_preguntas_de_reglamento_se_cachean(self):
+        self.assertTrue(admite_pregunta("¿Qué dice el reglamento sobre la baja temporal?"))
+
+
+if __name__ == "__main__":
+    unittest.main()
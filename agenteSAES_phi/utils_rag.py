@@ -1,13 +1,22 @@
-from sentence_transformers import SentenceTransformer
 import json
 import numpy as np
 import faiss
+from scipy import sparse
 import os
 import re
+import time
 import unicodedata
 import spacy
 from spacy.lang.es.stop_words import STOP_WORDS
-from collections import defaultdict
+from collections import Counter, defaultdict
+from embedding_batcher import EmbeddingBatcher
+from encoders import crear_encoder, DIR_ONNX
+from indice_lexico import (
+    ARCHIVO_INDICE_LEXICO,
+    hash_contenido,
+    guardar_indice_lexico,
+    cargar_indice_lexico,
+)
 
 # Stopwords: spaCy + algunas personalizadas (normalizadas sin acentos)
 STOPWORDS_ES = set(STOP_WORDS) | {
@@ -24,29 +33,33 @@ def _normalize_text(s: str) -> str:
     return s
 
 
+# Fragmentos editoriales, directorios y ruido (se evalúa sobre el texto normalizado)
+RUIDO_PATTERNS = [
+    r"gaceta politecnica",
+    r"organo informativo", 
+    r"directorio",
+    r"queda estrictamente prohibida", 
+    r"numero extraordinario",
+    r"impreso en",
+    r"talleres", 
+    r"edicion:", 
+    r"licitud",
+    r"permiso de circulacion",
+    r"coordinacion editorial",
+    r"colaboradores",
+    r"codigo de etica",
+    r"principios y valores",
+    r"\b\d+\s*de\s*\d+\b",
+    r"www\.",
+    r"http://",
+    r"@"
+]
+_RUIDO_RE = re.compile("|".join(f"(?:{p})" for p in RUIDO_PATTERNS))
+
+
 def _is_noise(texto: str) -> bool:
     """Detecta fragmentos editoriales, directorios y ruido"""
     t = _normalize_text(texto)
-    ruido_patterns = [
-        r"gaceta politecnica",
-        r"organo informativo", 
-        r"directorio",
-        r"queda estrictamente prohibida", 
-        r"numero extraordinario",
-        r"impreso en",
-        r"talleres", 
-        r"edicion:", 
-        r"licitud",
-        r"permiso de circulacion",
-        r"coordinacion editorial",
-        r"colaboradores",
-        r"codigo de etica",
-        r"principios y valores",
-        r"\b\d+\s*de\s*\d+\b",
-        r"www\.",
-        r"http://",
-        r"@"
-    ]
     palabras = t.split()
     # Rechazar si muy corto o contiene patrones de ruido
     if len(palabras) < 12:
@@ -56,7 +69,7 @@ def _is_noise(texto: str) -> bool:
     if any(ord(c) > 127 for c in t):
         return True
         
-    return any(re.search(pattern, t) for pattern in ruido_patterns)
+    return _RUIDO_RE.search(t) is not None
 
 
 def _lemmas_es(texto: str) -> list[str]:
@@ -86,48 +99,234 @@ def _lexical_tokens(pregunta: str) -> list[str]:
     return _lemmas_es(pregunta)
 
 
+# Parámetros de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Pesos de la recuperación híbrida. FAISS aporta PESO_FAISS / (1 + rank * 0.3).
+# BM25 no tiene cota y su escala cambia con cada consulta, así que se divide
+# entre el mejor puntaje de la consulta (queda en [0, 1]) antes de ponderarlo;
+# el léxico conserva el mayor peso que tenía el conteo de coincidencias.
+PESO_FAISS = 2.0
+PESO_LEXICO = 3.0
+# Peso del puntaje BM25 crudo, antes de normalizarlo (solo para comparar en benchmarks.bench_rag)
+PESO_LEXICO_SIN_NORMALIZAR = 1.5
+
+
+def combinar_puntajes(faiss_hits, puntajes_lexicos: np.ndarray, es_ruido: np.ndarray,
+                      normalizar_lexico: bool = True) -> dict[int, float]:
+    """Puntaje híbrido de cada candidato: rango en FAISS más BM25 (normalizado por consulta)."""
+    combinados: dict[int, float] = {}
+    for rank, idx in enumerate(faiss_hits):
+        if es_ruido[idx]:
+            continue
+        combinados[idx] = combinados.get(idx, 0.0) + (PESO_FAISS / (1 + rank * 0.3))
+
+    # Los fragmentos con ruido no tienen lemas, así que su puntaje léxico es 0
+    candidatos_lex = np.flatnonzero(puntajes_lexicos)
+    if len(candidatos_lex) == 0:
+        return combinados
+    lex = puntajes_lexicos[candidatos_lex]
+    if normalizar_lexico:
+        lex = lex / lex.max() * PESO_LEXICO
+    else:
+        lex = lex * PESO_LEXICO_SIN_NORMALIZAR
+    for idx, score in zip(candidatos_lex.tolist(), lex.tolist()):
+        combinados[idx] = combinados.get(idx, 0.0) + score
+    return combinados
+
+
+def construir_indice_lexico(textos: list[str]) -> dict[str, np.ndarray]:
+    """Lematiza los fragmentos (spaCy) y arma el índice léxico en arreglos."""
+    ruido = np.zeros(len(textos), dtype=bool)
+    longitudes = np.zeros(len(textos), dtype=np.int32)
+    postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    for i, t in enumerate(textos):
+        if _is_noise(t):
+            ruido[i] = True
+            continue
+        lemas = _lemmas_es(t)
+        longitudes[i] = len(lemas)
+        for lem, tf in Counter(lemas).items():
+            postings[lem].append((i, tf))
+
+    vocab = sorted(postings)
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    for j, lem in enumerate(vocab):
+        indptr[j + 1] = indptr[j] + len(postings[lem])
+    nnz = int(indptr[-1])
+    docs = np.fromiter((i for lem in vocab for i, _ in postings[lem]), dtype=np.int32, count=nnz)
+    tf = np.fromiter((f for lem in vocab for _, f in postings[lem]), dtype=np.int32, count=nnz)
+
+    return {
+        "vocab": np.array(vocab, dtype=str),
+        "indptr": indptr,
+        "docs": docs,
+        "tf": tf,
+        "longitudes": longitudes,
+        "ruido": ruido,
+        "textos_norm": np.array([_normalize_text(t) for t in textos], dtype=object),
+    }
+
+
+def matriz_bm25(indice: dict[str, np.ndarray], k1: float = BM25_K1, b: float = BM25_B) -> sparse.csr_matrix:
+    """
+    Matriz fragmento x lema con pesos BM25. El puntaje léxico de una consulta
+    es un solo producto matriz-vector con el vector de lemas de la pregunta.
+    """
+    indptr, docs, tf = indice["indptr"], indice["docs"], indice["tf"].astype(np.float32)
+    longitudes = indice["longitudes"].astype(np.float32)
+    n_docs, n_lemas = len(longitudes), len(indice["vocab"])
+
+    df = np.diff(indptr).astype(np.float32)
+    n_validos = float(np.count_nonzero(~indice["ruido"])) or 1.0
+    idf = np.log1p((n_validos - df + 0.5) / (df + 0.5))
+    promedio = float(longitudes[longitudes > 0].mean()) if np.any(longitudes > 0) else 1.0
+
+    norma = k1 * (1 - b + b * longitudes[docs] / promedio)
+    pesos = np.repeat(idf, np.diff(indptr)) * tf * (k1 + 1) / (tf + norma)
+
+    por_lema = sparse.csr_matrix((pesos, docs, indptr), shape=(n_lemas, n_docs))
+    return por_lema.T.tocsr()
+
+
+def ruta_metadatos_indice(index_path: str) -> str:
+    """Metadatos del índice FAISS (tipo, métrica y parámetros de construcción)."""
+    return f"{index_path}.meta.json"
+
+
+def cargar_metadatos_indice(index_path: str) -> dict:
+    """Lee los metadatos del índice; sin archivo se asume el IndexFlatL2 original."""
+    ruta = ruta_metadatos_indice(index_path)
+    if not os.path.exists(ruta):
+        return {"tipo": "flat_l2", "metrica": "l2", "normalizado": False, "parametros": {}}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def configurar_busqueda_faiss(index, metadatos: dict, k: int):
+    """Aplica los parámetros de búsqueda (efSearch / nprobe) guardados en los metadatos."""
+    parametros = metadatos.get("parametros", {})
+    if metadatos.get("tipo") == "hnsw":
+        # efSearch nunca menor que k, o HNSW devuelve menos vecinos de los pedidos
+        index.hnsw.efSearch = max(int(parametros.get("efSearch", 64)), k)
+    elif metadatos.get("tipo") == "ivfpq":
+        faiss.extract_index_ivf(index).nprobe = int(parametros.get("nprobe", 16))
+
+
+def generar_indice_lexico(json_path: str = "reglamentos_ipn.json", lexico_path: str = ARCHIVO_INDICE_LEXICO) -> dict[str, np.ndarray]:
+    """Construye y guarda el índice léxico del JSON indicado."""
+    with open(json_path, "rb") as f:
+        crudo = f.read()
+    textos = [item["texto"] for item in json.loads(crudo)]
+    indice = construir_indice_lexico(textos)
+    guardar_indice_lexico(lexico_path, hash_contenido(crudo), indice)
+    return indice
+
+
 class ReglamentoRAG:
-    def __init__(self, json_path: str = "reglamentos_ipn.json", index_path: str = "reglamentos_ipn.index"):
+    def __init__(self, json_path: str = "reglamentos_ipn.json", index_path: str = "reglamentos_ipn.index",
+                 lexico_path: str = ARCHIVO_INDICE_LEXICO, lote_embeddings: int = 0,
+                 ventana_embeddings_ms: float = 2.0, backend_embeddings: str = "torch",
+                 dir_onnx: str = DIR_ONNX):
         """
         Carga el reglamento fragmentado con palabras clave y el índice FAISS.
+        El índice léxico se lee de `lexico_path`; solo se reconstruye con spaCy
+        si falta o si el JSON cambió.
+        Con `lote_embeddings` > 0, los embeddings de consultas concurrentes se
+        agrupan en lotes de hasta ese tamaño (ver EmbeddingBatcher).
+        `backend_embeddings` elige el codificador de consultas: "torch", "onnx" u "onnx-int8".
         """
         if not os.path.exists(json_path):
             raise FileNotFoundError(f"No se encontró el archivo JSON: {json_path}")
         if not os.path.exists(index_path):
             raise FileNotFoundError(f"No se encontró el archivo FAISS: {index_path}")
 
-        with open(json_path, "r", encoding="utf-8") as f:
-            self.data = json.load(f)
+        # Segundos de carga de cada componente (para medir el arranque en frío)
+        self.tiempos_carga: dict[str, float] = {}
+        t0 = time.perf_counter()
+
+        with open(json_path, "rb") as f:
+            crudo = f.read()
+        self.data = json.loads(crudo)
 
         # Texto (pueden venir vacíos)
         self.textos = [item["texto"] for item in self.data]
         print(f"Reglamentos cargados con {len(self.textos)} fragmentos.")
 
         # Índice invertido de lemas para búsqueda léxica eficiente
-        self.doc_lemmas: list[set[str]] = []
-        self.inv_index: dict[str, set[int]] = defaultdict(set)
-        for i, t in enumerate(self.textos):
-            if _is_noise(t):
-                self.doc_lemmas.append(set())
-                continue
-            lemset = set(_lemmas_es(t))
-            self.doc_lemmas.append(lemset)
-            for lem in lemset:
-                self.inv_index[lem].add(i)
-        print("Índice léxico (lemmas) construido.")
+        json_hash = hash_contenido(crudo)
+        indice = cargar_indice_lexico(lexico_path, json_hash)
+        if indice is None:
+            indice = construir_indice_lexico(self.textos)
+            try:
+                guardar_indice_lexico(lexico_path, json_hash, indice)
+            except OSError as e:
+                print(f"No se pudo guardar el índice léxico en '{lexico_path}': {e}")
+            print("Índice léxico (lemmas) construido.")
+        else:
+            print("Índice léxico (lemmas) cargado desde disco.")
+
+        # Propiedades fijas de cada fragmento: la consulta solo hace búsquedas por índice
+        self.es_ruido: np.ndarray = indice["ruido"]
+        self.textos_norm: list[str] = indice["textos_norm"].tolist()
+        self.textos_limpios: list[str] = [re.sub(r"\s+", " ", t.strip()) for t in self.textos]
+        # Bonificar presencia de "Artículo" al inicio
+        self.bonus_articulo: np.ndarray = np.array(
+            [3.0 if "articulo" in t[:100].lower() else 1.0 for t in self.textos], dtype=np.float32
+        )
+        # Búsqueda léxica: lema -> columna de la matriz BM25
+        self.vocab: dict[str, int] = {str(lem): j for j, lem in enumerate(indice["vocab"])}
+        self.bm25: sparse.csr_matrix = matriz_bm25(indice)
+        t1 = time.perf_counter()
+        self.tiempos_carga["indice_lexico"] = t1 - t0
 
         # Cargar modelo de embeddings y el índice FAISS
-        self.embedder = SentenceTransformer("all-mpnet-base-v2")
+        self.backend_embeddings = backend_embeddings
+        self.modelo_embeddings = crear_encoder(backend_embeddings, dir_onnx)
+        self.batcher: EmbeddingBatcher | None = None
+        if lote_embeddings > 0:
+            self.batcher = EmbeddingBatcher(self.modelo_embeddings, lote_embeddings, ventana_embeddings_ms)
+        self.embedder = self.batcher or self.modelo_embeddings
+        t2 = time.perf_counter()
+        self.tiempos_carga["embedder"] = t2 - t1
         self.index = faiss.read_index(index_path)
-        print("Índice FAISS cargado correctamente.")
+        self.metadatos_indice = cargar_metadatos_indice(index_path)
+        self.normalizar_consulta = bool(self.metadatos_indice.get("normalizado", False))
+        configurar_busqueda_faiss(self.index, self.metadatos_indice, k=30)
+        self.ef_search: int | None = self.index.hnsw.efSearch if self.metadatos_indice.get("tipo") == "hnsw" else None
+        self.tiempos_carga["faiss"] = time.perf_counter() - t2
+        print(f"Índice FAISS ({self.metadatos_indice['tipo']}) cargado correctamente.")
+
+    def _parametros_faiss(self, k: int):
+        """
+        Con HNSW, efSearch debe ser >= k o la búsqueda devuelve vecinos de menos.
+        Se pasa por consulta para no modificar el índice que comparten los hilos.
+        """
+        if self.ef_search is None or k <= self.ef_search:
+            return None
+        return faiss.SearchParametersHNSW(efSearch=k)
+
+    def puntajes_lexicos(self, tokens: list[str]) -> np.ndarray:
+        """Puntaje BM25 de cada fragmento, ya multiplicado por el bono de "Artículo"."""
+        columnas = {self.vocab[t] for t in tokens if t in self.vocab}
+        if not columnas:
+            return np.zeros(len(self.textos), dtype=np.float32)
+        consulta = np.zeros(len(self.vocab), dtype=np.float32)
+        consulta[list(columnas)] = 1.0
+        return (self.bm25 @ consulta) * self.bonus_articulo
 
-    def buscar_contexto(self, pregunta: str, k_faiss: int = 30, max_chars: int = 2000, top_merge: int = 5):
+    def buscar_contexto(self, pregunta: str, k_faiss: int = 30, max_chars: int | None = 2000, top_merge: int = 5,
+                        tiempos: dict | None = None, normalizar_lexico: bool = True, solo_ids: bool = False):
         """
         Recuperación híbrida: FAISS + léxico + validación de relevancia
         Prioriza fragmentos que contienen artículos específicos
+        Si se pasa `tiempos`, guarda ahí los segundos de las partes "faiss" y "lexico".
+        Con max_chars=None se devuelven los fragmentos completos (el recorte lo hace prompt_builder).
+        `normalizar_lexico` y `solo_ids` (ids de los candidatos en orden) son para benchmarks.bench_rag.
         """
         if not pregunta or len(pregunta.strip()) == 0:
-            return ""
+            return [] if solo_ids else ""
 
         pregunta_lower = pregunta.lower()
         
@@ -161,60 +360,37 @@ class ReglamentoRAG:
                 pregunta_expandida += f" {expansion}"
 
         # Búsqueda semántica (FAISS)
-        q_emb = np.array(self.embedder.encode([pregunta_expandida], convert_to_numpy=True))
-        _, indices = self.index.search(q_emb, k_faiss)
+        t0 = time.perf_counter()
+        q_emb = np.array(self.embedder.encode(
+            [pregunta_expandida], convert_to_numpy=True, normalize_embeddings=self.normalizar_consulta
+        ), dtype=np.float32)
+        _, indices = self.index.search(q_emb, k_faiss, params=self._parametros_faiss(k_faiss))
         faiss_hits = [i for i in indices[0] if 0 <= i < len(self.textos)]
+        t1 = time.perf_counter()
 
-        # Búsqueda léxica
-        toks = set(_lexical_tokens(pregunta))
-        candidatos_lex = set()
-        for tok in toks:
-            candidatos_lex |= self.inv_index.get(tok, set())
+        # Búsqueda léxica (BM25)
+        puntajes = self.puntajes_lexicos(_lexical_tokens(pregunta))
+        if tiempos is not None:
+            tiempos["faiss"] = t1 - t0
+            tiempos["lexico"] = time.perf_counter() - t1
 
-        lex_scores = []
-        for idx in candidatos_lex:
-            if idx < 0 or idx >= len(self.textos):
-                continue
-            if _is_noise(self.textos[idx]):
-                continue
-            # Contar coincidencias de lemas
-            matches = sum(1 for tok in toks if tok in self.doc_lemmas[idx])
-            if matches > 0:
-                # Bonificar presencia de "Artículo" al inicio
-                texto_inicio = self.textos[idx][:100].lower()
-                bonus = 3.0 if "articulo" in texto_inicio else 1.0
-                lex_scores.append((idx, matches * bonus))
-
-        # Combinar scores
-        combined_scores: dict[int, float] = {}
-        
-        # Score FAISS (menor peso)
-        for rank, idx in enumerate(faiss_hits):
-            if _is_noise(self.textos[idx]):
-                continue
-            combined_scores[idx] = combined_scores.get(idx, 0.0) + (2.0 / (1 + rank * 0.3))
-
-        # Score léxico (mayor peso)
-        for idx, score in lex_scores:
-            combined_scores[idx] = combined_scores.get(idx, 0.0) + (score * 1.5)
-
-        if not combined_scores:
-            candidatos = []
-        else:
-            # Ordenar por score descendente
-            sorted_items = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
-            candidatos = [self.textos[i] for i, _ in sorted_items[:top_merge]]
+        # Combinar scores y ordenar por score descendente
+        combined_scores = combinar_puntajes(faiss_hits, puntajes, self.es_ruido, normalizar_lexico)
+        sorted_items = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
+        candidatos = [i for i, _ in sorted_items[:top_merge]]
+        if solo_ids:
+            return candidatos
 
         # Deduplicar y ensamblar
         vistos = set()
         acc = []
         
-        for texto in candidatos:
+        for idx in candidatos:
             if len(acc) >= top_merge:
                 break
             
-            texto_limpio = re.sub(r"\s+", " ", texto.strip())
-            texto_norm = _normalize_text(texto_limpio)
+            texto_limpio = self.textos_limpios[idx]
+            texto_norm = self.textos_norm[idx]
             
             # Evitar duplicados y fragmentos muy cortos
             if texto_norm in vistos or len(texto_norm) < 50:
@@ -224,7 +400,9 @@ class ReglamentoRAG:
             acc.append(texto_limpio)
 
         # Unir con separador claro
-        resultado = "\n\n".join(acc)[:max_chars]
+        resultado = "\n\n".join(acc)
+        if max_chars is not None:
+            resultado = resultado[:max_chars]
         
         # Validar que no esté vacío
         if not resultado or len(resultado.strip()) < 20: